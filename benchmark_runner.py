@@ -0,0 +1,696 @@
+import asyncio
+import os
+import re
+import shutil
+import time
+
+from vmware_fusion_py import (
+    AsyncVMware,
+    NetnsBackend,
+    connect_namespaces,
+    file_digest,
+)
+from certificate_factory import client_files, client_identities, intermediate_files
+from data_index import CRYPTO_RESULTS
+from strongswan_manager import StrongSwan
+from run_manifest import COMPLETE, FAILED, RUNNING, count_iterations, entry_name
+
+CAROL_CERTIFICATE_FILES = [
+    ("carolCert.pem", "/etc/swanctl/x509/carolCert.pem"),
+    ("carolKey.pem", "/etc/swanctl/pkcs8/carolKey.pem"),
+    ("caCert.pem", "/etc/swanctl/x509ca/caCert.pem"),
+]
+MOON_CERTIFICATE_FILES = [
+    ("moonCert.pem", "/etc/swanctl/x509/moonCert.pem"),
+    ("moonKey.pem", "/etc/swanctl/pkcs8/moonKey.pem"),
+    ("caCert.pem", "/etc/swanctl/x509ca/caCert.pem"),
+]
+SWANCTL_CONF = "/etc/swanctl/swanctl.conf"
+# Seconds between the samples of moon's charon during a cell
+USAGE_INTERVAL = 0.02
+
+
+class VMPair:
+    """
+    A carol and a moon VM benchmarked together. Every pair edits its own
+    copies of the swanctl configs, so pairs can be reconfigured concurrently.
+    """
+
+    def __init__(
+        self,
+        name,
+        carol,
+        moon,
+        carol_conf_path,
+        moon_conf_path,
+        moon_address=None,
+        measurements_path=None,
+    ):
+        self.name = name
+        self.carol = carol
+        self.moon = moon
+        self.conf_templates = (carol_conf_path, moon_conf_path)
+        self.carol_conf_path = f"{carol_conf_path}.{name}"
+        self.moon_conf_path = f"{moon_conf_path}.{name}"
+        shutil.copyfile(carol_conf_path, self.carol_conf_path)
+        shutil.copyfile(moon_conf_path, self.moon_conf_path)
+        self.strongswan = StrongSwan(self.carol_conf_path, self.moon_conf_path)
+        # The certificate family currently installed on both VMs
+        self.certificate = None
+        # The network mode the link is currently shaped for
+        self.mode = None
+        # Where carol's results are, if not the runner's default
+        self.measurements_path = measurements_path
+        with open(self.carol_conf_path, "r") as f:
+            match = re.search(r"remote_addrs = (\S+)", f.read())
+        self.moon_address = match.group(1) if match else None
+        if moon_address:
+            self.set_moon_address(moon_address)
+
+    def set_moon_address(self, address):
+        """Point carol's connections at this pair's moon"""
+        with open(self.carol_conf_path, "r") as f:
+            conf = f.read()
+        conf = re.sub(r"remote_addrs = .*", f"remote_addrs = {address}", conf)
+        with open(self.carol_conf_path, "w") as f:
+            f.write(conf)
+        self.moon_address = address
+
+    async def discover_moon_address(self):
+        """Ask VMware Tools for moon's address, e.g. for fresh clones"""
+        result = await self.moon.get_guest_ip_address(wait=True)
+        if result["return_code"] != 0:
+            raise RuntimeError(f"{self.name}: no address for moon: {result['output']}")
+        self.set_moon_address(result["output"].strip())
+
+    async def start(self):
+        await asyncio.gather(self.carol.start(), self.moon.start())
+
+
+def clone_vm(vm, destination_path, snapshot=None, clone_type="linked"):
+    """
+    A copy of vm, pointing at a new clone of its VM
+    :return: The new AsyncVMware instance and the clone command's result
+    """
+    clone = AsyncVMware(
+        vmrun_path=vm.vmrun_path,
+        host_type=vm.host_type,
+        vm_password=vm.vm_password,
+        guest_user=vm.guest_user,
+        guest_password=vm.guest_password,
+        vm_path=destination_path,
+        upload_cache=vm.upload_cache,
+    )
+    name = os.path.splitext(os.path.basename(destination_path))[0]
+    return clone, vm.clone(destination_path, clone_type, snapshot, name)
+
+
+async def clone_pairs(pair, count, destination_dir, snapshot=None):
+    """
+    Create `count` further pairs as linked clones of pair's VMs, named
+    clone1, clone2, ... The clones start out powered off and get their moon
+    address once started.
+    """
+    pairs = []
+    for i in range(1, count + 1):
+        vms = []
+        for role, vm in (("carol", pair.carol), ("moon", pair.moon)):
+            path = os.path.join(destination_dir, f"{role}{i}", f"{role}{i}.vmx")
+            clone, cloning = clone_vm(vm, path, snapshot)
+            result = await cloning
+            if result["return_code"] != 0:
+                raise RuntimeError(f"Could not clone {vm.vm_path}: {result['output']}")
+            vms.append(clone)
+        pairs.append(
+            VMPair(
+                f"clone{i}",
+                *vms,
+                *pair.conf_templates,
+            )
+        )
+    return pairs
+
+
+def netns_pairs(
+    count, carol_conf_path, moon_conf_path, upload_cache=None, state_dir=None
+):
+    """
+    Pairs of network namespaces on this host instead of VMs, linked by veth
+    pairs on 10.200.<i>.0/24. Needs root, see NetnsBackend.
+    """
+    options = {"state_dir": state_dir} if state_dir else {}
+    pairs = []
+    for i in range(count):
+        vms = []
+        for role in ("carol", "moon"):
+            namespace = f"{role}{i}"
+            vms.append(
+                AsyncVMware(
+                    vmrun_path="vmrun",
+                    vm_path=namespace,
+                    backend=NetnsBackend(namespace, **options),
+                    upload_cache=upload_cache,
+                )
+            )
+        home = os.path.join(vms[0].backend.root, "home")
+        pairs.append(
+            VMPair(
+                f"netns{i}",
+                *vms,
+                carol_conf_path,
+                moon_conf_path,
+                moon_address=f"10.200.{i}.2",
+                measurements_path=os.path.join(home, "measurements"),
+            )
+        )
+    return pairs
+
+
+async def link_netns_pair(pair):
+    """Start a pair from netns_pairs and connect its namespaces"""
+    await pair.start()
+    result = await pair.moon.get_guest_ip_address()
+    if result["output"] == pair.moon_address:
+        return
+    subnet = pair.moon_address.rsplit(".", 1)[0]
+    connect_namespaces(
+        pair.carol.vm_path, pair.moon.vm_path, f"{subnet}.1", pair.moon_address
+    )
+
+
+class SnapshotIsolation:
+    """
+    Restores carol and moon before every cell, so no SAs, charon memory or
+    XFRM state carry over between cells. Each pair gets one warm snapshot per
+    certificate family and proposal, taken with the family's certificates
+    installed and the proposal's configuration loaded, which a cell reverts
+    to instead of installing and reloading them. The revert also wipes
+    carol's results, so they have to be copied to the host after each cell.
+    """
+
+    def __init__(self, prefix="warm", baseline=None):
+        """
+        :param prefix: Prefix of the warm snapshots' names
+        :param baseline: Snapshot to start from when taking a warm snapshot
+        """
+        self.prefix = prefix
+        self.baseline = baseline
+        self._snapshots = {}
+
+    def snapshot_name(self, cell, load_connections=0):
+        name = f"{self.prefix}-{cell.certificate}-{cell.proposal}"
+        # Load runs load other configurations
+        return f"{name}-load{load_connections}" if load_connections else name
+
+    async def _known_snapshots(self, vm):
+        if vm.vm_path not in self._snapshots:
+            result = await vm.list_snapshots()
+            names = set()
+            if result["return_code"] == 0:
+                # The first line is "Total snapshots: N"
+                names = {line.strip() for line in result["output"].splitlines()[1:]}
+            self._snapshots[vm.vm_path] = names
+        return self._snapshots[vm.vm_path]
+
+    async def _revert_vm(self, vm, name):
+        timings = {}
+        start = time.perf_counter()
+        result = await vm.revert_to_snapshot(name)
+        if result["return_code"] != 0:
+            raise RuntimeError(
+                f"Could not revert {vm.vm_path} to {name}: {result['output']}"
+            )
+        timings["revert"] = time.perf_counter() - start
+        # Snapshots of running VMs come back suspended
+        await vm.start()
+        timings["start"] = time.perf_counter() - start - timings["revert"]
+        await vm.get_guest_ip_address(wait=True)
+        timings["ready"] = time.perf_counter() - start
+        return timings
+
+    async def revert(self, pair, name):
+        """
+        Revert both VMs of pair to a snapshot
+        :return: Seconds spent per VM and step
+        """
+        carol, moon = await asyncio.gather(
+            self._revert_vm(pair.carol, name), self._revert_vm(pair.moon, name)
+        )
+        return {"carol": carol, "moon": moon}
+
+    async def warm_up(self, runner, pair, cell):
+        """Take the warm snapshot of a cell on both VMs of pair"""
+        name = self.snapshot_name(cell, runner.load_connections)
+        if self.baseline:
+            await self.revert(pair, self.baseline)
+        await runner.install_certificates(pair, cell.certificate)
+        await runner.configure(pair, cell)
+        for vm in (pair.carol, pair.moon):
+            result = await vm.snapshot(name)
+            if result["return_code"] != 0:
+                raise RuntimeError(
+                    f"Could not snapshot {vm.vm_path}: {result['output']}"
+                )
+            (await self._known_snapshots(vm)).add(name)
+        print(f"{pair.name}: took snapshot {name}")
+
+    async def restore(self, runner, pair, cell):
+        """
+        Bring pair back to the warm state of a cell, taking the warm
+        snapshot first if there is none yet
+        :return: The revert timings
+        """
+        name = self.snapshot_name(cell, runner.load_connections)
+        for vm in (pair.carol, pair.moon):
+            if name not in await self._known_snapshots(vm):
+                await self.warm_up(runner, pair, cell)
+                break
+        timings = await self.revert(pair, name)
+        pair.certificate = cell.certificate
+        return timings
+
+
+class BenchmarkRunner:
+    """Runs single matrix cells on a VMPair"""
+
+    def __init__(
+        self,
+        certificates_path,
+        scripts,
+        base_proposal="aes256-sha256",
+        iterations=500,
+        mode_iterations=None,
+        agent_arguments=(),
+        load_arguments=(),
+        load_connections=0,
+        guest_measurements_path=None,
+        host_data_path=None,
+        tag_results=False,
+        manifest=None,
+        replicated=(),
+        isolation=None,
+        network=None,
+        capture=None,
+        resources=False,
+    ):
+        """
+        :param certificates_path: Directory holding one directory per family
+        :param scripts: Guest paths of the carol_reload, moon_reload,
+            carol_benchmark and carol_load scripts, of moon's charon_usage
+            script if resources are sampled and of carol's crypto_bench
+            script for crypto_benchmark
+        :param mode_iterations: Iterations of modes that differ from iterations
+        :param agent_arguments: Extra options for the benchmark agent
+        :param load_arguments: Extra options for the load generator
+        :param load_connections: Concurrent road warriors, 0 for latency runs
+        :param guest_measurements_path: Where the guest scripts store results
+        :param host_data_path: Where to copy results to, if anywhere
+        :param tag_results: Store results in one sub directory per pair
+        :param manifest: RunManifest to skip completed and resume
+            interrupted cells with
+        :param replicated: Cells run on every pair, which the manifest
+            tracks per pair
+        :param isolation: SnapshotIsolation to restore the pair before
+            cells, needs guest_measurements_path and host_data_path
+        :param network: NetworkShaper applying each cell's network mode
+        :param capture: Interface carol records each cell's IKE traffic on,
+            "any" for all of them, None to not record it
+        :param resources: Sample charon's CPU time and memory on carol
+            around every handshake and on moon during every cell
+        """
+        self.certificates_path = certificates_path
+        self.scripts = scripts
+        self.base_proposal = base_proposal
+        self.iterations = iterations
+        self.mode_iterations = mode_iterations or {}
+        self.agent_arguments = list(agent_arguments)
+        self.load_arguments = list(load_arguments)
+        self.load_connections = load_connections
+        self.guest_measurements_path = guest_measurements_path
+        self.host_data_path = host_data_path
+        self.tag_results = tag_results
+        self.manifest = manifest
+        self.replicated = set(replicated)
+        self.isolation = isolation
+        if isolation is not None and not (guest_measurements_path and host_data_path):
+            raise ValueError(
+                "Snapshot isolation reverts carol's results, "
+                "they have to be copied to the host"
+            )
+        self.network = network
+        self.capture = capture
+        self.resources = resources
+
+    def has_clients(self, certificate):
+        """
+        Whether the family has an identity per road warrior of a load run,
+        see certificate_factory.py --clients
+        """
+        if not self.load_connections:
+            return False
+        _, last_cert = client_files(self.load_connections)[-1]
+        return os.path.exists(
+            os.path.join(self.certificates_path, certificate, last_cert)
+        )
+
+    async def install_certificates(self, pair, certificate):
+        certificate_path = os.path.join(self.certificates_path, certificate, "")
+        # charon sends the intermediate CAs of the chain with the leaf
+        intermediates = [
+            (cert, f"/etc/swanctl/x509ca/{cert}")
+            for cert in intermediate_files(certificate)
+        ]
+        carol_files = CAROL_CERTIFICATE_FILES + intermediates
+        if self.has_clients(certificate):
+            for key, cert in client_files(self.load_connections):
+                carol_files += [
+                    (key, f"/etc/swanctl/pkcs8/{os.path.basename(key)}"),
+                    (cert, f"/etc/swanctl/x509/{os.path.basename(cert)}"),
+                ]
+        for vm, files in (
+            (pair.carol, carol_files),
+            (pair.moon, MOON_CERTIFICATE_FILES + intermediates),
+        ):
+            # One archive upload and one unpack instead of a vmrun call per file
+            mapping = {
+                certificate_path + file_name: guest_path
+                for file_name, guest_path in files
+            }
+            result = await vm.copy_files_from_host_to_guest(mapping)
+            if result["return_code"] != 0:
+                raise RuntimeError(f"{pair.name}: {result['output']}")
+        pair.certificate = certificate
+        print(f"{pair.name}: updated certificates to {certificate}")
+
+    async def configure(self, pair, cell):
+        pair.strongswan.update_proposals(f"{self.base_proposal}-{cell.proposal}")
+        carol_conf, moon_conf = pair.carol_conf_path, pair.moon_conf_path
+        if self.load_connections:
+            carol_conf, moon_conf = carol_conf + ".load", moon_conf + ".load"
+            # Road warriors with their own identities, if the family has them
+            identities = None
+            if self.has_clients(cell.certificate):
+                identities = client_identities(self.load_connections)
+            pair.strongswan.write_load_configs(
+                carol_conf, moon_conf, self.load_connections, identities=identities
+            )
+        await asyncio.gather(
+            pair.carol.copy_file_from_host_to_guest(carol_conf, SWANCTL_CONF),
+            pair.moon.copy_file_from_host_to_guest(moon_conf, SWANCTL_CONF),
+        )
+        await self.reload(pair)
+
+    async def reload(self, pair):
+        await asyncio.gather(
+            pair.carol.run_program_in_guest(
+                self.scripts["carol_reload"],
+                program_arguments=[pair.carol.guest_password],
+            ),
+            pair.moon.run_program_in_guest(
+                self.scripts["moon_reload"],
+                program_arguments=[pair.moon.guest_password],
+            ),
+        )
+
+    async def measure(self, pair, cell, start=None):
+        resources = ["--resources"] if self.resources else []
+        if self.load_connections:
+            return await pair.carol.run_program_in_guest(
+                self.scripts["carol_load"],
+                program_arguments=[
+                    *cell,
+                    str(self.load_connections),
+                    pair.carol.guest_password,
+                    *self.load_arguments,
+                    *resources,
+                ],
+            )
+        return await pair.carol.run_program_in_guest(
+            self.scripts["carol_benchmark"],
+            program_arguments=[
+                *cell,
+                str(self.cell_iterations(cell)),
+                pair.carol.guest_password,
+                *self.agent_arguments,
+                *([] if start is None else ["--start-iteration", str(start)]),
+                *([] if self.capture is None else ["--capture", self.capture]),
+                *resources,
+            ],
+        )
+
+    def cell_iterations(self, cell):
+        return self.mode_iterations.get(cell.mode, self.iterations)
+
+    def result_name(self, cell):
+        if self.load_connections:
+            return f"load_{cell.name}.json"
+        return f"{cell.name}.txt"
+
+    def cell_file_name(self, cell, suffix, start=None):
+        """The name of a file kept next to cell's results, see data_index"""
+        name = f"load_{cell.name}" if self.load_connections else cell.name
+        return f"{name}.{start}{suffix}" if start else f"{name}{suffix}"
+
+    def host_dir(self, pair):
+        """Where pair's results go on the host, None if they are not copied"""
+        if not self.host_data_path:
+            return None
+        host_dir = self.host_data_path
+        if self.tag_results:
+            host_dir = os.path.join(host_dir, pair.name)
+        os.makedirs(host_dir, exist_ok=True)
+        return host_dir
+
+    async def fetch_results(self, pair, cell, name=None):
+        """
+        Copy a result file of cell from carol to the host
+        :param name: The file to copy, the cell's latencies by default
+        :return: The host path, None if nothing was copied
+        """
+        guest_path = pair.measurements_path or self.guest_measurements_path
+        host_dir = self.host_dir(pair)
+        if not guest_path or not host_dir:
+            return None
+        name = name or self.result_name(cell)
+        host_path = os.path.join(host_dir, name)
+        result = await pair.carol.copy_file_from_guest_to_host(
+            f"{guest_path}/{name}", host_path
+        )
+        return host_path if result["return_code"] == 0 else None
+
+    def _moon_usage_path(self, cell):
+        return f"/tmp/charon_usage_{cell.name}"
+
+    async def start_moon_usage(self, pair, cell):
+        """Start sampling moon's charon in the background"""
+        guest_path = self._moon_usage_path(cell)
+        await pair.moon.run_script_in_guest(
+            "/bin/sh", f"rm -f {guest_path}.jsonl {guest_path}.stop"
+        )
+        result = await pair.moon.run_program_in_guest(
+            self.scripts["charon_usage"],
+            no_wait=True,
+            program_arguments=[
+                "--output",
+                f"{guest_path}.jsonl",
+                "--interval",
+                str(USAGE_INTERVAL),
+                "--stop-file",
+                f"{guest_path}.stop",
+            ],
+        )
+        if result["return_code"] != 0:
+            raise RuntimeError(f"{pair.name}: {result['output']}")
+
+    async def fetch_moon_usage(self, pair, cell, start=None):
+        """
+        Stop sampling moon's charon and copy the samples to the host
+        :return: The host path, None if nothing was copied
+        """
+        guest_path = self._moon_usage_path(cell)
+        await pair.moon.run_script_in_guest("/bin/sh", f"touch {guest_path}.stop")
+        host_dir = self.host_dir(pair)
+        if not host_dir:
+            return None
+        name = self.cell_file_name(cell, ".charon_moon.jsonl", start)
+        host_path = os.path.join(host_dir, name)
+        result = await pair.moon.copy_file_from_guest_to_host(
+            f"{guest_path}.jsonl", host_path
+        )
+        await pair.moon.delete_file_in_guest(f"{guest_path}.jsonl")
+        return host_path if result["return_code"] == 0 else None
+
+    async def crypto_benchmark(self, pair, algorithms=(), iterations=100):
+        """
+        Time the primitives of the handshakes on carol with the
+        crypto_bench script, see results_store.load_crypto
+        :param algorithms: Signature families and key exchanges, all the
+            script knows if empty
+        :return: The host path of the timings, None if they were not copied
+        """
+        result = await pair.carol.run_program_in_guest(
+            self.scripts["crypto_bench"],
+            program_arguments=[
+                "--iterations",
+                str(iterations),
+                "--output",
+                CRYPTO_RESULTS,
+                *algorithms,
+            ],
+        )
+        if result["return_code"] != 0:
+            raise RuntimeError(f"{pair.name}: crypto benchmark: {result['output']}")
+        return await self.fetch_results(pair, None, CRYPTO_RESULTS)
+
+    async def resume_point(self, pair, cell):
+        """
+        The number of iterations of an interrupted run of cell on pair that
+        can be kept, 0 for cells that did not start or run on another pair
+        """
+        entry = self.manifest.entry(self.entry_name(pair, cell))
+        if entry["status"] not in (RUNNING, FAILED) or entry.get("pair") != pair.name:
+            return 0
+        host_path = await self.fetch_results(pair, cell)
+        if host_path is not None:
+            done = count_iterations(host_path)
+            if self.resources:
+                await self.fetch_results(
+                    pair, cell, self.cell_file_name(cell, ".charon.csv")
+                )
+        else:
+            # Only known from the streamed records
+            done = entry["iterations"]
+        return min(done, self.cell_iterations(cell))
+
+    def entry_name(self, pair, cell):
+        """The manifest entry of cell when it runs on pair"""
+        if cell in self.replicated:
+            return entry_name(cell.name, pair.name)
+        return entry_name(cell.name)
+
+    async def run_cell(self, pair, cell):
+        """
+        Benchmark one cell on one pair
+        :return: The measurement's result and the host path of its results
+        """
+        if self.manifest is None:
+            return await self._run_cell(pair, cell)
+        name = self.entry_name(pair, cell)
+        if self.manifest.is_complete(name):
+            print(f"{pair.name}: skipping completed {cell.name}")
+            host_path = self.manifest.entry(name).get("host_path")
+            return {"result": None, "host_path": host_path}
+
+        start = None
+        if not self.load_connections:
+            start = await self.resume_point(pair, cell)
+            if start:
+                print(f"{pair.name}: resuming {cell.name} at iteration {start}")
+        self.manifest.update(
+            name,
+            status=RUNNING,
+            pair=pair.name,
+            iterations=start or 0,
+            target=0 if self.load_connections else self.cell_iterations(cell),
+            **cell._asdict(),
+        )
+        try:
+            outcome = await self._run_cell(pair, cell, start)
+        except Exception:
+            self.manifest.update(name, status=FAILED)
+            raise
+
+        host_path = outcome["host_path"]
+        fields = {
+            "status": COMPLETE,
+            "host_path": host_path,
+            "checksum": None,
+            "revert_timings": outcome["revert_timings"],
+            "network": outcome["network"],
+            "capture_path": outcome["capture_path"],
+            "usage_paths": outcome["usage_paths"],
+        }
+        if host_path is not None:
+            fields["checksum"] = file_digest(host_path)
+        if not self.load_connections:
+            fields["iterations"] = (
+                count_iterations(host_path)
+                if host_path
+                else self.cell_iterations(cell)
+            )
+        self.manifest.update(name, **fields)
+        return outcome
+
+    async def restore_results(self, pair, cell):
+        """
+        Put the results an interrupted cell kept on the host back on carol,
+        for the agent to continue them after a revert
+        """
+        guest_path = pair.measurements_path or self.guest_measurements_path
+        names = [self.result_name(cell)]
+        if self.resources:
+            names.append(self.cell_file_name(cell, ".charon.csv"))
+        await pair.carol.run_script_in_guest("/bin/sh", f"mkdir -p {guest_path}")
+        for name in names:
+            host_path = os.path.join(self.host_dir(pair), name)
+            if not os.path.exists(host_path):
+                continue
+            result = await pair.carol.copy_file_from_host_to_guest(
+                host_path, f"{guest_path}/{name}"
+            )
+            if result["return_code"] != 0:
+                raise RuntimeError(f"{pair.name}: {name}: {result['output']}")
+
+    async def _run_cell(self, pair, cell, start=None):
+        timings = None
+        if self.isolation is not None:
+            # The warm snapshot has the cell's configuration loaded
+            timings = await self.isolation.restore(self, pair, cell)
+            # The snapshot brings back the shaping it was taken with
+            pair.mode = None
+            if start:
+                await self.restore_results(pair, cell)
+        else:
+            if pair.certificate != cell.certificate:
+                await self.install_certificates(pair, cell.certificate)
+            await self.configure(pair, cell)
+        network = None
+        if self.network is not None and pair.mode != cell.mode:
+            network = await self.network.apply(pair, cell.mode)
+        usage_paths = None
+        if self.resources:
+            await self.start_moon_usage(pair, cell)
+        try:
+            result = await self.measure(pair, cell, start)
+        finally:
+            # Copied right away, the next cell's revert wipes them
+            host_path = await self.fetch_results(pair, cell)
+            if self.resources:
+                usage_paths = {
+                    "moon": await self.fetch_moon_usage(pair, cell, start)
+                }
+                if not self.load_connections:
+                    # The load generator keeps carol's figures in its summary
+                    usage_paths["carol"] = await self.fetch_results(
+                        pair, cell, self.cell_file_name(cell, ".charon.csv")
+                    )
+        if result["return_code"] != 0:
+            raise RuntimeError(f"{pair.name}: {cell.name}: {result['output']}")
+        print(f"{pair.name}: completed benchmark for {cell.name}")
+        capture_path = None
+        if self.capture is not None and not self.load_connections:
+            capture_path = await self.fetch_results(
+                pair, cell, self.cell_file_name(cell, ".pcap", start)
+            )
+            # The iterations' start times the handshakes are matched by
+            await self.fetch_results(
+                pair, cell, self.cell_file_name(cell, ".times", start)
+            )
+        return {
+            "result": result,
+            "host_path": host_path,
+            "revert_timings": timings,
+            "network": network,
+            "capture_path": capture_path,
+            "usage_paths": usage_paths,
+        }
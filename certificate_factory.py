@@ -0,0 +1,460 @@
+"""
+Generates the certificate families the benchmarks install, with
+strongSwan's pki.
+
+Every family directory holds a self-signed CA and the moon and carol keys
+and certificates it issued, optionally with many more carol identities for
+load runs in <family>/clients. Keys are generated and certificates issued
+in a process pool, and files that are already there are kept if they are
+still valid: the certificate verifies against the family's CA and matches
+its key. What was validated is remembered in <directory>/.factory.json by
+size and modification time, so repeated runs do not call pki again:
+
+    python certificate_factory.py [certificates] [--family rsa] \\
+        [--clients 10000] [--workers 8] [--force]
+
+A family name may give the key size of RSA and the curve of ECDSA, e.g.
+rsa3072 or ecdsa256, and a chain of intermediate CAs between the root and
+the leaves, e.g. falcon512-chain2 (caCert.pem -> int1Cert.pem ->
+int2Cert.pem -> moonCert.pem). --chain-depth, --rsa-size and --ecdsa-curve
+sweep the families, --spec prints their experiment entries:
+
+    python certificate_factory.py --family rsa --family dilithium3 \\
+        --chain-depth 0 --chain-depth 1 --chain-depth 3 --rsa-size 3072 --spec
+"""
+import argparse
+import collections
+import concurrent.futures
+import itertools
+import json
+import os
+import re
+import subprocess
+
+FAMILIES = (
+    "rsa",
+    "ecdsa",
+    "ed25519",
+    "dilithium2",
+    "dilithium3",
+    "dilithium5",
+    "falcon512",
+    "falcon1024",
+)
+# The key sizes pki accepts for the families with sizes
+KEY_SIZES = {"rsa": (2048, 3072, 4096, 8192), "ecdsa": (256, 384, 521)}
+# Families with intermediate CAs, e.g. falcon512-chain2
+CHAIN_SUFFIX = re.compile(r"-chain(\d+)$")
+CA_DN = "C=CH, O=Cyber, CN=Cyber Root CA"
+INTERMEDIATE_DN = "C=CH, O=Cyber, CN=Cyber Intermediate CA {}"
+CA_LIFETIME = 3652
+LIFETIME = 1461
+CLIENTS_DIR = "clients"
+MANIFEST_NAME = ".factory.json"
+# Leaves issued per pool task, amortizes the task overhead for many clients
+BATCH_SIZE = 50
+
+Leaf = collections.namedtuple("Leaf", ["name", "dn", "san"])
+
+PEERS = (
+    Leaf("moon", "C=CH, O=Cyber, CN=moon.strongswan.org", "moon.strongswan.org"),
+    Leaf("carol", "C=CH, O=Cyber, CN=carol@strongswan.org", "carol@strongswan.org"),
+)
+
+
+def client(i):
+    """The i-th extra carol identity"""
+    identity = f"carol{i}@strongswan.org"
+    name = os.path.join(CLIENTS_DIR, f"carol{i}")
+    return Leaf(name, f"C=CH, O=Cyber, CN={identity}", identity)
+
+
+def client_files(count):
+    """
+    The key and certificate files of the first count clients, relative to
+    the family directory
+    """
+    return [_paths("", client(i).name) for i in range(count)]
+
+
+def client_identities(count):
+    """
+    The (id, certificate file) of the first count clients, for
+    StrongSwan.write_load_configs
+    """
+    return [
+        (client(i).san, os.path.basename(client(i).name) + "Cert.pem")
+        for i in range(count)
+    ]
+
+
+def _pki(*args, output=None):
+    """
+    Run pki, writing its output atomically to output if given
+    :return: The output, if not written to a file
+    """
+    proc = subprocess.run(["pki", *args], capture_output=True)
+    if proc.returncode != 0:
+        raise RuntimeError(
+            f"pki {args[0]} failed: {proc.stderr.decode('utf-8', 'replace').strip()}"
+        )
+    if output is None:
+        return proc.stdout
+    with open(output + ".tmp", "wb") as f:
+        f.write(proc.stdout)
+    os.replace(output + ".tmp", output)
+    return None
+
+
+def chain_depth(signature):
+    """The number of intermediate CAs between a certificate and its root"""
+    match = CHAIN_SUFFIX.search(signature)
+    return int(match.group(1)) if match else 0
+
+
+def parse_family(family):
+    """
+    :return: The key type, the key size or None for pki's default, and the
+        number of intermediate CAs of a family name
+    :raise ValueError: If the size is not one pki accepts
+    """
+    base = CHAIN_SUFFIX.sub("", family)
+    match = re.fullmatch(r"(rsa|ecdsa)(\d+)", base)
+    if not match:
+        return base, None, chain_depth(family)
+    key_type, size = match.group(1), int(match.group(2))
+    if size not in KEY_SIZES[key_type]:
+        raise ValueError(f"{family}: {key_type} keys have {KEY_SIZES[key_type]} bits")
+    return key_type, size, chain_depth(family)
+
+
+def family_name(family, size=None, depth=0):
+    """The inverse of parse_family"""
+    return f"{family}{size or ''}" + (f"-chain{depth}" if depth else "")
+
+
+def signature_algorithm(family):
+    """The signature algorithm of a family, without its chain"""
+    key_type, size, _ = parse_family(family)
+    return family_name(key_type, size)
+
+
+def chain(family):
+    """The CAs of a family from the root to the one issuing the leaves"""
+    return ["ca"] + [f"int{i}" for i in range(1, parse_family(family)[2] + 1)]
+
+
+def intermediate_files(family):
+    """The certificate files of a family's intermediate CAs"""
+    return [f"{name}Cert.pem" for name in chain(family)[1:]]
+
+
+def _paths(family_dir, name):
+    return (
+        os.path.join(family_dir, f"{name}Key.pem"),
+        os.path.join(family_dir, f"{name}Cert.pem"),
+    )
+
+
+def _generate_key(family, key):
+    key_type, size, _ = parse_family(family)
+    size_args = ["--size", str(size)] if size else []
+    _pki("--gen", "--type", key_type, *size_args, "--outform", "pem", output=key)
+
+
+def generate_ca(family_dir, family):
+    """Generate the root CA and the intermediate CAs of a family"""
+    key, cert = _paths(family_dir, "ca")
+    os.makedirs(family_dir, exist_ok=True)
+    _generate_key(family, key)
+    _pki(
+        "--self", "--type", "priv", "--in", key, "--ca",
+        "--lifetime", str(CA_LIFETIME), "--dn", CA_DN, "--outform", "pem",
+        output=cert,
+    )
+    names = chain(family)
+    for depth, (issuer, name) in enumerate(zip(names, names[1:]), 1):
+        issuer_key, issuer_cert = _paths(family_dir, issuer)
+        key, cert = _paths(family_dir, name)
+        _generate_key(family, key)
+        _pki(
+            "--issue", "--cacert", issuer_cert, "--cakey", issuer_key,
+            "--type", "priv", "--in", key, "--ca", "--lifetime", str(CA_LIFETIME),
+            "--dn", INTERMEDIATE_DN.format(depth), "--outform", "pem",
+            output=cert,
+        )
+
+
+def issue(family_dir, family, leaf):
+    """
+    Generate a key for leaf and issue its certificate with the last CA of
+    the family's chain
+    """
+    ca_key, ca_cert = _paths(family_dir, chain(family)[-1])
+    key, cert = _paths(family_dir, leaf.name)
+    os.makedirs(os.path.dirname(key), exist_ok=True)
+    _generate_key(family, key)
+    _pki(
+        "--issue", "--cacert", ca_cert, "--cakey", ca_key,
+        "--type", "priv", "--in", key, "--lifetime", str(LIFETIME),
+        "--dn", leaf.dn, "--san", leaf.san, "--outform", "pem",
+        output=cert,
+    )
+
+
+def _chain_certs(family_dir):
+    return [_paths(family_dir, name)[1] for name in chain(os.path.basename(family_dir))]
+
+
+def _matches(family_dir, name):
+    """Whether name's certificate verifies against the chain and matches its key"""
+    key, cert = _paths(family_dir, name)
+    ca_certs = _chain_certs(family_dir)
+    paths = [key, cert] + ca_certs
+    if not all(os.path.exists(path) and os.path.getsize(path) for path in paths):
+        return False
+    ca_args = [arg for path in ca_certs for arg in ("--cacert", path)]
+    _pki("--verify", "--in", cert, *ca_args)
+    public = _pki("--pub", "--type", "priv", "--in", key, "--outform", "der")
+    return public == _pki("--pub", "--type", "x509", "--in", cert, "--outform", "der")
+
+
+def is_valid(family_dir, name):
+    """
+    Whether name's certificate verifies against the family's chain and
+    matches its key, for "ca" whether every CA of the chain does
+    """
+    names = chain(os.path.basename(family_dir)) if name == "ca" else [name]
+    try:
+        return all(_matches(family_dir, name) for name in names)
+    except RuntimeError:
+        return False
+
+
+def _issue_batch(family_dir, family, leaves):
+    for leaf in leaves:
+        issue(family_dir, family, leaf)
+    return len(leaves)
+
+
+def _validate_batch(family_dir, names):
+    return [name for name in names if is_valid(family_dir, name)]
+
+
+def _generate_ca_task(family_dir, family):
+    generate_ca(family_dir, family)
+    return family
+
+
+class FactoryManifest:
+    """
+    The files that were found valid, by the sizes and modification times of
+    the certificate, its key and the CAs of the chain
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.valid = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.valid = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+    @staticmethod
+    def stamp(family_dir, name):
+        stamp = []
+        paths = list(_paths(family_dir, name)) + _chain_certs(family_dir)
+        if name == "ca":
+            paths += [
+                path
+                for link in chain(os.path.basename(family_dir))
+                for path in _paths(family_dir, link)
+            ]
+        for path in paths:
+            if not os.path.exists(path):
+                return None
+            stat = os.stat(path)
+            stamp += [stat.st_size, stat.st_mtime_ns]
+        return stamp
+
+    def key(self, family_dir, name):
+        return os.path.join(os.path.basename(family_dir), name)
+
+    def is_known(self, family_dir, name):
+        stamp = self.stamp(family_dir, name)
+        return stamp is not None and self.valid.get(self.key(family_dir, name)) == stamp
+
+    def add(self, family_dir, name):
+        self.valid[self.key(family_dir, name)] = self.stamp(family_dir, name)
+
+    def save(self):
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(self.valid, f)
+        os.replace(self.path + ".tmp", self.path)
+
+
+def _batches(items, size=BATCH_SIZE):
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def build(directory, families=FAMILIES, clients=0, workers=None, force=False):
+    """
+    Generate what is missing or invalid of the families in directory
+    :param clients: Extra carol identities per family
+    :param workers: Size of the process pool, the number of CPUs if None
+    :param force: Generate everything again
+    :return: {family: number of certificates issued, CAs included}
+    :raise ValueError: If a family has a key size pki does not accept
+    """
+    for family in families:
+        parse_family(family)
+    os.makedirs(directory, exist_ok=True)
+    manifest = FactoryManifest(os.path.join(directory, MANIFEST_NAME))
+    leaves = list(PEERS) + [client(i) for i in range(clients)]
+    issued = {family: 0 for family in families}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        # Check the CAs and leaves the manifest does not know yet
+        unknown = {}
+        for family in families:
+            family_dir = os.path.join(directory, family)
+            names = ["ca"] + [leaf.name for leaf in leaves]
+            if force:
+                unknown[family] = set(names)
+                continue
+            unknown[family] = {
+                name for name in names if not manifest.is_known(family_dir, name)
+            }
+        futures = {
+            pool.submit(_validate_batch, os.path.join(directory, family), batch): family
+            for family, names in unknown.items()
+            if not force
+            for batch in _batches(sorted(names))
+        }
+        for future in concurrent.futures.as_completed(futures):
+            family = futures[future]
+            for name in future.result():
+                manifest.add(os.path.join(directory, family), name)
+                unknown[family].discard(name)
+
+        # A new CA invalidates every certificate of its family
+        stale_cas = [family for family in families if "ca" in unknown[family]]
+        futures = [
+            pool.submit(_generate_ca_task, os.path.join(directory, family), family)
+            for family in stale_cas
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            family = future.result()
+            manifest.add(os.path.join(directory, family), "ca")
+            issued[family] += len(chain(family))
+
+        futures = {}
+        for family in families:
+            family_dir = os.path.join(directory, family)
+            stale = [
+                leaf
+                for leaf in leaves
+                if family in stale_cas or leaf.name in unknown[family]
+            ]
+            for batch in _batches(stale):
+                future = pool.submit(_issue_batch, family_dir, family, batch)
+                futures[future] = (family, [leaf.name for leaf in batch])
+        for future in concurrent.futures.as_completed(futures):
+            family, names = futures[future]
+            issued[family] += future.result()
+            for name in names:
+                manifest.add(os.path.join(directory, family), name)
+    manifest.save()
+    return issued
+
+
+def sweep(families, depths=(0,), rsa_sizes=(), ecdsa_curves=()):
+    """
+    The family names of every family, RSA key size or ECDSA curve and chain
+    depth, rsa and ecdsa keep pki's default size if no sizes are given
+    """
+    names = []
+    for family, depth in itertools.product(families, depths):
+        sizes = {"rsa": rsa_sizes, "ecdsa": ecdsa_curves}.get(family) or [None]
+        names += [family_name(family, size, depth) for size in sizes]
+    return list(dict.fromkeys(names))
+
+
+def spec_entries(families):
+    """
+    The [certificates.<family>] tables of an experiment spec, see
+    experiment.py
+    """
+    entries = []
+    for family in families:
+        key_type, size, depth = parse_family(family)
+        label = key_type.upper() if key_type in KEY_SIZES else key_type.capitalize()
+        if size:
+            label += f"-{size}" if key_type == "rsa" else f" P-{size}"
+        if depth:
+            label += f" ({depth} intermediate{'s' if depth > 1 else ''})"
+        entries.append(f'[certificates.{family}]\nlabel = "{label}"\n')
+    return "\n".join(entries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate certificate families")
+    parser.add_argument("directory", nargs="?", default="certificates")
+    parser.add_argument(
+        "--family",
+        action="append",
+        help="Only this family, e.g. rsa, rsa3072, ecdsa256 or dilithium2-chain2",
+    )
+    parser.add_argument(
+        "--chain-depth",
+        action="append",
+        type=int,
+        help="Also generate each family with this many intermediate CAs",
+    )
+    parser.add_argument(
+        "--rsa-size",
+        action="append",
+        type=int,
+        choices=KEY_SIZES["rsa"],
+        help="Generate rsa with this key size",
+    )
+    parser.add_argument(
+        "--ecdsa-curve",
+        action="append",
+        type=int,
+        choices=KEY_SIZES["ecdsa"],
+        help="Generate ecdsa on this NIST curve",
+    )
+    parser.add_argument(
+        "--clients", type=int, default=0, help="Extra carol identities per family"
+    )
+    parser.add_argument("--workers", type=int, help="Processes running pki")
+    parser.add_argument("--force", action="store_true", help="Generate everything")
+    parser.add_argument(
+        "--spec",
+        action="store_true",
+        help="Print the experiment entries of the families",
+    )
+    args = parser.parse_args(argv)
+
+    families = sweep(
+        args.family or FAMILIES,
+        args.chain_depth or [0],
+        args.rsa_size or (),
+        args.ecdsa_curve or (),
+    )
+    try:
+        issued = build(args.directory, families, args.clients, args.workers, args.force)
+    except ValueError as e:
+        parser.error(str(e))
+    for family, count in issued.items():
+        print(f"{family}: {count} certificates issued" if count else f"{family}: valid")
+    if args.spec:
+        print()
+        print(spec_entries(families))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
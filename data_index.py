@@ -0,0 +1,309 @@
+"""
+Metadata of result files and an index over a data directory.
+
+Result files are named <certificate>_<proposal>_<mode>.txt, or
+load_<certificate>_<proposal>_<mode>.json for throughput runs, optionally in
+a per-pair sub directory. Certificates signed through N intermediate CAs
+end in -chain<N>, see certificate_factory.py. Modes name the network
+conditions in several styles (unlimited, 05pl, 0ping1pl, 100ping,
+200ping0pl, 100ping05pl), which parse_mode normalizes into the round trip
+delay and loss that netem.py applies for them.
+
+    python data_index.py data/ dilithium 200
+
+lists the runs of a family (or certificate) at a round trip delay.
+"""
+import collections
+import json
+import os
+import re
+import sys
+
+from certificate_factory import CHAIN_SUFFIX, chain_depth
+from netem import NetemProfile
+
+INDEX_NAME = ".index.json"
+# The timings of shell_scripts/crypto_bench.py, see results_store.load_crypto
+CRYPTO_RESULTS = "crypto_bench.csv"
+# Certificate names ending in a security level or key size, grouped into
+# one family
+LEVELLED_FAMILIES = (
+    "dilithium",
+    "falcon",
+    "mldsa",
+    "slhdsa",
+    "sphincs",
+    "rsa",
+    "ecdsa",
+)
+PROPOSAL_TOKEN = re.compile(r"^(?:ke\d+_)?[a-z0-9]+$")
+
+Run = collections.namedtuple(
+    "Run",
+    [
+        "path",
+        "kind",
+        "signature",
+        "family",
+        "chain_depth",
+        "proposal",
+        "kem_chain",
+        "mode",
+        "delay_ms",
+        "loss_pct",
+        "pair",
+    ],
+)
+
+
+def parse_mode(mode):
+    """
+    The network conditions of a mode
+    :return: Round trip delay in ms and loss per round trip in percent
+    :raises ValueError: For names that are not modes
+    """
+    profile = NetemProfile.from_mode(mode)
+    # Both sides delay and drop packets
+    return profile.expected_rtt_ms(), 2 * profile.loss
+
+
+def describe_mode(mode):
+    """A plot label for a mode, e.g. "1% Packet Loss" for 100ping05pl"""
+    _, loss_pct = parse_mode(mode)
+    return f"{loss_pct:g}% Packet Loss"
+
+
+def signature_family(signature):
+    signature = CHAIN_SUFFIX.sub("", signature)
+    for family in LEVELLED_FAMILIES:
+        if re.fullmatch(rf"{family}\d+", signature):
+            return family
+    return signature
+
+
+def kem_chain(proposal):
+    """
+    The key exchanges of a proposal in the order they run, e.g.
+    ("x25519", "kyber3") for ke1_kyber3-x25519
+    """
+    initial, additional = None, {}
+    for token in proposal.split("-"):
+        prefix, _, algorithm = token.partition("_")
+        if algorithm:
+            additional[int(prefix[2:])] = algorithm
+        else:
+            initial = token
+    return (initial,) + tuple(additional[i] for i in sorted(additional))
+
+
+def parse_file_name(file_name, pair=None):
+    """
+    Split a result file's name into its metadata
+    :return: A Run, or None if the file is not a result file
+    """
+    name, extension = os.path.splitext(file_name)
+    kind = {".txt": "latency", ".json": "load"}.get(extension)
+    if kind == "load":
+        if not name.startswith("load_"):
+            return None
+        name = name[len("load_") :]
+    elif kind is None:
+        return None
+
+    # Certificates have no underscores, modes neither, proposals do
+    parts = name.split("_")
+    if len(parts) < 3:
+        return None
+    signature, mode, proposal = parts[0], parts[-1], "_".join(parts[1:-1])
+    if not all(PROPOSAL_TOKEN.match(token) for token in proposal.split("-")):
+        return None
+    try:
+        delay_ms, loss_pct = parse_mode(mode)
+    except ValueError:
+        return None
+    return Run(
+        file_name if pair is None else os.path.join(pair, file_name),
+        kind,
+        signature,
+        signature_family(signature),
+        chain_depth(signature),
+        proposal,
+        kem_chain(proposal),
+        mode,
+        delay_ms,
+        loss_pct,
+        pair,
+    )
+
+
+def parse_cell_file(file_name, suffix, pair=None):
+    """
+    Split the name of a file kept next to a cell's results, e.g. a
+    capture, named <cell><suffix> or <cell>.<start><suffix> when it starts
+    at iteration start, load_<cell><suffix> next to load results
+    :return: The cell's Run and start, or None for other files
+    """
+    if not file_name.endswith(suffix):
+        return None
+    name = file_name[: -len(suffix)]
+    start = 0
+    head, _, tail = name.rpartition(".")
+    if head and tail.isdigit():
+        name, start = head, int(tail)
+    extension = ".json" if name.startswith("load_") else ".txt"
+    run = parse_file_name(name + extension, pair)
+    return (run, start) if run else None
+
+
+def cell_files(data_dir, suffix):
+    """The (path, Run, start) of each <cell><suffix> file of a data directory"""
+    for entry in sorted(os.scandir(data_dir), key=lambda e: e.name):
+        entries = [(entry, None)]
+        if entry.is_dir():
+            entries = [
+                (sub_entry, entry.name)
+                for sub_entry in sorted(os.scandir(entry.path), key=lambda e: e.name)
+            ]
+        for file_entry, pair in entries:
+            parsed = file_entry.is_file() and parse_cell_file(
+                file_entry.name, suffix, pair
+            )
+            if parsed:
+                yield (file_entry.path, *parsed)
+
+
+class DataIndex:
+    """
+    Index of the result files of a data directory. Parsed names and
+    iteration counts are cached in <data_dir>/.index.json and only files
+    whose size or modification time changed are read again.
+    """
+
+    FIELDS = ("kind", "signature", "family", "chain_depth", "proposal", "mode",
+              "delay_ms", "loss_pct", "pair")
+
+    def __init__(self, data_dir, cache=True):
+        self.data_dir = data_dir
+        self.cache_path = os.path.join(data_dir, INDEX_NAME) if cache else None
+        self.runs = {}
+        self.iterations = {}
+        # [size, modification time in ns] of each result file
+        self.stamps = {}
+        self._by_field = {}
+        self.refresh()
+
+    def _scan(self):
+        for entry in os.scandir(self.data_dir):
+            if entry.is_dir():
+                for sub_entry in os.scandir(entry.path):
+                    if sub_entry.is_file():
+                        yield sub_entry, entry.name
+            elif entry.is_file():
+                yield entry, None
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def refresh(self):
+        """Pick up new, changed and removed result files"""
+        cached = self._load_cache()
+        entries = {}
+        for entry, pair in self._scan():
+            run = parse_file_name(entry.name, pair)
+            if run is None:
+                continue
+            stat = entry.stat()
+            stamp = [stat.st_size, stat.st_mtime_ns]
+            previous = cached.get(run.path)
+            if previous and previous["stamp"] == stamp:
+                iterations = previous["iterations"]
+            else:
+                iterations = self._count(entry.path, run.kind)
+            entries[run.path] = {"stamp": stamp, "iterations": iterations}
+            self.runs[run.path] = run
+            self.iterations[run.path] = iterations
+            self.stamps[run.path] = stamp
+        for path in set(self.runs) - set(entries):
+            del self.runs[path]
+            del self.iterations[path]
+            del self.stamps[path]
+
+        self._by_field = {field: collections.defaultdict(set) for field in self.FIELDS}
+        for path, run in self.runs.items():
+            for field in self.FIELDS:
+                self._by_field[field][getattr(run, field)].add(path)
+
+        if self.cache_path and entries != cached:
+            with open(self.cache_path, "w") as f:
+                json.dump(entries, f)
+
+    @staticmethod
+    def _count(path, kind):
+        if kind == "load":
+            with open(path, "r") as f:
+                return json.load(f).get("established", 0)
+        with open(path, "rb") as f:
+            return len(f.read().split())
+
+    def find(self, **criteria):
+        """
+        The runs matching all criteria, e.g. find(family="dilithium",
+        delay_ms=200). Criteria are fields of Run, a set of values matches
+        any of them.
+        """
+        paths = None
+        for field, value in sorted(criteria.items(), key=lambda item: item[0]):
+            if field not in self._by_field:
+                raise ValueError(f"Cannot search by {field}")
+            values = value if isinstance(value, (set, frozenset)) else {value}
+            matches = set()
+            for value in values:
+                matches |= self._by_field[field].get(value, set())
+            paths = matches if paths is None else paths & matches
+            if not paths:
+                return []
+        paths = self.runs if paths is None else paths
+        return sorted((self.runs[path] for path in paths), key=lambda run: run.path)
+
+    def get(self, signature, proposal, mode, pair=None, kind="latency"):
+        """The run of one cell, or None"""
+        name = f"{signature}_{proposal}_{mode}"
+        file_name = f"load_{name}.json" if kind == "load" else f"{name}.txt"
+        return self.runs.get(file_name if pair is None else os.path.join(pair, file_name))
+
+    def complete(self, signature, proposal, mode, iterations, pair=None):
+        """Whether a cell's latencies are here with at least iterations lines"""
+        run = self.get(signature, proposal, mode, pair)
+        return run is not None and self.iterations[run.path] >= iterations
+
+    def path(self, run):
+        return os.path.join(self.data_dir, run.path)
+
+    def values(self, field, **criteria):
+        """The distinct values of a field among the matching runs"""
+        return sorted({getattr(run, field) for run in self.find(**criteria)}, key=str)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__.strip())
+        sys.exit(2)
+    index = DataIndex(sys.argv[1])
+    criteria = {}
+    if len(sys.argv) > 2:
+        name = sys.argv[2]
+        criteria["family" if name in LEVELLED_FAMILIES else "signature"] = name
+    if len(sys.argv) > 3:
+        criteria["delay_ms"] = float(sys.argv[3])
+    for run in index.find(**criteria):
+        print(
+            f"{run.path}: {run.signature} {'+'.join(run.kem_chain)} "
+            f"{run.delay_ms:g}ms {run.loss_pct:g}% loss, "
+            f"{index.iterations[run.path]} iterations"
+        )
@@ -0,0 +1,132 @@
+import collections
+import os
+import tomllib
+
+from data_index import describe_mode
+from netem import NetemProfile
+
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "experiments", "default.toml"
+)
+AXES = ("mode", "certificate", "proposal")
+
+
+class Cell(collections.namedtuple("Cell", ["certificate", "proposal", "mode"])):
+    """One entry of the certificates x proposals x modes matrix"""
+
+    @property
+    def name(self):
+        return f"{self.certificate}_{self.proposal}_{self.mode}"
+
+
+def matrix(certificates, proposals, modes, order=AXES):
+    """
+    All cells of the given axes
+    :param order: The loop nesting, outermost first
+    """
+    values = {"certificate": certificates, "proposal": proposals, "mode": modes}
+    cells = [{}]
+    for axis in order:
+        cells = [dict(cell, **{axis: value}) for cell in cells for value in values[axis]]
+    return [Cell(**cell) for cell in cells]
+
+
+class Experiment:
+    """
+    Certificate families, KEM proposals and network modes of an experiment,
+    shared by the benchmark runner and plotting.py
+    """
+
+    def __init__(self, spec):
+        benchmark = spec.get("benchmark", {})
+        self.base_proposal = benchmark.get("base_proposal", "aes256-sha256")
+        self.iterations = int(benchmark.get("iterations", 500))
+        self.order = tuple(benchmark.get("order", AXES))
+        if sorted(self.order) != sorted(AXES):
+            raise ValueError(f"order has to list each of {', '.join(AXES)} once")
+        self.certificates = spec.get("certificates", {})
+        self.proposals = spec.get("proposals", {})
+        self.modes = spec.get("modes", {})
+        self.profiles = spec.get("profiles", {})
+        self.figures = spec.get("figures", {})
+
+        run = spec.get("run", {})
+        self.run_certificates = self._select(run, "certificates")
+        self.run_proposals = self._select(run, "proposals")
+        self.run_modes = self._select(run, "modes")
+
+    def _select(self, run, axis):
+        known = getattr(self, axis)
+        names = run.get(axis, list(known))
+        unknown = [name for name in names if name not in known]
+        if unknown:
+            raise ValueError(f"Unknown {axis} in [run]: {', '.join(unknown)}")
+        return names
+
+    def label(self, axis, name):
+        """
+        The display label of a certificate, proposal or mode, modes without
+        one are labelled by their loss
+        """
+        entry = getattr(self, axis)[name]
+        if "label" not in entry and axis == "modes":
+            try:
+                return describe_mode(name)
+            except ValueError:
+                pass
+        return entry.get("label", name)
+
+    def labels(self, axis, names=None):
+        return [self.label(axis, name) for name in names or getattr(self, axis)]
+
+    def group(self, name):
+        """The modes of a plot group, mapped to their labels"""
+        return {
+            mode: self.label("modes", mode)
+            for mode, entry in self.modes.items()
+            if entry.get("group") == name
+        }
+
+    def groups(self):
+        """The mode groups, in the order of their first mode"""
+        names = (entry.get("group") for entry in self.modes.values())
+        return list(dict.fromkeys(name for name in names if name))
+
+    def mode_iterations(self):
+        """Iterations of the modes overriding the benchmark's"""
+        return {
+            mode: int(entry["iterations"])
+            for mode, entry in self.modes.items()
+            if "iterations" in entry
+        }
+
+    def iterations_of(self, mode):
+        return self.mode_iterations().get(mode, self.iterations)
+
+    def netem_profile(self, mode):
+        """
+        The network profile of a mode: its netem table, the [profiles] entry
+        it names, or else one derived from the mode's name
+        """
+        entry = self.modes.get(mode, {})
+        if "netem" in entry:
+            return NetemProfile.from_spec(entry["netem"], mode)
+        if "profile" in entry:
+            name = entry["profile"]
+            return NetemProfile.from_spec(self.profiles[name], name)
+        return NetemProfile.from_mode(mode)
+
+    def cells(self):
+        """The cells to benchmark, in the configured order"""
+        return matrix(
+            self.run_certificates, self.run_proposals, self.run_modes, self.order
+        )
+
+
+def load(path=None):
+    """
+    Read an experiment spec
+    :param path: The TOML file, by default $EXPERIMENT or the default spec
+    """
+    with open(path or os.getenv("EXPERIMENT") or DEFAULT_PATH, "rb") as f:
+        return Experiment(tomllib.load(f))
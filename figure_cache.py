@@ -0,0 +1,202 @@
+"""
+Incremental rendering of the experiment's figures.
+
+Every plot is fingerprinted with the hashes of its result files, its
+resolved spec (bars, labels, file name) and the rendering settings. The
+fingerprints are kept in <output_dir>/.figures.json, and only plots whose
+fingerprint changed or whose PNG is missing are rendered again, spread over
+a process pool:
+
+    python figure_cache.py [data_dir] [--workers 4] [--force]
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+
+from dotenv import load_dotenv
+
+import plotting
+import result_sync
+from data_index import DataIndex
+from experiment import load as load_experiment
+from latency_stats import cell_stats, cell_values
+from results_store import load_results
+from vmware_fusion_py import file_digest
+
+MANIFEST_NAME = ".figures.json"
+
+
+class FigureManifest:
+    """
+    The fingerprints of the rendered plots and the digests of the result
+    files they were computed from. Digests are reused while a file keeps
+    its size and modification time.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.figures = {}
+        self.files = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    manifest = json.load(f)
+                self.figures = manifest.get("figures", {})
+                self.files = manifest.get("files", {})
+            except (OSError, ValueError):
+                pass
+
+    def save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(
+                {"figures": self.figures, "files": self.files},
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+        os.replace(temp_path, self.path)
+
+    def digest(self, path):
+        stat = os.stat(path)
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        cached = self.files.get(path)
+        if cached and cached["stamp"] == stamp:
+            return cached["digest"]
+        digest = file_digest(path)
+        self.files[path] = {"stamp": stamp, "digest": digest}
+        return digest
+
+
+def fingerprint(manifest, index, plot, data, dpi):
+    """
+    Hash everything a plot is derived from
+    :param data: The plot's plotting.Bars
+    """
+    inputs = {}
+    for _, cells in data.series:
+        for certificate, proposal, mode in cells:
+            runs = index.find(
+                kind="latency", signature=certificate, proposal=proposal, mode=mode
+            )
+            for run in runs:
+                path = index.path(run)
+                inputs[run.path] = manifest.digest(path)
+    spec = {
+        "plot": plot._asdict(),
+        "bars": data._asdict(),
+        "dpi": dpi,
+        "figsize": plotting.FIGSIZE,
+        "inputs": inputs,
+    }
+    encoded = json.dumps(spec, sort_keys=True, default=list).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+_figure = None
+
+
+def _render(plot, data, means, path, dpi):
+    # Each worker process draws all its plots onto one figure
+    global _figure
+    if _figure is None:
+        _figure = plotting.new_figure()
+    plotting.save(_figure, plot, data, means, path, dpi)
+    return path
+
+
+def build(
+    experiment,
+    data_dir,
+    output_dir=None,
+    only=None,
+    dpi=plotting.DPI,
+    workers=None,
+    force=False,
+):
+    """
+    Render the stale plots of an experiment
+    :param workers: Size of the process pool, the number of CPUs if None
+    :param force: Render every plot
+    :return: The paths of the plots that were rendered
+    """
+    output_dir = output_dir or data_dir
+    manifest = FigureManifest(os.path.join(output_dir, MANIFEST_NAME))
+    index = DataIndex(data_dir)
+
+    stale = []
+    for plot in plotting.plots(experiment, only):
+        data = plotting.bars(experiment, plot)
+        path = plotting.output_path(plot, output_dir)
+        key = os.path.basename(path)
+        digest = fingerprint(manifest, index, plot, data, dpi)
+        if force or manifest.figures.get(key) != digest or not os.path.exists(path):
+            stale.append((plot, data, path, key, digest))
+    if not stale:
+        manifest.save()
+        print("All plots are up to date")
+        return []
+
+    stats = cell_stats(load_results(data_dir), resamples=0)
+    values = {}
+    rendered = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for plot, data, path, key, digest in stale:
+            # Only the plotted cells are sent to the workers
+            statistic = plot.spec.get("statistic", "mean")
+            if statistic not in values:
+                values[statistic] = cell_values(stats, statistic)
+            means = values[statistic]
+            cells = {cell for _, series in data.series for cell in series}
+            plot_means = {cell: means[cell] for cell in cells if cell in means}
+            future = pool.submit(_render, plot, data, plot_means, path, dpi)
+            futures[future] = (key, digest)
+        for future in concurrent.futures.as_completed(futures):
+            key, digest = futures[future]
+            rendered.append(future.result())
+            manifest.figures[key] = digest
+    manifest.save()
+    return rendered
+
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Render the experiment's figures")
+    parser.add_argument("data_dir", nargs="?", default=os.getenv("HOST_DATA_PATH"))
+    parser.add_argument("--experiment", help="Experiment spec, see experiment.py")
+    parser.add_argument("--output", help="Directory of the plots, data_dir by default")
+    parser.add_argument("--only", action="append", help="Render only this figure")
+    parser.add_argument("--dpi", type=int, default=plotting.DPI)
+    parser.add_argument("--workers", type=int, help="Processes rendering plots")
+    parser.add_argument("--force", action="store_true", help="Render every plot")
+    parser.add_argument("--download", action="store_true")
+    args = parser.parse_args(argv)
+    if not args.data_dir:
+        parser.error("data_dir or HOST_DATA_PATH is required")
+    if args.download and not os.getenv("GUEST_MEASUREMENTS_PATH"):
+        parser.error("--download needs GUEST_MEASUREMENTS_PATH")
+
+    experiment = load_experiment(args.experiment)
+    if args.download:
+        result_sync.sync(
+            result_sync.carol_from_env(),
+            os.getenv("GUEST_MEASUREMENTS_PATH"),
+            args.data_dir,
+        )
+    build(
+        experiment,
+        args.data_dir,
+        args.output,
+        args.only,
+        args.dpi,
+        args.workers,
+        args.force,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
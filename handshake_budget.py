@@ -0,0 +1,128 @@
+"""
+Splits each cell's mean handshake latency into compute, network round
+trips and the rest.
+
+Compute is priced from the primitive timings of crypto_bench.py (see
+results_store.load_crypto). A handshake runs, one after another, a keygen,
+encaps and decaps per key exchange of its proposal, and two signatures and
+four verifications (each peer checks the other's certificate and AUTH
+payload), plus two per intermediate CA of a chained family. Signatures are
+priced with the key size or curve of the family, e.g. rsa3072. It takes one
+round trip per exchange: IKE_SA_INIT, an IKE_INTERMEDIATE per additional
+key exchange, and IKE_AUTH. The rest is process start-up, fragmentation
+and, under loss, retransmissions:
+
+    python handshake_budget.py data/ --where mode=100ping
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from certificate_factory import signature_algorithm
+from data_index import chain_depth, kem_chain
+from latency_stats import KEY, select
+from results_store import load_crypto, load_results
+
+SIGNATURE_OPERATIONS = {"sign": 2, "verify": 4}
+KEM_OPERATIONS = {"keygen": 1, "encaps": 1, "decaps": 1}
+
+
+def operation_costs(crypto):
+    """:return: {(algorithm, operation): median seconds}"""
+    medians = crypto.groupby(["algorithm", "operation"], observed=True)["seconds"]
+    return medians.median().to_dict()
+
+
+def _cost(costs, algorithm, operations):
+    return sum(
+        count * costs.get((algorithm, operation), np.nan)
+        for operation, count in operations.items()
+    )
+
+
+def signature_cost(costs, certificate):
+    """Both peers' signing and verification with a certificate family"""
+    operations = dict(SIGNATURE_OPERATIONS)
+    operations["verify"] += 2 * chain_depth(certificate)
+    return _cost(costs, signature_algorithm(certificate), operations)
+
+
+def round_trips(proposal):
+    """The exchanges of a handshake, one round trip each"""
+    return 1 + len(kem_chain(proposal))
+
+
+def decompose(frame, crypto):
+    """
+    :param frame: A results table, see results_store
+    :param crypto: The primitive timings, see results_store.load_crypto
+    :return: The mean latency of each cell and its signature, key exchange,
+        network and remaining share, in seconds. Shares are NaN where an
+        algorithm was not benchmarked.
+    """
+    costs = operation_costs(crypto)
+    grouped = frame.groupby(KEY, observed=True, sort=True)
+    table = grouped.agg(latency=("latency", "mean"), delay_ms=("delay_ms", "first"))
+    certificates = table.index.get_level_values("certificate")
+    proposals = table.index.get_level_values("proposal")
+    table["signature"] = [
+        signature_cost(costs, certificate) for certificate in certificates
+    ]
+    table["key_exchange"] = [
+        sum(_cost(costs, kem, KEM_OPERATIONS) for kem in kem_chain(proposal))
+        for proposal in proposals
+    ]
+    table["network"] = [
+        round_trips(proposal) * delay_ms / 1000
+        for proposal, delay_ms in zip(proposals, table["delay_ms"])
+    ]
+    table["rest"] = (
+        table["latency"] - table["signature"] - table["key_exchange"] - table["network"]
+    )
+    table["compute_share"] = (table["signature"] + table["key_exchange"]) / table[
+        "latency"
+    ]
+    return table.drop(columns="delay_ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decompose handshake latencies")
+    parser.add_argument("data_dir", nargs="?", default=os.getenv("HOST_DATA_PATH"))
+    parser.add_argument(
+        "--where", action="append", default=[], help="column=value, e.g. mode=100ping"
+    )
+    parser.add_argument("--csv", help="Write the decomposition here")
+    args = parser.parse_args(argv)
+    if not args.data_dir:
+        parser.error("data_dir or HOST_DATA_PATH is required")
+
+    crypto = load_crypto(args.data_dir)
+    if crypto.empty:
+        print("No primitive timings, run shell_scripts/crypto_bench.py first")
+        return 1
+    try:
+        frame = select(
+            load_results(args.data_dir),
+            **dict(condition.split("=", 1) for condition in args.where),
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    if frame.empty:
+        print("No latencies match")
+        return 1
+    table = decompose(frame, crypto)
+    if args.csv:
+        table.to_csv(args.csv)
+    columns = ["latency", "signature", "key_exchange", "network", "rest"]
+    with pd.option_context(
+        "display.max_rows", None, "display.max_columns", None, "display.width", 250
+    ):
+        in_ms = {column: table[column] * 1000 for column in columns}
+        print(table.assign(**in_ms).round(3))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
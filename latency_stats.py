@@ -0,0 +1,284 @@
+"""
+Distribution statistics of the handshake latencies of every cell.
+
+The latencies of all cells are laid out as one NaN-padded matrix with a row
+per cell, so percentiles, trimmed means and bootstrap confidence intervals
+are computed for every cell at once:
+
+    python latency_stats.py data/ --where mode=100ping05pl --cdf cdf.png
+    python latency_stats.py data/ --csv stats.csv --slo p99=1500
+
+Latencies are in seconds in the tables, the command line prints and takes
+milliseconds.
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from results_store import load_results
+
+KEY = ["certificate", "proposal", "mode"]
+PERCENTILES = (50, 90, 99, 99.9)
+# Values drawn per bootstrap batch, bounds the memory of a batch
+BOOTSTRAP_BATCH = 1 << 22
+
+
+def percentile_column(q):
+    return f"p{q:g}"
+
+
+def padded(frame, by=KEY):
+    """
+    The latencies of each cell as rows of one matrix
+    :return: The cells' keys, the (cells x max iterations) matrix padded
+        with NaN and the number of latencies per cell
+    """
+    grouped = frame.groupby(by, observed=True, sort=True)
+    keys = list(grouped.size().index)
+    ids = grouped.ngroup().to_numpy()
+    counts = np.bincount(ids, minlength=len(keys))
+    order = np.argsort(ids, kind="stable")
+    sorted_ids = ids[order]
+    offsets = np.cumsum(counts) - counts
+    positions = np.arange(len(ids)) - offsets[sorted_ids]
+    matrix = np.full((len(keys), counts.max(initial=0)), np.nan)
+    matrix[sorted_ids, positions] = frame["latency"].to_numpy()[order]
+    return keys, matrix, counts
+
+
+def row_percentiles(ordered, counts, percentiles):
+    """
+    Linearly interpolated percentiles of each row, like np.percentile
+    :param ordered: Rows sorted ascending, NaN padding last
+    """
+    q = np.asarray(percentiles, dtype=np.float64) / 100
+    positions = q[None, :] * (counts[:, None] - 1)
+    low = np.floor(positions).astype(np.int64)
+    high = np.ceil(positions).astype(np.int64)
+    fraction = positions - low
+    low_values = np.take_along_axis(ordered, low, axis=1)
+    high_values = np.take_along_axis(ordered, high, axis=1)
+    return low_values + (high_values - low_values) * fraction
+
+
+def row_trimmed_means(ordered, counts, trim):
+    """Means of each row without its trim fraction of lowest and highest values"""
+    cut = np.floor(trim * counts).astype(np.int64)
+    sums = np.cumsum(np.nan_to_num(ordered), axis=1)
+    sums = np.concatenate([np.zeros((len(sums), 1)), sums], axis=1)
+    rows = np.arange(len(counts))
+    kept = sums[rows, counts - cut] - sums[rows, cut]
+    return kept / (counts - 2 * cut)
+
+
+def bootstrap_means(matrix, counts, resamples=1000, rng=None, batch=BOOTSTRAP_BATCH):
+    """
+    Resample every row with replacement
+    :return: A (rows x resamples) matrix of the resamples' means
+    """
+    rng = np.random.default_rng(rng)
+    rows, width = matrix.shape
+    filled = np.nan_to_num(matrix)
+    means = np.empty((rows, resamples))
+    # Rows are resampled width times, draws beyond a row's count are masked
+    step = max(1, batch // max(1, resamples * width))
+    mask = np.arange(width)[None, :] < counts[:, None]
+    for start in range(0, rows, step):
+        part = slice(start, start + step)
+        n = counts[part]
+        draws = (rng.random((len(n), resamples, width)) * n[:, None, None]).astype(
+            np.int64
+        )
+        values = np.take_along_axis(filled[part][:, None, :], draws, axis=2)
+        means[part] = (values * mask[part][:, None, :]).sum(axis=2) / n[:, None]
+    return means
+
+
+def cell_stats(
+    frame,
+    percentiles=PERCENTILES,
+    trim=0.1,
+    resamples=1000,
+    confidence=0.95,
+    seed=0,
+):
+    """
+    Statistics of each cell of a results table
+    :param trim: Fraction cut from each end for the trimmed mean
+    :param resamples: Bootstrap resamples for the mean's confidence
+        interval, 0 to skip it
+    :return: A DataFrame indexed by certificate, proposal and mode with
+        count, mean, std, trimmed_mean, p50 ... and ci_low/ci_high
+    """
+    keys, matrix, counts = padded(frame)
+    ordered = np.sort(matrix, axis=1)
+    stats = {
+        "count": counts,
+        "mean": np.nanmean(matrix, axis=1),
+        "std": np.nanstd(matrix, axis=1),
+        "trimmed_mean": row_trimmed_means(ordered, counts, trim),
+    }
+    values = row_percentiles(ordered, counts, percentiles)
+    for i, q in enumerate(percentiles):
+        stats[percentile_column(q)] = values[:, i]
+    if resamples:
+        means = bootstrap_means(matrix, counts, resamples, seed)
+        alpha = (1 - confidence) / 2
+        low, high = np.percentile(means, [100 * alpha, 100 * (1 - alpha)], axis=1)
+        stats["ci_low"], stats["ci_high"] = low, high
+    index = pd.MultiIndex.from_tuples(keys, names=KEY)
+    return pd.DataFrame(stats, index=index)
+
+
+def cell_values(stats, statistic="mean"):
+    """
+    One statistic of each cell
+    :return: {(certificate, proposal, mode): (value, count)}, like
+        results_store.cell_means
+    """
+    return {
+        key: (value, int(count))
+        for key, value, count in zip(stats.index, stats[statistic], stats["count"])
+    }
+
+
+def exceeding(stats, statistic, limit):
+    """The cells whose statistic is above limit, e.g. a p99 latency SLO"""
+    return stats[stats[statistic] > limit]
+
+
+def _typed(frame, column, value):
+    """value, e.g. from the command line, as the type of column's values"""
+    if column not in frame.columns:
+        raise ValueError(f"Unknown column {column}")
+    dtype = frame[column].dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        dtype = dtype.categories.dtype
+    if not isinstance(value, str) or not pd.api.types.is_numeric_dtype(dtype):
+        return value
+    try:
+        return np.array(value).astype(dtype)[()]
+    except ValueError:
+        raise ValueError(f"{column} has {dtype} values, not {value!r}") from None
+
+
+def select(frame, **criteria):
+    """
+    The rows of a results table matching all criteria
+    :raise ValueError: If a column is unknown or a value not of its type
+    """
+    mask = np.ones(len(frame), dtype=bool)
+    for column, value in criteria.items():
+        value = _typed(frame, column, value)
+        mask &= (frame[column] == value).to_numpy()
+    return frame[mask]
+
+
+def _cells(frame):
+    """The latencies in ms of each cell, labelled by the columns that vary"""
+    varying = [column for column in KEY if frame[column].nunique() > 1] or KEY
+    cells = []
+    for key, group in frame.groupby(varying, observed=True, sort=True):
+        key = key if isinstance(key, tuple) else (key,)
+        cells.append((" ".join(map(str, key)), group["latency"].to_numpy() * 1000))
+    return cells
+
+
+def plot_cdf(frame, path):
+    """Empirical CDFs of the latencies of each cell of frame"""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    figure, axes = plt.subplots(figsize=(14, 10))
+    for label, latencies in _cells(frame):
+        ordered = np.sort(latencies)
+        axes.step(ordered, np.arange(1, len(ordered) + 1) / len(ordered), label=label)
+    axes.set_xscale("log")
+    axes.set_xlabel("Handshake Latency (ms)", fontsize=20, fontweight="bold")
+    axes.set_ylabel("Fraction of Handshakes", fontsize=20, fontweight="bold")
+    axes.grid(True, which="both", linestyle="--", alpha=0.7)
+    axes.legend(fontsize=14)
+    figure.tight_layout()
+    figure.savefig(path, dpi=150, bbox_inches="tight")
+    plt.close(figure)
+
+
+def plot_distribution(frame, path, kind="violin"):
+    """Violin or box plots of the latencies of each cell of frame"""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    cells = _cells(frame)
+    figure, axes = plt.subplots(figsize=(max(8, 1.5 * len(cells)), 10))
+    data = [latencies for _, latencies in cells]
+    if kind == "violin":
+        axes.violinplot(data, showmedians=True, quantiles=[[0.99]] * len(data))
+    else:
+        axes.boxplot(data, whis=(1, 99), showfliers=True)
+    axes.set_xticks(np.arange(1, len(cells) + 1), [label for label, _ in cells])
+    axes.tick_params(axis="x", rotation=45)
+    axes.set_yscale("log")
+    axes.set_ylabel("Handshake Latency (ms)", fontsize=20, fontweight="bold")
+    axes.grid(True, axis="y", linestyle="--", alpha=0.7)
+    figure.tight_layout()
+    figure.savefig(path, dpi=150, bbox_inches="tight")
+    plt.close(figure)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latency statistics per cell")
+    parser.add_argument("data_dir", nargs="?", default=os.getenv("HOST_DATA_PATH"))
+    parser.add_argument(
+        "--where", action="append", default=[], help="column=value, e.g. mode=100ping"
+    )
+    parser.add_argument("--csv", help="Write the statistics table here")
+    parser.add_argument("--cdf", help="Plot the CDFs of the cells here")
+    parser.add_argument("--violin", help="Plot violins of the cells here")
+    parser.add_argument("--box", help="Plot boxes of the cells here")
+    parser.add_argument("--slo", help="statistic=ms, list the cells above it")
+    parser.add_argument("--resamples", type=int, default=1000)
+    args = parser.parse_args(argv)
+    if not args.data_dir:
+        parser.error("data_dir or HOST_DATA_PATH is required")
+
+    try:
+        frame = select(
+            load_results(args.data_dir),
+            **dict(condition.split("=", 1) for condition in args.where),
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    if frame.empty:
+        print("No latencies match")
+        return 1
+    stats = cell_stats(frame, resamples=args.resamples)
+    if args.csv:
+        stats.to_csv(args.csv)
+    if args.cdf:
+        plot_cdf(frame, args.cdf)
+    if args.violin:
+        plot_distribution(frame, args.violin, "violin")
+    if args.box:
+        plot_distribution(frame, args.box, "box")
+
+    shown = stats
+    if args.slo:
+        statistic, limit = args.slo.split("=", 1)
+        shown = exceeding(stats, statistic, float(limit) / 1000)
+        print(f"{len(shown)} of {len(stats)} cells exceed {statistic} {limit} ms")
+    columns = [column for column in shown.columns if column != "count"]
+    with pd.option_context(
+        "display.max_rows", None, "display.max_columns", None, "display.width", 250
+    ):
+        print(shown.assign(**{column: shown[column] * 1000 for column in columns}))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
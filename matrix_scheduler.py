@@ -0,0 +1,129 @@
+import asyncio
+import collections
+import time
+
+
+def check_pair_names(pairs):
+    """
+    :raise ValueError: If two pairs share a name, which would merge their
+        queues and result directories
+    """
+    counts = collections.Counter(pair.name for pair in pairs)
+    duplicates = sorted(name for name, count in counts.items() if count > 1)
+    if duplicates:
+        raise ValueError(f"Pair names have to be unique: {', '.join(duplicates)}")
+
+
+class MatrixScheduler:
+    """
+    Distributes benchmark matrix cells across carol/moon VM pairs.
+
+    Cells of the same certificate family start out on the same pair, so a
+    pair installs each family once. A pair that runs out of work steals the
+    last cell of the pair with the most work left. Cells pinned to a pair,
+    e.g. replicas used to compare pairs, are never stolen, and replicated
+    cells are not queued.
+    """
+
+    def __init__(self, pairs, run_cell, family=lambda cell: cell[0]):
+        """
+        :param pairs: The VM pairs, anything with a unique `name`
+        :param run_cell: Coroutine function called with (pair, cell)
+        :param family: Groups cells that should start on the same pair
+        """
+        check_pair_names(pairs)
+        self.pairs = list(pairs)
+        self.run_cell = run_cell
+        self.family = family
+        self.queues = {pair.name: collections.deque() for pair in self.pairs}
+        self.pinned = {pair.name: collections.deque() for pair in self.pairs}
+        self.replicated = set()
+        self.results = []
+
+    def assign(self, cells):
+        """
+        Spread cells over the pairs' queues, one family at a time, except
+        the replicated ones
+        """
+        families = collections.OrderedDict()
+        for cell in cells:
+            if cell in self.replicated:
+                continue
+            families.setdefault(self.family(cell), []).append(cell)
+        # Largest families first, each to the currently least loaded pair
+        for family_cells in sorted(families.values(), key=len, reverse=True):
+            name = min(self.queues, key=lambda name: len(self.queues[name]))
+            self.queues[name].extend(family_cells)
+
+    def replicate(self, cells):
+        """Run cells once on every pair, to check host-to-host variance"""
+        self.replicated.update(cells)
+        for name, queue in self.queues.items():
+            self.queues[name] = collections.deque(
+                cell for cell in queue if cell not in self.replicated
+            )
+        for pair in self.pairs:
+            self.pin(pair.name, cells)
+
+    def pin(self, name, cells):
+        """
+        Run cells on the named pair only, e.g. to resume them there, once
+        even if they are pinned again
+        """
+        pinned = self.pinned[name]
+        pinned.extend(cell for cell in cells if cell not in pinned)
+
+    def _next_cell(self, pair):
+        if self.pinned[pair.name]:
+            return self.pinned[pair.name].popleft()
+        if self.queues[pair.name]:
+            return self.queues[pair.name].popleft()
+        victim = max(self.queues, key=lambda name: len(self.queues[name]))
+        if self.queues[victim]:
+            return self.queues[victim].pop()
+        return None
+
+    async def _worker(self, pair):
+        while True:
+            cell = self._next_cell(pair)
+            if cell is None:
+                return
+            started = time.time()
+            entry = {"pair": pair.name, "cell": cell, "started": started}
+            try:
+                entry["result"] = await self.run_cell(pair, cell)
+                entry["error"] = None
+            except Exception as e:  # pylint: disable=broad-except
+                entry["result"] = None
+                entry["error"] = repr(e)
+                print(f"{pair.name}: {cell} failed with {e!r}")
+            entry["finished"] = time.time()
+            self.results.append(entry)
+
+    async def run(self, cells=()):
+        """
+        Run the given and previously assigned cells on all pairs
+        :return: One entry per executed cell, tagged with the pair it ran on
+        """
+        self.assign(cells)
+        await asyncio.gather(*(self._worker(pair) for pair in self.pairs))
+        return self.results
+
+
+def pair_variance(entries, samples):
+    """
+    Compare cells that ran on more than one pair
+    :param entries: Results of MatrixScheduler.run
+    :param samples: Function returning the latencies of an entry
+    :return: {cell: {pair: (count, mean)}} for replicated cells
+    """
+    by_cell = collections.defaultdict(dict)
+    for entry in entries:
+        if entry["error"] is None:
+            values = samples(entry)
+            if values:
+                by_cell[entry["cell"]][entry["pair"]] = (
+                    len(values),
+                    sum(values) / len(values),
+                )
+    return {cell: pairs for cell, pairs in by_cell.items() if len(pairs) > 1}
@@ -0,0 +1,281 @@
+"""
+Network impairment profiles applied with tc netem.
+
+Both ends of the link shape their egress traffic, so a profile describes
+one side: a 100 ms round trip is 50 ms of delay on carol and on moon, and
+0.5% loss per side is about 1% loss per round trip. Profiles come from the
+experiment spec, or are derived from mode names such as 100ping05pl.
+
+    sudo python netem.py selftest 100ping05pl
+
+checks a profile between two network namespaces on this machine.
+"""
+import asyncio
+import re
+import shlex
+import subprocess
+import sys
+
+MODE_PATTERN = re.compile(r"^(?:(\d+)ping)?(?:(\d+)pl)?$")
+PING_SUMMARY = re.compile(r"(\d+(?:\.\d+)?)% packet loss")
+PING_RTT = re.compile(r"= [\d.]+/([\d.]+)/[\d.]+/([\d.]+) ms")
+
+
+def _loss_from_label(digits):
+    # "05" is 0.5%, "25" is 2.5%, "1" is 1%
+    if len(digits) > 1:
+        return float(f"{digits[0]}.{digits[1:]}")
+    return float(digits)
+
+
+class NetemProfile:
+    """The netem settings applied on each side of the link"""
+
+    def __init__(
+        self,
+        delay_ms=0.0,
+        jitter_ms=0.0,
+        loss=0.0,
+        reorder=0.0,
+        rate=None,
+        name=None,
+    ):
+        """
+        :param delay_ms: One way delay
+        :param jitter_ms: Variation of the delay
+        :param loss: Packet loss in percent
+        :param reorder: Percentage of packets sent without delay
+        :param rate: Rate limit in tc units, e.g. 100mbit
+        """
+        self.delay_ms = float(delay_ms)
+        self.jitter_ms = float(jitter_ms)
+        self.loss = float(loss)
+        self.reorder = float(reorder)
+        self.rate = rate
+        self.name = name
+
+    @classmethod
+    def from_mode(cls, mode):
+        """
+        Derive a profile from a mode name: Xping is a round trip of X ms,
+        Ypl the per side loss, with a decimal point after its first digit
+        """
+        if mode == "unlimited":
+            return cls(name=mode)
+        match = MODE_PATTERN.match(mode)
+        if not match or not any(match.groups()):
+            raise ValueError(f"Cannot derive a netem profile from mode {mode}")
+        rtt, loss = match.groups()
+        return cls(
+            delay_ms=int(rtt or 0) / 2,
+            loss=_loss_from_label(loss) if loss else 0.0,
+            name=mode,
+        )
+
+    @classmethod
+    def from_spec(cls, spec, name=None):
+        return cls(name=name, **spec)
+
+    @property
+    def shaping(self):
+        return bool(
+            self.delay_ms or self.jitter_ms or self.loss or self.reorder or self.rate
+        )
+
+    def netem_arguments(self):
+        arguments = []
+        if self.delay_ms or self.jitter_ms or self.reorder:
+            arguments += ["delay", f"{self.delay_ms:g}ms"]
+            if self.jitter_ms:
+                arguments.append(f"{self.jitter_ms:g}ms")
+        if self.loss:
+            arguments += ["loss", f"{self.loss:g}%"]
+        if self.reorder:
+            arguments += ["reorder", f"{self.reorder:g}%"]
+        if self.rate:
+            arguments += ["rate", str(self.rate)]
+        return arguments
+
+    def script(self, interface=None, peer=None, sudo=""):
+        """
+        Shell script installing the profile, or removing any shaping
+        :param interface: The device to shape, by default the route to peer
+            or the default route
+        :param sudo: Command prefix for tc, e.g. "sudo"
+        """
+        if interface:
+            lines = [f"dev={shlex.quote(interface)}"]
+        elif peer:
+            lines = [
+                f"dev=$(ip -o route get {shlex.quote(peer)}"
+                " | sed -n 's/.* dev \\([^ ]*\\).*/\\1/p')"
+            ]
+        else:
+            lines = ["dev=$(ip -o route show default | awk '{print $5; exit}')"]
+        lines.append(f'{sudo} tc qdisc del dev "$dev" root 2>/dev/null || true')
+        if self.shaping:
+            lines.append(
+                f'{sudo} tc qdisc replace dev "$dev" root netem '
+                + " ".join(self.netem_arguments())
+                + " || exit 1"
+            )
+        lines.append(f'{sudo} tc qdisc show dev "$dev"')
+        return "\n".join(lines) + "\n"
+
+    def expected_rtt_ms(self):
+        # Both sides delay their packets
+        return 2 * self.delay_ms
+
+    def __repr__(self):
+        arguments = " ".join(self.netem_arguments()) or "none"
+        return f"NetemProfile({self.name!r}, {arguments})"
+
+
+def probe_script(peer, count=20, interval=0.2):
+    return f"ping -n -q -c {int(count)} -i {interval:g} {shlex.quote(peer)}\n"
+
+
+def parse_probe(output):
+    """
+    Read a ping summary
+    :return: The average round trip and its deviation in ms, and the loss
+        in percent
+    """
+    loss = PING_SUMMARY.search(output)
+    rtt = PING_RTT.search(output)
+    return {
+        "rtt_ms": float(rtt.group(1)) if rtt else None,
+        "rtt_mdev_ms": float(rtt.group(2)) if rtt else None,
+        "loss": float(loss.group(1)) if loss else None,
+    }
+
+
+def verify_probe(profile, probe, tolerance_ms=5.0, tolerance=0.1):
+    """
+    Check a probe against a profile: the round trip has to be within
+    tolerance_ms plus tolerance of the expected one and twice the jitter.
+    Loss is only reported, a short probe cannot tell 1% from 2%.
+    """
+    if probe["rtt_ms"] is None:
+        return False
+    expected = profile.expected_rtt_ms()
+    allowed = tolerance_ms + tolerance * expected + 2 * profile.jitter_ms
+    return abs(probe["rtt_ms"] - expected) <= allowed
+
+
+class NetworkShaper:
+    """Applies the profile of each cell's mode to both VMs of a pair"""
+
+    def __init__(
+        self,
+        experiment,
+        interface=None,
+        probe_count=20,
+        tolerance_ms=5.0,
+        sudo=True,
+    ):
+        """
+        :param experiment: Experiment whose modes define the profiles
+        :param interface: The guests' device to shape, detected if None
+        :param probe_count: Pings sent from carol to moon after shaping,
+            0 to skip the probe
+        :param sudo: Run tc through sudo with the guest password
+        """
+        self.experiment = experiment
+        self.interface = interface
+        self.probe_count = probe_count
+        self.tolerance_ms = tolerance_ms
+        self.sudo = sudo
+
+    def profile(self, mode):
+        return self.experiment.netem_profile(mode)
+
+    def _sudo(self, vm):
+        if not self.sudo:
+            return ""
+        password = shlex.quote(vm.guest_password or "")
+        return f"printf '%s\\n' {password} | sudo -S -p ''"
+
+    async def _apply(self, vm, profile, peer):
+        script = profile.script(self.interface, peer, self._sudo(vm))
+        result = await vm.run_script_in_guest("/bin/sh", script)
+        if result["return_code"] != 0:
+            raise RuntimeError(f"Could not shape {vm.vm_path}: {result['output']}")
+
+    async def apply(self, pair, mode):
+        """
+        Shape the link between a pair's VMs and probe it
+        :return: The profile's arguments and the probe's results
+        """
+        profile = self.profile(mode)
+        await asyncio.gather(
+            self._apply(pair.carol, profile, pair.moon_address),
+            self._apply(pair.moon, profile, None),
+        )
+        pair.mode = mode
+        report = {"netem": " ".join(profile.netem_arguments()), "probe": None}
+        if self.probe_count and pair.moon_address:
+            result = await pair.carol.run_script_in_guest(
+                "/bin/sh", probe_script(pair.moon_address, self.probe_count)
+            )
+            probe = parse_probe(result["output"])
+            probe["expected_rtt_ms"] = profile.expected_rtt_ms()
+            probe["ok"] = verify_probe(profile, probe, self.tolerance_ms)
+            report["probe"] = probe
+            if not probe["ok"]:
+                raise RuntimeError(
+                    f"{pair.name}: {mode} probe measured {probe['rtt_ms']} ms, "
+                    f"expected {probe['expected_rtt_ms']} ms"
+                )
+        return report
+
+
+def _run(*args, check=True):
+    return subprocess.run(args, check=check, capture_output=True, text=True)
+
+
+def selftest(mode="100ping05pl", count=20):
+    """
+    Apply a profile on both ends of a veth pair between two network
+    namespaces and probe it, needs root and the sch_netem module
+    """
+    profile = NetemProfile.from_mode(mode)
+    namespaces = {"netem-carol": "10.99.0.1", "netem-moon": "10.99.0.2"}
+    try:
+        for namespace in namespaces:
+            _run("ip", "netns", "add", namespace)
+        _run("ip", "link", "add", "netem0", "type", "veth", "peer", "name", "netem1")
+        devices = zip(namespaces.items(), ("netem0", "netem1"))
+        for (namespace, address), device in devices:
+            _run("ip", "link", "set", device, "netns", namespace)
+            _run("ip", "-n", namespace, "addr", "add", f"{address}/24", "dev", device)
+            _run("ip", "-n", namespace, "link", "set", device, "up")
+            script = profile.script(device)
+            shaped = _run(
+                "ip", "netns", "exec", namespace, "sh", "-c", script, check=False
+            )
+            if shaped.returncode != 0:
+                print(f"Could not apply {profile} in {namespace}: {shaped.stderr}")
+                return 1
+        script = probe_script(namespaces["netem-moon"], count)
+        output = _run(
+            "ip", "netns", "exec", "netem-carol", "sh", "-c", script, check=False
+        ).stdout
+        probe = parse_probe(output)
+        ok = verify_probe(profile, probe)
+        print(
+            f"{profile}: expected {profile.expected_rtt_ms():g} ms, measured "
+            f"{probe['rtt_ms']} ms with {probe['loss']}% loss: "
+            + ("ok" if ok else "FAILED")
+        )
+        return 0 if ok else 1
+    finally:
+        for namespace in namespaces:
+            _run("ip", "netns", "del", namespace, check=False)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "selftest":
+        print(__doc__.strip())
+        sys.exit(2)
+    sys.exit(selftest(*sys.argv[2:3]))
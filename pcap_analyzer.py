@@ -0,0 +1,365 @@
+"""
+On-the-wire cost of IKE handshakes, from packet captures.
+
+benchmark_agent.py --capture records the IKE traffic of a cell to
+<cell>.pcap (<cell>.<start>.pcap when resuming at iteration start). The
+capture is read one packet at a time, packets are grouped into handshakes
+by the initiator's SPI, and each handshake is reported with its bytes per
+exchange, packets, IKE fragments (RFC 7383), retransmissions and its
+duration on the wire, from the first IKE_SA_INIT request to the last
+packet of the IKE_AUTH response:
+
+    python pcap_analyzer.py data/rsa_x25519_0ping25pl.pcap
+    python pcap_analyzer.py data/
+
+The second form summarizes all captures of a data directory next to the
+mean latencies of the results store.
+"""
+import bisect
+import collections
+import os
+import struct
+import sys
+
+import pandas as pd
+
+from data_index import cell_files
+from results_store import load_results
+
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_LINUX_SLL2 = 276
+IKE_PORTS = (500, 4500)
+
+IKE_SA_INIT = 34
+IKE_AUTH = 35
+CREATE_CHILD_SA = 36
+INFORMATIONAL = 37
+IKE_INTERMEDIATE = 43
+EXCHANGES = {
+    IKE_SA_INIT: "sa_init",
+    IKE_AUTH: "auth",
+    CREATE_CHILD_SA: "create_child_sa",
+    INFORMATIONAL: "informational",
+    IKE_INTERMEDIATE: "intermediate",
+}
+# Encrypted and Authenticated Fragment payload
+PAYLOAD_SKF = 53
+FLAG_RESPONSE = 0x20
+
+IkePacket = collections.namedtuple(
+    "IkePacket",
+    [
+        "time",
+        "spi_i",
+        "exchange",
+        "response",
+        "message_id",
+        "fragment",
+        "fragments",
+        "length",
+    ],
+)
+
+
+def _records(f):
+    """The (timestamp, linktype, data) of each record of a pcap file"""
+    header = f.read(24)
+    if len(header) < 24 or header[:4] not in PCAP_MAGIC:
+        raise ValueError("Not a pcap file, pcapng is not supported")
+    order, resolution = PCAP_MAGIC[header[:4]]
+    linktype = struct.unpack(order + "I", header[20:24])[0]
+    record_header = struct.Struct(order + "IIII")
+    while True:
+        data = f.read(16)
+        if len(data) < 16:
+            return
+        seconds, fraction, captured, _ = record_header.unpack(data)
+        yield seconds + fraction * resolution, linktype, f.read(captured)
+
+
+def _ip_payload(linktype, frame):
+    """The IP packet of a link layer frame, or None"""
+    if linktype == LINKTYPE_ETHERNET:
+        offset, ethertype = 14, frame[12:14]
+        while ethertype == b"\x81\x00":
+            ethertype = frame[offset + 2 : offset + 4]
+            offset += 4
+        return frame[offset:] if ethertype in (b"\x08\x00", b"\x86\xdd") else None
+    if linktype == LINKTYPE_LINUX_SLL:
+        return frame[16:] if frame[14:16] in (b"\x08\x00", b"\x86\xdd") else None
+    if linktype == LINKTYPE_LINUX_SLL2:
+        return frame[20:] if frame[0:2] in (b"\x08\x00", b"\x86\xdd") else None
+    if linktype == LINKTYPE_RAW:
+        return frame
+    return None
+
+
+def _udp_payload(packet):
+    """The payload of an IKE UDP datagram, or None"""
+    if not packet:
+        return None
+    version = packet[0] >> 4
+    if version == 4:
+        header_length = (packet[0] & 0x0F) * 4
+        if packet[9] != 17:
+            return None
+        udp = packet[header_length:]
+    elif version == 6:
+        # Extension headers are not used by IKE traffic
+        if packet[6] != 17:
+            return None
+        udp = packet[40:]
+    else:
+        return None
+    if len(udp) < 8:
+        return None
+    source, destination = struct.unpack("!HH", udp[:4])
+    if source not in IKE_PORTS and destination not in IKE_PORTS:
+        return None
+    payload = udp[8:]
+    if 4500 in (source, destination):
+        # Non-ESP marker, ESP and keepalives have none
+        if payload[:4] != b"\x00\x00\x00\x00":
+            return None
+        payload = payload[4:]
+    return payload
+
+
+def ike_packets(path):
+    """Read the IKE messages of a capture, one at a time"""
+    with open(path, "rb") as f:
+        for timestamp, linktype, frame in _records(f):
+            message = _udp_payload(_ip_payload(linktype, frame))
+            if message is None or len(message) < 28:
+                continue
+            spi_i = message[:8].hex()
+            next_payload, _, exchange, flags = message[16:20]
+            message_id, length = struct.unpack("!II", message[20:28])
+            fragment = fragments = 0
+            if next_payload == PAYLOAD_SKF and len(message) >= 36:
+                fragment, fragments = struct.unpack("!HH", message[32:36])
+            yield IkePacket(
+                timestamp,
+                spi_i,
+                exchange,
+                bool(flags & FLAG_RESPONSE),
+                message_id,
+                fragment,
+                fragments,
+                length,
+            )
+
+
+class _Handshake:
+    def __init__(self, spi_i, start):
+        self.spi_i = spi_i
+        self.start = start
+        self.end = None
+        self.packets = 0
+        self.fragments = 0
+        self.retransmissions = 0
+        self.bytes = collections.Counter()
+        self.seen = set()
+        self.auth_fragments = set()
+
+    def add(self, packet):
+        key = (packet.exchange, packet.response, packet.message_id, packet.fragment)
+        if key in self.seen:
+            self.retransmissions += 1
+        self.seen.add(key)
+        self.packets += 1
+        self.fragments += packet.fragment > 0
+        self.bytes[EXCHANGES.get(packet.exchange, str(packet.exchange))] += (
+            packet.length
+        )
+        if packet.exchange == IKE_AUTH and packet.response and self.end is None:
+            # Done once every fragment of the response arrived
+            self.auth_fragments.add(packet.fragment)
+            if len(self.auth_fragments) >= packet.fragments:
+                self.end = packet.time
+
+    def summary(self):
+        summary = {
+            "spi": self.spi_i,
+            "start": self.start,
+            "wire_ms": (self.end - self.start) * 1000 if self.end else None,
+            "packets": self.packets,
+            "bytes": sum(self.bytes.values()),
+            "fragments": self.fragments,
+            "retransmissions": self.retransmissions,
+            "complete": self.end is not None,
+        }
+        for name in EXCHANGES.values():
+            summary[f"bytes_{name}"] = self.bytes.get(name, 0)
+        return summary
+
+
+def handshakes(path):
+    """
+    The handshakes of a capture in the order they started. Handshakes are
+    reported once the next one starts, so only one or two are held at a
+    time.
+    """
+    open_handshakes = collections.OrderedDict()
+    for packet in ike_packets(path):
+        handshake = open_handshakes.get(packet.spi_i)
+        if handshake is None:
+            if packet.exchange != IKE_SA_INIT or packet.response:
+                continue
+            # Iterations are serial, earlier handshakes are over
+            while open_handshakes:
+                yield open_handshakes.popitem(last=False)[1].summary()
+            handshake = open_handshakes[packet.spi_i] = _Handshake(
+                packet.spi_i, packet.time
+            )
+        handshake.add(packet)
+    for handshake in open_handshakes.values():
+        yield handshake.summary()
+
+
+def numbered_handshakes(path, start=0, end=None):
+    """
+    The (iteration, summary) of the handshakes of a capture of iterations
+    start to end. With the <capture>.times the agent writes, a handshake
+    belongs to the iteration it started in and only an iteration's first
+    handshake is kept, later ones are retries, leftovers of the previous
+    iteration or rekeys. Captures without one are numbered in order.
+    :raise ValueError: If a capture without times does not have one
+        handshake per iteration
+    """
+    times_path = os.path.splitext(path)[0] + ".times"
+    if not os.path.exists(times_path):
+        summaries = list(handshakes(path))
+        if end is not None and len(summaries) != end - start:
+            raise ValueError(
+                f"{len(summaries)} handshakes for {end - start} iterations"
+            )
+        yield from enumerate(summaries, start)
+        return
+    with open(times_path, "r") as f:
+        times = [float(line) for line in f if line.strip()]
+    last = None
+    for summary in handshakes(path):
+        iteration = start + bisect.bisect_right(times, summary["start"]) - 1
+        if iteration < start or iteration == last:
+            continue
+        if end is not None and iteration >= end:
+            break
+        last = iteration
+        yield iteration, summary
+
+
+def _latency_count(path, start):
+    """The latencies of the cell of a capture, None if there are none"""
+    name = os.path.basename(path)[: -len(".pcap")]
+    if start:
+        name = name.rpartition(".")[0]
+    latency_path = os.path.join(os.path.dirname(path), name + ".txt")
+    if not os.path.exists(latency_path):
+        return None
+    with open(latency_path, "rb") as f:
+        return len(f.read().split())
+
+
+def ingest_captures(data_dir):
+    """
+    The handshakes of every capture of a data directory, one row each, with
+    the cell, pair and iteration columns of the results store. Captures
+    whose handshakes cannot be matched to iterations are skipped.
+    """
+    cells = collections.defaultdict(list)
+    for path, run, start in cell_files(data_dir, ".pcap"):
+        cells[run].append((start, path))
+    rows = []
+    for run, captures in cells.items():
+        captures.sort()
+        # A resumed cell's captures end where the next one starts
+        ends = [start for start, _ in captures[1:]]
+        ends.append(_latency_count(captures[-1][1], captures[-1][0]))
+        for (start, path), end in zip(captures, ends):
+            try:
+                numbered = list(numbered_handshakes(path, start, end))
+            except ValueError as e:
+                print(f"Skipping {path}: {e}", file=sys.stderr)
+                continue
+            for iteration, summary in numbered:
+                rows.append(
+                    dict(
+                        summary,
+                        certificate=run.signature,
+                        proposal=run.proposal,
+                        mode=run.mode,
+                        pair=run.pair,
+                        iteration=iteration,
+                    )
+                )
+    return pd.DataFrame(rows)
+
+
+def join_latencies(frame, captures):
+    """
+    Add the capture columns to the latencies of a results store table, for
+    the iterations that were captured
+    """
+    keys = ["certificate", "proposal", "mode", "pair"]
+
+    def normalized(table):
+        # Categorical and missing pairs do not match plain strings and None
+        table = table.copy()
+        for column in keys:
+            table[column] = table[column].astype(object).fillna("").astype(str)
+        return table
+
+    return normalized(frame).merge(normalized(captures), on=keys + ["iteration"])
+
+
+def main(argv):
+    if len(argv) != 1:
+        print(__doc__.strip())
+        return 2
+    path = argv[0]
+    if not os.path.isdir(path):
+        for iteration, summary in numbered_handshakes(path):
+            wire = "incomplete"
+            if summary["complete"]:
+                wire = f"{summary['wire_ms']:.1f} ms"
+            print(
+                f"{iteration}: {wire}, {summary['packets']} packets, "
+                f"{summary['bytes']} bytes (sa_init {summary['bytes_sa_init']}, "
+                f"intermediate {summary['bytes_intermediate']}, "
+                f"auth {summary['bytes_auth']}), {summary['fragments']} fragments, "
+                f"{summary['retransmissions']} retransmissions"
+            )
+        return 0
+
+    captures = ingest_captures(path)
+    if captures.empty:
+        print(f"No captures in {path}")
+        return 1
+    joined = join_latencies(load_results(path), captures)
+    joined["latency_ms"] = joined["latency"] * 1000
+    columns = [
+        "latency_ms",
+        "wire_ms",
+        "bytes",
+        "bytes_intermediate",
+        "bytes_auth",
+        "fragments",
+        "retransmissions",
+    ]
+    summary = joined.groupby(["certificate", "proposal", "mode"])[columns].mean()
+    with pd.option_context("display.max_columns", None, "display.width", 250):
+        print(summary.round(1))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,174 @@
+"""
+Renders the figures of an experiment spec for every mode group.
+
+The results are loaded once, and one matplotlib figure is reused for all
+plots:
+
+    python plotting.py [data_dir] [--download] [--only kems] [--force]
+
+data_dir defaults to $HOST_DATA_PATH. With --download, new measurements
+are first pulled from carol, see result_sync.py.
+Only plots whose inputs changed are rendered again, see figure_cache.py.
+"""
+import collections
+import os
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+FIGSIZE = (20, 14)
+DPI = 300
+HATCHES = ["/", "\\", "x", ".", "o", "-", "+", "*"]
+AXIS_TITLES = {
+    "certificates": "Certificate",
+    "proposals": "Key Encapsulation Mechanism (KEM)",
+    "modes": "Network Condition",
+}
+# Bars show the statistic a figure sets, see latency_stats.cell_stats
+Y_LABELS = {
+    "mean": "Average Runtime (ms)",
+    "trimmed_mean": "Trimmed Mean Runtime (ms)",
+    "p50": "Median Runtime (ms)",
+}
+
+Plot = collections.namedtuple("Plot", ["name", "group", "spec"])
+# Bars of one plot: tick labels, legend title and (label, cells) per series
+Bars = collections.namedtuple("Bars", ["x_labels", "legend", "series"])
+
+
+def plots(experiment, only=None):
+    """Every figure of the spec for every mode group"""
+    for name, figure in experiment.figures.items():
+        if only and name not in only:
+            continue
+        for group in experiment.groups():
+            spec = {key: value for key, value in figure.items() if key != "groups"}
+            spec.update(figure.get("groups", {}).get(group, {}))
+            yield Plot(name, group, spec)
+
+
+def bars(experiment, plot):
+    """
+    The cells behind each bar of a plot
+    :return: Bars, cells are (certificate, proposal, mode) tuples
+    """
+    spec = plot.spec
+    modes = experiment.group(plot.group)
+    if spec["x"] == "modes":
+        series = [
+            (label, [(certificate, proposal, mode) for mode in modes])
+            for certificate, proposal, label in spec["combinations"]
+        ]
+        return Bars(list(modes.values()), "Combination", series)
+
+    if spec["x"] == "proposals":
+        names = spec.get("proposals", list(experiment.proposals))
+        keys = [(spec["certificate"], name) for name in names]
+    elif spec["x"] == "certificates":
+        names = spec.get("certificates", list(experiment.certificates))
+        keys = [(name, spec["proposal"]) for name in names]
+    else:
+        raise ValueError(f"{plot.name}: cannot plot along {spec['x']}")
+    x_labels = experiment.labels(spec["x"], names)
+    series = [
+        (label, [(certificate, proposal, mode) for certificate, proposal in keys])
+        for mode, label in modes.items()
+    ]
+    return Bars(x_labels, "Network Condition", series)
+
+
+def draw(figure, plot, data, means):
+    """Draw one plot onto a cleared figure"""
+    figure.clear()
+    axes = figure.add_subplot()
+    x = np.arange(len(data.x_labels))
+    width = plot.spec.get("width", 0.2)
+    annotate = plot.group in plot.spec.get("annotate", [])
+    for i, (label, series_cells) in enumerate(data.series):
+        runtimes = []
+        for cell in series_cells:
+            if cell in means:
+                runtimes.append(means[cell][0] * 1000)
+            else:
+                print(f"Warning: No results for {'_'.join(cell)}")
+                runtimes.append(0)
+        offset = width * (i - (len(data.series) - 1) / 2)
+        rects = axes.bar(
+            x + offset,
+            runtimes,
+            width,
+            label=label,
+            color="white",
+            edgecolor="black",
+            hatch=HATCHES[i % len(HATCHES)],
+            linewidth=3,
+        )
+        if annotate:
+            for rect in rects:
+                height = rect.get_height()
+                axes.text(
+                    rect.get_x() + rect.get_width() / 2.0,
+                    height,
+                    f"{height:.2f}",
+                    ha="center",
+                    va="bottom",
+                    fontsize=10,
+                    rotation=90,
+                )
+
+    axes.set_xlabel(AXIS_TITLES[plot.spec["x"]], fontsize=32, fontweight="bold")
+    statistic = plot.spec.get("statistic", "mean")
+    y_label = Y_LABELS.get(statistic, f"{statistic} Runtime (ms)")
+    axes.set_ylabel(y_label, fontsize=32, fontweight="bold")
+    axes.set_xticks(x, data.x_labels, rotation=45, ha="right", fontsize=28)
+    axes.tick_params(axis="y", labelsize=28)
+    axes.legend(title=data.legend, title_fontsize=32, fontsize=28)
+    axes.grid(True, axis="y", linestyle="--", alpha=0.7)
+    for spine in axes.spines.values():
+        spine.set_linewidth(3)
+    figure.tight_layout()
+
+
+def output_path(plot, output_dir):
+    return os.path.join(output_dir, f"{plot.group}_{plot.spec['file']}")
+
+
+def new_figure():
+    plt.style.use("default")
+    return plt.figure(figsize=FIGSIZE)
+
+
+def save(figure, plot, data, means, path, dpi=DPI):
+    draw(figure, plot, data, means)
+    figure.savefig(path, dpi=dpi, bbox_inches="tight")
+    print(f"Plot saved as {path}")
+
+
+def render(experiment, means, output_dir, only=None, dpi=DPI):
+    """
+    Render the plots of an experiment one after the other, see figure_cache
+    for rendering only the stale ones
+    :param means: cell_means of the results, or latency_stats.cell_values of
+        the plotted statistic
+    :param only: Names of the figures to render, all if None
+    :return: The paths of the saved plots
+    """
+    figure = new_figure()
+    paths = []
+    try:
+        for plot in plots(experiment, only):
+            path = output_path(plot, output_dir)
+            save(figure, plot, bars(experiment, plot), means, path, dpi)
+            paths.append(path)
+    finally:
+        plt.close(figure)
+    return paths
+
+
+if __name__ == "__main__":
+    from figure_cache import main
+
+    raise SystemExit(main())
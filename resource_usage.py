@@ -0,0 +1,208 @@
+"""
+charon's CPU time and memory per handshake on carol and moon.
+
+With RESOURCES=1 the agent samples carol's charon around every handshake
+(<cell>.charon.csv) and moon's charon is sampled every 20 ms during the
+cell (<cell>.charon_moon.jsonl). moon's samples are split into iterations
+at the start times carol logged, so both VMs' clocks have to be in sync,
+e.g. by VMware Tools. Load runs keep carol's figures in their summary:
+
+    python resource_usage.py data/ --where mode=unlimited
+    python resource_usage.py data/ --pivot moon_cpu_ms --csv usage.csv
+
+CPU time is in ms, memory in kB. The memory of an SA is how much charon's
+resident memory grew while it was established. moon's CPU time includes
+deleting the SA, carol's ends once it is established.
+"""
+import argparse
+import collections
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_index import cell_files
+from latency_stats import KEY, select
+
+CAROL_SUFFIX = ".charon.csv"
+MOON_SUFFIX = ".charon_moon.jsonl"
+COLUMNS = ["carol_cpu_ms", "carol_sa_kb", "moon_cpu_ms", "moon_sa_kb"]
+
+
+def read_samples(paths):
+    """The samples of one or more charon_usage.py --output files, by time"""
+    frames = [pd.read_json(path, lines=True) for path in paths]
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=["time", "cpu_ms", "rss_kb", "hwm_kb"])
+    return pd.concat(frames).sort_values("time", kind="stable")
+
+
+def attribute(samples, starts):
+    """
+    Split samples of charon into the iterations starting at starts, the
+    last one ends with the last sample
+    :return: The CPU ms and the growth of resident memory in kB of each
+        iteration, NaN where no sample precedes its start
+    """
+    times = samples["time"].to_numpy()
+    cpu = samples["cpu_ms"].to_numpy(dtype=np.float64)
+    rss = samples["rss_kb"].to_numpy(dtype=np.float64)
+    starts = np.asarray(starts, dtype=np.float64)
+    if not len(times) or not len(starts):
+        empty = np.full(len(starts), np.nan)
+        return empty, empty.copy()
+    bounds = np.append(starts, times[-1])
+    # The last sample at or before each bound
+    last = np.searchsorted(times, bounds, side="right") - 1
+    valid = last >= 0
+    clipped = np.maximum(last, 0)
+    cpu_at = np.where(valid, cpu[clipped], np.nan)
+    rss_at = np.where(valid, rss[clipped], np.nan)
+    # The highest resident memory between two bounds, both included
+    peaks = np.maximum(np.maximum.reduceat(rss, clipped[:-1]), rss[clipped[1:]])
+    return np.diff(cpu_at), np.where(valid[:-1], peaks - rss_at[:-1], np.nan)
+
+
+def _moon_files(data_dir):
+    files = collections.defaultdict(list)
+    for path, run, _ in cell_files(data_dir, MOON_SUFFIX):
+        files[run.path].append(path)
+    return files
+
+
+def ingest_usage(data_dir):
+    """
+    charon's usage of every handshake of the latency runs of a data
+    directory, one row each with the cell, pair and iteration columns of
+    the results store
+    """
+    moon_files = _moon_files(data_dir)
+    frames = []
+    for path, run, start in cell_files(data_dir, CAROL_SUFFIX):
+        carol = pd.read_csv(path)
+        frame = pd.DataFrame(
+            {
+                "certificate": run.signature,
+                "proposal": run.proposal,
+                "mode": run.mode,
+                "pair": run.pair,
+                "iteration": np.arange(start, start + len(carol)),
+                "carol_cpu_ms": carol["cpu_ms"],
+                "carol_sa_kb": carol["sa_kb"],
+                "moon_cpu_ms": np.nan,
+                "moon_sa_kb": np.nan,
+            }
+        )
+        if run.path in moon_files:
+            samples = read_samples(moon_files[run.path])
+            cpu_ms, sa_kb = attribute(samples, carol["timestamp"])
+            frame["moon_cpu_ms"], frame["moon_sa_kb"] = cpu_ms, sa_kb
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=KEY + ["pair", "iteration"] + COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_usage(data_dir):
+    """
+    charon's usage during the load runs of a data directory, one row per
+    run with the CPU ms per handshake and the memory per SA
+    """
+    moon_files = _moon_files(data_dir)
+    rows = []
+    for path, run, _ in cell_files(data_dir, ".json"):
+        if run.kind != "load":
+            continue
+        with open(path, "r") as f:
+            summary = json.load(f)
+        established = summary.get("established") or np.nan
+        carol = summary.get("charon") or {}
+        row = {
+            "certificate": run.signature,
+            "proposal": run.proposal,
+            "mode": run.mode,
+            "pair": run.pair,
+            "established": summary.get("established", 0),
+            "carol_cpu_ms": carol.get("cpu_ms_per_handshake", np.nan),
+            "carol_sa_kb": carol.get("rss_kb_per_sa", np.nan),
+            "moon_cpu_ms": np.nan,
+            "moon_sa_kb": np.nan,
+        }
+        samples = read_samples(moon_files.get(run.path, []))
+        if len(samples) > 1:
+            # Every SA is up at the end of the handshakes, when moon peaks
+            row["moon_cpu_ms"] = (
+                samples["cpu_ms"].iloc[-1] - samples["cpu_ms"].iloc[0]
+            ) / established
+            row["moon_sa_kb"] = (
+                samples["rss_kb"].max() - samples["rss_kb"].iloc[0]
+            ) / established
+        rows.append(row)
+    return pd.DataFrame(rows, columns=KEY + ["pair", "established"] + COLUMNS)
+
+
+def cell_usage(frame):
+    """
+    The usage of each cell: mean CPU ms per handshake and median memory
+    per SA, since a few handshakes grow charon's heap and most reuse it
+    """
+    grouped = frame.groupby(KEY, observed=True, sort=True)
+    usage = grouped[["carol_cpu_ms", "moon_cpu_ms"]].mean()
+    usage[["carol_sa_kb", "moon_sa_kb"]] = grouped[
+        ["carol_sa_kb", "moon_sa_kb"]
+    ].median()
+    usage.insert(0, "count", grouped.size())
+    return usage[["count"] + COLUMNS]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="charon's CPU and memory per cell")
+    parser.add_argument("data_dir", nargs="?", default=os.getenv("HOST_DATA_PATH"))
+    parser.add_argument(
+        "--where", action="append", default=[], help="column=value, e.g. mode=100ping"
+    )
+    parser.add_argument("--csv", help="Write the usage table here")
+    parser.add_argument(
+        "--pivot", choices=COLUMNS, help="Show one column as certificate x proposal"
+    )
+    args = parser.parse_args(argv)
+    if not args.data_dir:
+        parser.error("data_dir or HOST_DATA_PATH is required")
+
+    criteria = dict(condition.split("=", 1) for condition in args.where)
+    try:
+        frame = select(ingest_usage(args.data_dir), **criteria)
+        load = select(load_usage(args.data_dir), **criteria)
+    except ValueError as e:
+        parser.error(str(e))
+    if frame.empty and load.empty:
+        print("No resource samples match")
+        return 1
+
+    with pd.option_context(
+        "display.max_rows", None, "display.max_columns", None, "display.width", 250
+    ):
+        if not frame.empty:
+            usage = cell_usage(frame)
+            if args.csv:
+                usage.to_csv(args.csv)
+            if args.pivot:
+                print(
+                    usage[args.pivot]
+                    .groupby(level=["certificate", "proposal"])
+                    .mean()
+                    .unstack()
+                    .round(2)
+                )
+            else:
+                print(usage.round(2))
+        if not load.empty:
+            print("Load runs:")
+            print(load.round(2).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,122 @@
+"""
+Live progress of the running cells.
+
+shell_scripts/benchmark_agent.py --stream sends a JSON record per
+handshake over TCP, and ResultStreamServer keeps running statistics of
+each cell and prints them every progress_every handshakes, so a cell can
+be followed before its result file is copied to the host.
+"""
+import json
+import math
+import socketserver
+import threading
+
+
+class CellProgress:
+    """Running statistics of the records streamed for one benchmark cell"""
+
+    def __init__(self, cell):
+        self.cell = cell
+        self.count = 0
+        self.failures = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.done = False
+
+    def add(self, latency, return_code):
+        self.count += 1
+        self.failures += return_code != 0
+        # Welford's online mean and variance
+        delta = latency - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (latency - self.mean)
+        self.minimum = min(self.minimum, latency)
+        self.maximum = max(self.maximum, latency)
+
+    @property
+    def stdev(self):
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def summary(self):
+        return (
+            f"{self.cell}: {self.count} handshakes, "
+            f"mean {self.mean * 1000:.2f}ms ± {self.stdev * 1000:.2f}ms, "
+            f"min {self.minimum * 1000:.2f}ms, max {self.maximum * 1000:.2f}ms, "
+            f"{self.failures} failed"
+        )
+
+
+class ResultStreamServer:
+    """
+    Receives the JSON records streamed by shell_scripts/benchmark_agent.py
+    and keeps running statistics per cell.
+    """
+
+    def __init__(
+        self, host="0.0.0.0", port=5555, progress_every=50, on_record=None
+    ):
+        self.progress = {}
+        self.progress_every = progress_every
+        self.on_record = on_record
+        self._lock = threading.Lock()
+        self._finished = threading.Condition(self._lock)
+
+        stream = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    stream.handle_record(record)
+
+        self._server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def handle_record(self, record):
+        with self._lock:
+            cell = record["cell"]
+            progress = self.progress.setdefault(cell, CellProgress(cell))
+            if record.get("done"):
+                progress.done = True
+                print(f"Finished {progress.summary()}")
+                self._finished.notify_all()
+            else:
+                progress.add(record["latency"], record["return_code"])
+                if progress.count % self.progress_every == 0:
+                    print(progress.summary())
+        if self.on_record is not None:
+            self.on_record(record)
+
+    def wait_for(self, cell, timeout=None):
+        """Wait until the agent reported a cell as done"""
+        with self._lock:
+            return self._finished.wait_for(
+                lambda: cell in self.progress and self.progress[cell].done, timeout
+            )
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,151 @@
+"""
+Pulls new measurements from carol to the host.
+
+One script in the guest lists the measurement directory and hashes the
+files the host already has, which are compared by size and sha256, and
+only new or grown result files are copied, as one archive:
+
+    python result_sync.py [host_dir] [--guest-dir ~/measurements]
+
+host_dir defaults to $HOST_DATA_PATH and the guest directory, absolute or
+below ~, to $GUEST_MEASUREMENTS_PATH. carol is $CAROL_VM_PATH with $CAROL_USER and
+$CAROL_PASSWORD.
+"""
+import argparse
+import os
+import shlex
+import shutil
+import tempfile
+
+from dotenv import load_dotenv
+
+from data_index import parse_file_name
+from vmware_fusion_py import VMware, file_digest, guest_shell_path
+
+
+def carol_from_env():
+    carol = VMware(vmrun_path=shutil.which("vmrun"), vm_path=os.getenv("CAROL_VM_PATH"))
+    carol.set_guest_user(os.getenv("CAROL_USER"))
+    carol.set_guest_password(os.getenv("CAROL_PASSWORD"))
+    return carol
+
+
+def _listing_script(guest_dir, names, manifest_path):
+    # "L <name>" for every file, "D <size> <sha256>  <name>" for those of names
+    script = (
+        f"cd {guest_shell_path(guest_dir)} || exit 1\n"
+        f"{{\n"
+        f'for f in *; do [ -f "$f" ] && printf \'L %s\\n\' "$f"; done\n'
+    )
+    if names:
+        files = " ".join(shlex.quote(name) for name in names)
+        script += (
+            f'for f in {files}; do [ -f "$f" ] && '
+            f'printf \'D %s \' "$(wc -c < "$f")" && sha256sum "$f"; done\n'
+        )
+    return script + f"}} > {shlex.quote(manifest_path)}\n"
+
+
+def guest_files(vm, guest_dir, names):
+    """
+    The files of a guest directory, and the sizes and sha256 digests of
+    some of them, computed in the guest
+    :param guest_dir: Absolute or below ~
+    :param names: The files to hash
+    :return: The names of the files and {name: (size, digest)}
+    """
+    manifest_path = f"/tmp/vmware_sync_{os.urandom(8).hex()}.txt"
+    result = vm.run_script_in_guest(
+        "/bin/sh", _listing_script(guest_dir, names, manifest_path)
+    )
+    if result["return_code"] != 0:
+        raise RuntimeError(f"Could not list {guest_dir}: {result['output']}")
+    fd, host_path = tempfile.mkstemp(suffix=".txt")
+    os.close(fd)
+    try:
+        result = vm.copy_file_from_guest_to_host(manifest_path, host_path)
+        vm.delete_file_in_guest(manifest_path)
+        if result["return_code"] != 0:
+            raise RuntimeError(f"Could not copy {manifest_path}: {result['output']}")
+        files, digests = [], {}
+        with open(host_path, "r") as f:
+            for line in f:
+                kind, _, rest = line.rstrip("\n").partition(" ")
+                if kind == "L":
+                    files.append(rest)
+                elif kind == "D":
+                    size, digest, name = rest.split(None, 2)
+                    digests[name] = (int(size), digest)
+        return files, digests
+    finally:
+        os.remove(host_path)
+
+
+def sync(vm, guest_dir, host_dir, overwrite=False):
+    """
+    Copy the result files of guest_dir that are new, or have grown, to
+    host_dir
+    :param overwrite: Also replace host files with guest files that differ
+        without having grown, e.g. after a cell was benchmarked again
+    :return: The names of the new, grown and diverged (not copied) files and
+        the result of the copy
+    """
+    os.makedirs(host_dir, exist_ok=True)
+    host_names = [name for name in os.listdir(host_dir) if parse_file_name(name)]
+    names, digests = guest_files(vm, guest_dir, host_names)
+    names = [name for name in names if parse_file_name(name)]
+
+    new, grown, diverged = [], [], []
+    existing = []
+    for name in names:
+        if os.path.exists(os.path.join(host_dir, name)):
+            existing.append(name)
+        else:
+            new.append(name)
+    for name in existing:
+        if name not in digests:
+            continue
+        size, digest = digests[name]
+        host_path = os.path.join(host_dir, name)
+        if digest == file_digest(host_path):
+            continue
+        if size > os.path.getsize(host_path) or overwrite:
+            grown.append(name)
+        else:
+            diverged.append(name)
+
+    mapping = {
+        f"{guest_dir.rstrip('/')}/{name}": os.path.join(host_dir, name)
+        for name in new + grown
+    }
+    result = vm.copy_files_from_guest_to_host(mapping)
+    return {"new": new, "grown": grown, "diverged": diverged, "result": result}
+
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Pull new measurements from carol")
+    parser.add_argument("host_dir", nargs="?", default=os.getenv("HOST_DATA_PATH"))
+    parser.add_argument("--guest-dir", default=os.getenv("GUEST_MEASUREMENTS_PATH"))
+    parser.add_argument(
+        "--overwrite", action="store_true", help="Replace diverged host files"
+    )
+    args = parser.parse_args(argv)
+    if not args.host_dir or not args.guest_dir:
+        parser.error("host_dir and --guest-dir (or their variables) are required")
+
+    report = sync(carol_from_env(), args.guest_dir, args.host_dir, args.overwrite)
+    print(
+        f"{len(report['new'])} new and {len(report['grown'])} grown files, "
+        f"{len(report['diverged'])} diverged"
+    )
+    for name in report["diverged"]:
+        print(f"Warning: {name} differs from the guest's, use --overwrite to replace")
+    if report["result"]["return_code"] != 0:
+        print(f"Failed to copy: {report['result']['output']}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,252 @@
+"""
+Columnar store of all benchmark latencies.
+
+Collects the one-latency-per-line result files of a data directory (and of
+its per-pair sub directories) into a single table with one row per
+handshake:
+
+    certificate, chain_depth, proposal, key_exchange, ke1, ke2, ke3, mode,
+    delay_ms, loss_pct, pair, iteration, latency
+
+Text columns are categorical. chain_depth is the number of intermediate CAs
+of the certificate, delay_ms the round trip delay and loss_pct the loss per
+round trip added by the mode (see data_index.py), latency is in seconds.
+The table is saved as Parquet if the path ends in .parquet (needs
+pyarrow), as compressed NumPy arrays otherwise. It records the size and
+modification time of the files it was read from, and load_results reads
+them again if any was added, removed or changed:
+
+    python results_store.py data/ data/results.npz
+
+The primitive timings of shell_scripts/crypto_bench.py are kept the same
+way in data/crypto.npz, one row per call:
+
+    algorithm, kind, operation, backend, pair, iteration, seconds
+"""
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from data_index import CRYPTO_RESULTS, DataIndex
+
+DEFAULT_NAME = "results.npz"
+CRYPTO_NAME = "crypto.npz"
+CRYPTO_CATEGORIES = ("algorithm", "kind", "operation", "backend", "pair")
+CATEGORIES = (
+    "certificate",
+    "proposal",
+    "key_exchange",
+    "ke1",
+    "ke2",
+    "ke3",
+    "mode",
+    "pair",
+)
+
+
+def parse_proposal(proposal):
+    """
+    Split a KEM proposal into its key exchanges, e.g. ke1_kyber3-x25519
+    :return: The initial key exchange and the additional ones, ke1 to ke3
+    """
+    exchanges = {"key_exchange": None, "ke1": None, "ke2": None, "ke3": None}
+    for token in proposal.split("-"):
+        prefix, _, algorithm = token.partition("_")
+        if algorithm and prefix in exchanges:
+            exchanges[prefix] = algorithm
+        else:
+            exchanges["key_exchange"] = token
+    return exchanges
+
+
+def read_latencies(path):
+    with open(path, "rb") as f:
+        return np.array(f.read().split(), dtype=np.float64)
+
+
+def ingest(data_dir, store_path=None):
+    """
+    Read every result file of data_dir into one table
+    :param store_path: Where to save the table, if anywhere
+    :return: The table as a DataFrame
+    """
+    index = DataIndex(data_dir)
+    runs, latencies = [], []
+    for run in index.find(kind="latency"):
+        runs.append(
+            dict(
+                parse_proposal(run.proposal),
+                certificate=run.signature,
+                chain_depth=run.chain_depth,
+                proposal=run.proposal,
+                mode=run.mode,
+                pair=run.pair,
+                delay_ms=run.delay_ms,
+                loss_pct=run.loss_pct,
+            )
+        )
+        latencies.append(read_latencies(index.path(run)))
+
+    # Per-file values are repeated for each of the file's latencies
+    counts = [len(values) for values in latencies]
+    frame = pd.DataFrame(
+        {
+            name: pd.Categorical(
+                np.repeat(np.array([run[name] for run in runs], dtype=object), counts)
+            )
+            for name in CATEGORIES
+        }
+    )
+    for name in ("delay_ms", "loss_pct"):
+        values = np.array([run[name] for run in runs], dtype=np.float32)
+        frame[name] = np.repeat(values, counts)
+    depths = np.array([run["chain_depth"] for run in runs], dtype=np.int8)
+    frame.insert(1, "chain_depth", np.repeat(depths, counts))
+    iterations = [np.arange(count, dtype=np.int32) for count in counts]
+    frame["iteration"] = np.concatenate(iterations or [np.zeros(0, np.int32)])
+    frame["latency"] = np.concatenate(latencies or [np.zeros(0)])
+    frame.attrs["sources"] = _sources(index)
+    if store_path:
+        save(frame, store_path)
+    return frame
+
+
+def save(frame, path):
+    # pandas keeps attrs in the Parquet metadata
+    if path.endswith(".parquet"):
+        frame.to_parquet(path, index=False)
+        return
+    arrays = {
+        "__columns__": np.array(frame.columns, dtype=str),
+        "__attrs__": np.array(json.dumps(frame.attrs)),
+    }
+    for name in frame.columns:
+        column = frame[name]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            arrays[f"{name}.codes"] = column.cat.codes.to_numpy()
+            arrays[f"{name}.categories"] = np.array(column.cat.categories, dtype=str)
+        else:
+            arrays[name] = column.to_numpy()
+    np.savez_compressed(path, **arrays)
+
+
+def load(path):
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    with np.load(path) as arrays:
+        frame = {}
+        for name in arrays["__columns__"]:
+            if f"{name}.codes" in arrays:
+                frame[name] = pd.Categorical.from_codes(
+                    arrays[f"{name}.codes"], arrays[f"{name}.categories"]
+                )
+            else:
+                frame[name] = arrays[name]
+        frame = pd.DataFrame(frame)
+        if "__attrs__" in arrays:
+            frame.attrs = json.loads(str(arrays["__attrs__"]))
+        return frame
+
+
+def _sources(index):
+    """{path: [size, modification time]} of the latency files of an index"""
+    return {run.path: index.stamps[run.path] for run in index.find(kind="latency")}
+
+
+def _load_current(store_path, sources):
+    """The stored table, or None if it was not read from exactly sources"""
+    if not os.path.exists(store_path):
+        return None
+    frame = load(store_path)
+    return frame if frame.attrs.get("sources") == sources else None
+
+
+def load_results(data_dir, store_path=None):
+    """
+    The table of a data directory, from its store unless result files were
+    added, removed or changed since the store was written
+    """
+    store_path = store_path or os.path.join(data_dir, DEFAULT_NAME)
+    frame = _load_current(store_path, _sources(DataIndex(data_dir)))
+    return frame if frame is not None else ingest(data_dir, store_path)
+
+
+def _crypto_files(data_dir):
+    """The crypto_bench.py results of data_dir and its pair directories"""
+    paths = []
+    for entry in sorted(os.scandir(data_dir), key=lambda e: e.name):
+        if entry.is_file() and entry.name == CRYPTO_RESULTS:
+            paths.append((entry.path, None))
+        elif entry.is_dir():
+            path = os.path.join(entry.path, CRYPTO_RESULTS)
+            if os.path.isfile(path):
+                paths.append((path, entry.name))
+    return paths
+
+
+def _crypto_sources(data_dir):
+    """{path: [size, modification time]} of the crypto_bench.py results"""
+    stamps = {}
+    for path, _ in _crypto_files(data_dir):
+        stat = os.stat(path)
+        stamps[os.path.relpath(path, data_dir)] = [stat.st_size, stat.st_mtime_ns]
+    return stamps
+
+
+def ingest_crypto(data_dir, store_path=None):
+    """
+    Read the primitive timings of data_dir into one table
+    :param store_path: Where to save the table, if anywhere
+    """
+    frames = []
+    for path, pair in _crypto_files(data_dir):
+        frame = pd.read_csv(path)
+        frame["pair"] = pair
+        frames.append(frame)
+    if frames:
+        frame = pd.concat(frames, ignore_index=True)
+    else:
+        frame = pd.DataFrame(
+            {name: [] for name in CRYPTO_CATEGORIES + ("iteration", "seconds")}
+        )
+    for name in CRYPTO_CATEGORIES:
+        frame[name] = pd.Categorical(frame[name].astype(object))
+    frame["iteration"] = frame["iteration"].astype(np.int32)
+    frame["seconds"] = frame["seconds"].astype(np.float64)
+    frame = frame[list(CRYPTO_CATEGORIES) + ["iteration", "seconds"]]
+    frame.attrs["sources"] = _crypto_sources(data_dir)
+    if store_path:
+        save(frame, store_path)
+    return frame
+
+
+def load_crypto(data_dir, store_path=None):
+    """The primitive timings of a data directory, like load_results"""
+    store_path = store_path or os.path.join(data_dir, CRYPTO_NAME)
+    sources = _crypto_sources(data_dir)
+    frame = _load_current(store_path, sources)
+    return frame if frame is not None else ingest_crypto(data_dir, store_path)
+
+
+def cell_means(frame):
+    """
+    :return: {(certificate, proposal, mode): (mean latency, iterations)}
+    """
+    grouped = frame.groupby(["certificate", "proposal", "mode"], observed=True)
+    stats = grouped["latency"].agg(["mean", "size"])
+    return {key: (row["mean"], int(row["size"])) for key, row in stats.iterrows()}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print(__doc__.strip())
+        sys.exit(2)
+    data_dir = sys.argv[1]
+    store_path = sys.argv[2] if len(sys.argv) == 3 else None
+    store_path = store_path or os.path.join(data_dir, DEFAULT_NAME)
+    frame = ingest(data_dir, store_path)
+    cells = len(cell_means(frame))
+    print(f"Stored {len(frame)} latencies of {cells} cells in {store_path}")
@@ -0,0 +1,97 @@
+import json
+import os
+import threading
+import time
+
+from vmware_fusion_py import file_digest
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETE = "complete"
+FAILED = "failed"
+
+
+class RunManifest:
+    """
+    Host-side record of a benchmark sweep, one entry per matrix cell with
+    its status, the iterations measured so far and the checksum of its
+    result file. Cells replicated on every pair get an entry per pair, see
+    entry_name. Rewritten atomically on every change, so a sweep that dies
+    halfway leaves a manifest a re-run can resume from.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.cells = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.cells = json.load(f).get("cells", {})
+
+    def _save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"cells": self.cells}, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+    def entry(self, name):
+        with self._lock:
+            return dict(self.cells.get(name, {"status": PENDING, "iterations": 0}))
+
+    def update(self, name, **fields):
+        """Change the entry of a cell and persist the manifest"""
+        with self._lock:
+            entry = self.cells.setdefault(name, {"status": PENDING, "iterations": 0})
+            entry.update(fields, updated=time.time())
+            self._save()
+
+    def record_progress(self, record, every=10):
+        """
+        Track the iterations of running cells from streamed agent records.
+        Records do not name their pair, so replicated cells are skipped
+        """
+        if "iteration" not in record or (record["iteration"] + 1) % every:
+            return
+        with self._lock:
+            known = record["cell"] in self.cells
+        if known:
+            self.update(record["cell"], iterations=record["iteration"] + 1)
+
+    def is_complete(self, name):
+        """
+        Check whether a cell can be skipped: it completed, and its result
+        file, if one was recorded, still has the recorded contents
+        """
+        entry = self.entry(name)
+        if entry["status"] != COMPLETE:
+            return False
+        host_path = entry.get("host_path")
+        if not host_path or not entry.get("checksum"):
+            return True
+        return os.path.exists(host_path) and file_digest(host_path) == entry["checksum"]
+
+    def pending(self, names):
+        return [name for name in names if not self.is_complete(name)]
+
+    def summary(self):
+        with self._lock:
+            counts = {}
+            for entry in self.cells.values():
+                counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+            return counts
+
+
+def entry_name(cell_name, pair_name=None):
+    """
+    The manifest entry of a cell, one per pair for cells replicated on every
+    pair and one for the whole sweep otherwise
+    """
+    return cell_name if pair_name is None else f"{pair_name}/{cell_name}"
+
+
+def count_iterations(path):
+    """The number of latencies in a benchmark agent result file"""
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path, "r") as f:
+        return sum(1 for line in f if line.strip())
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+In-guest benchmark agent, a drop-in replacement for benchmark.sh.
+
+Times `swanctl --initiate` with time.perf_counter_ns, appends every latency
+(in seconds) to ~/measurements/<certificate>_<proposal>_<constraint>.txt and
+streams one JSON record per iteration to the host while the run is going:
+
+    benchmark_agent.py dilithium2 ke1_kyber3-x25519 unlimited 500 <password> \
+        --stream 172.16.217.1:5555
+
+With --vici the handshakes are driven over a persistent VICI connection to
+charon instead, so the sudo and swanctl start-up is not part of the
+measured latency, which then ends at the ike-updown event.
+
+With --capture the IKE traffic of the run is recorded with tcpdump to
+<cell>.pcap next to the latencies, and the start of every iteration to
+<cell>.times, see pcap_analyzer.py. With --resources charon's CPU time
+and resident memory are sampled around every handshake and written to
+<cell>.charon.csv, see resource_usage.py.
+"""
+import argparse
+import getpass
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import vici_session as vici
+
+
+class RecordStream:
+    """Writes JSON lines to a TCP socket or a file object"""
+
+    def __init__(self, address=None, fallback=None):
+        self.sock = None
+        self.fallback = fallback
+        if address:
+            host, port = address.rsplit(":", 1)
+            try:
+                self.sock = socket.create_connection((host, int(port)), timeout=5)
+            except OSError as e:
+                print(f"Could not connect to {address}: {e}", file=sys.stderr)
+
+    def send(self, record):
+        line = (json.dumps(record) + "\n").encode("utf-8")
+        if self.sock is not None:
+            try:
+                self.sock.sendall(line)
+                return
+            except OSError as e:
+                print(f"Result stream closed: {e}", file=sys.stderr)
+                self.sock.close()
+                self.sock = None
+        if self.fallback is not None:
+            self.fallback.write(line.decode("utf-8"))
+            self.fallback.flush()
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+
+
+class SwanctlDriver:
+    """Drives handshakes by running swanctl, optionally through sudo"""
+
+    def __init__(self, ike, swanctl="swanctl", password=None, sudo=True):
+        self.ike = ike
+        self.prefix = ["sudo", "-S"] if sudo else []
+        self.swanctl = swanctl
+        self.password = password
+
+    def _run(self, *args):
+        stdin = (self.password + "\n").encode("utf-8") if self.password else None
+        proc = subprocess.run(
+            self.prefix + [self.swanctl, *args, "--ike", self.ike],
+            input=stdin,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        return proc.returncode
+
+    def initiate(self):
+        """
+        Establish the IKE SA
+        :return: The return code and the latency in nanoseconds
+        """
+        start = time.perf_counter_ns()
+        return_code = self._run("--initiate")
+        return return_code, time.perf_counter_ns() - start
+
+    def terminate(self):
+        return self._run("--terminate")
+
+    def close(self):
+        pass
+
+
+class ViciDriver:
+    """Drives handshakes over a persistent VICI connection to charon"""
+
+    def __init__(self, ike, uri=vici.DEFAULT_URI, timeout_ms=30000):
+        self.ike = ike
+        self.timeout_ms = timeout_ms
+        self.session = vici.Session(uri)
+        self.session.on_event = self._on_event
+        self.session.register("ike-updown")
+        self.up_at = None
+
+    def _on_event(self, name, message):
+        if name == "ike-updown" and message.get("up") == "yes":
+            self.up_at = time.perf_counter_ns()
+
+    def initiate(self):
+        """
+        Establish the IKE SA
+        :return: The return code and the latency in nanoseconds
+        """
+        self.up_at = None
+        self.session.events.clear()
+        start = time.perf_counter_ns()
+        try:
+            self.session.request(
+                "initiate", {"ike": self.ike, "timeout": self.timeout_ms}
+            )
+            return_code = 0
+        except vici.ViciError:
+            return_code = 1
+        end = self.up_at or time.perf_counter_ns()
+        return return_code, end - start
+
+    def terminate(self):
+        try:
+            self.session.request(
+                "terminate", {"ike": self.ike, "timeout": self.timeout_ms}
+            )
+            return 0
+        except vici.ViciError:
+            return 1
+
+    def close(self):
+        self.session.close()
+
+
+class PacketCapture:
+    """
+    Records the IKE traffic of a run with tcpdump, and the start of every
+    iteration to a .times file next to it, for pcap_analyzer.py to match
+    the handshakes to their iterations by
+    """
+
+    FILTER = "udp port 500 or udp port 4500"
+
+    def __init__(self, path, interface="any", password=None, sudo=True, linger=0.5):
+        """
+        :param linger: Seconds to keep capturing after the last handshake,
+            for the packets still in flight
+        """
+        self.path = path
+        self.times_path = os.path.splitext(path)[0] + ".times"
+        self.times = None
+        self.interface = interface
+        self.password = password
+        self.prefix = ["sudo", "-S"] if sudo and os.geteuid() != 0 else []
+        self.linger = linger
+        self.proc = None
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.times = open(self.times_path, "w")
+        # tcpdump writes the file as the user running the benchmark
+        user = os.environ.get("SUDO_USER") or getpass.getuser()
+        self.proc = subprocess.Popen(
+            self.prefix
+            + ["tcpdump", "-U", "-n", "-i", self.interface, "-Z", user]
+            + ["-w", self.path, self.FILTER],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        if self.prefix and self.password:
+            self.proc.stdin.write((self.password + "\n").encode("utf-8"))
+        self.proc.stdin.close()
+        # Handshakes before tcpdump listens would be missing from the capture
+        deadline = time.monotonic() + 5
+        while not os.path.exists(self.path) and time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"tcpdump exited with {self.proc.returncode}")
+            time.sleep(0.05)
+
+    def mark(self, timestamp):
+        """Note the start of an iteration"""
+        self.times.write(f"{timestamp:.6f}\n")
+        self.times.flush()
+
+    def stop(self):
+        if self.times is not None:
+            self.times.close()
+            self.times = None
+        if self.proc is None:
+            return
+        time.sleep(self.linger)
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        self.proc = None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("certificate")
+    parser.add_argument("proposal")
+    parser.add_argument("constraint")
+    parser.add_argument("iterations", nargs="?", type=int, default=10)
+    parser.add_argument("password", nargs="?")
+    parser.add_argument("--ike", default="home", help="The IKE connection to use")
+    parser.add_argument("--swanctl", default="swanctl")
+    parser.add_argument(
+        "--vici",
+        nargs="?",
+        const=vici.DEFAULT_URI,
+        help="Drive handshakes over VICI, optionally at this URI",
+    )
+    parser.add_argument("--no-sudo", action="store_true")
+    parser.add_argument("--sleep", type=float, default=0.1)
+    parser.add_argument(
+        "--start-iteration",
+        type=int,
+        help="Keep this many latencies of an earlier run and continue after them",
+    )
+    parser.add_argument("--output-dir", default="~/measurements")
+    parser.add_argument(
+        "--capture",
+        nargs="?",
+        const="any",
+        help="Record the IKE traffic, optionally only on this interface",
+    )
+    parser.add_argument(
+        "--resources",
+        action="store_true",
+        help="Sample charon's CPU time and memory around every handshake",
+    )
+    parser.add_argument("--stream", help="HOST:PORT to stream records to")
+    parser.add_argument(
+        "--stdout", action="store_true", help="Stream records to stdout"
+    )
+    return parser.parse_args(argv)
+
+
+def keep_latencies(output_file, count):
+    """
+    Truncate a result file to its first `count` latencies
+    :return: The number of latencies kept
+    """
+    lines = []
+    if os.path.exists(output_file):
+        with open(output_file, "r") as f:
+            lines = [line for line in f if line.strip()][:count]
+    with open(output_file, "w") as f:
+        f.writelines(lines)
+    return len(lines)
+
+
+class UsageLog:
+    """
+    charon's CPU time and memory growth per handshake, as CSV rows in the
+    order of the latencies
+    """
+
+    HEADER = "timestamp,cpu_ms,sa_kb,rss_kb\n"
+
+    def __init__(self, path, start=None):
+        # charon_usage.py only has to be next to the agent for --resources
+        from charon_usage import CharonUsage
+
+        self.usage = CharonUsage()
+        # Resumed runs keep the header and the rows of the kept iterations
+        if start is not None:
+            keep_latencies(path, start + 1)
+        self.file = open(path, "a")
+        if self.file.tell() == 0:
+            self.file.write(self.HEADER)
+        self.before = None
+
+    def begin(self):
+        self.before = self.usage.sample()
+
+    def end(self, timestamp):
+        """
+        Log the handshake since begin, before its SA is terminated
+        :return: CPU ms and kB of resident memory it took
+        """
+        after = self.usage.sample()
+        cpu_ms, sa_kb = self.usage.difference(self.before, after)
+        self.file.write(
+            f"{timestamp:.6f},{'' if cpu_ms is None else f'{cpu_ms:g}'},"
+            f"{'' if sa_kb is None else sa_kb},{after['rss_kb'] or ''}\n"
+        )
+        self.file.flush()
+        return cpu_ms, sa_kb
+
+    def close(self):
+        self.file.close()
+
+
+def run(args):
+    cell = f"{args.certificate}_{args.proposal}_{args.constraint}"
+    output_dir = os.path.expanduser(args.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = os.path.join(output_dir, f"{cell}.txt")
+
+    if args.vici:
+        driver = ViciDriver(args.ike, args.vici)
+    else:
+        driver = SwanctlDriver(
+            args.ike, args.swanctl, args.password, sudo=not args.no_sudo
+        )
+    start = 0
+    if args.start_iteration is not None:
+        start = keep_latencies(output_file, args.start_iteration)
+
+    capture = None
+    if args.capture:
+        # Resumed runs get their own capture starting at their first iteration
+        suffix = f".{start}" if start else ""
+        capture = PacketCapture(
+            os.path.join(output_dir, f"{cell}{suffix}.pcap"),
+            args.capture,
+            args.password,
+            sudo=not args.no_sudo,
+        )
+        capture.start()
+
+    usage = None
+    if args.resources:
+        usage = UsageLog(
+            os.path.join(output_dir, f"{cell}.charon.csv"),
+            None if args.start_iteration is None else start,
+        )
+
+    stream = RecordStream(args.stream, sys.stdout if args.stdout else None)
+    failures = 0
+    try:
+        with open(output_file, "a") as f:
+            for i in range(start, args.iterations):
+                timestamp = time.time()
+                if capture is not None:
+                    capture.mark(timestamp)
+                if usage is not None:
+                    usage.begin()
+                return_code, latency_ns = driver.initiate()
+                record = {}
+                if usage is not None:
+                    cpu_ms, sa_kb = usage.end(timestamp)
+                    record = {"charon_cpu_ms": cpu_ms, "charon_sa_kb": sa_kb}
+                latency = latency_ns / 1e9
+                f.write(f"{latency:.9f}\n")
+                f.flush()
+                failures += return_code != 0
+                stream.send(
+                    {
+                        "cell": cell,
+                        "iteration": i,
+                        "timestamp": timestamp,
+                        "latency": latency,
+                        "return_code": return_code,
+                        **record,
+                    }
+                )
+                time.sleep(args.sleep)
+                driver.terminate()
+        stream.send(
+            {
+                "cell": cell,
+                "done": True,
+                "iterations": args.iterations,
+                "failures": failures,
+            }
+        )
+    finally:
+        if capture is not None:
+            capture.stop()
+        if usage is not None:
+            usage.close()
+        driver.close()
+        stream.close()
+    return 1 if failures and failures == args.iterations - start else 0
+
+
+def run_as_root(args, script=__file__):
+    """Re-run a script through sudo, the VICI socket is only open to root"""
+    argv = [sys.executable, os.path.abspath(script), *sys.argv[1:]]
+    argv += ["--output-dir", os.path.expanduser(args.output_dir)]
+    stdin = (args.password + "\n").encode("utf-8") if args.password else None
+    return subprocess.run(["sudo", "-S", *argv], input=stdin).returncode
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.vici and args.vici.startswith("unix://") and os.geteuid() != 0:
+        if not args.no_sudo:
+            sys.exit(run_as_root(args))
+    sys.exit(run(args))
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+CPU time and memory of the running charon, read from /proc.
+
+Imported by benchmark_agent.py and load_generator.py, which sample charon
+around handshakes. On moon, where no agent runs, the harness starts it for
+the duration of a cell to append a JSON sample every --interval seconds to
+a file, until the stop file appears:
+
+    charon_usage.py --output /tmp/usage.jsonl --interval 0.02 \
+        --stop-file /tmp/usage.stop
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+PID_FILES = ("/var/run/charon.pid", "/run/charon.pid")
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def find_charon():
+    """The pid of charon, or None if it is not running"""
+    for path in PID_FILES:
+        try:
+            with open(path, "r") as f:
+                pid = int(f.read().strip())
+            if os.path.exists(f"/proc/{pid}"):
+                return pid
+        except (OSError, ValueError):
+            pass
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/comm", "r") as f:
+                if f.read().strip() == "charon":
+                    return int(entry)
+        except OSError:
+            pass
+    return None
+
+
+def sample(pid):
+    """
+    :return: The process's CPU time in ms (user and system), resident and
+        peak resident memory in kB, or None once it has exited
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            stat = f.read()
+        with open(f"/proc/{pid}/status", "r") as f:
+            status = f.read()
+    except OSError:
+        return None
+    # The command name may contain spaces, the fields after it do not
+    fields = stat[stat.rindex(")") + 2 :].split()
+    utime, stime = int(fields[11]), int(fields[12])
+    memory = {}
+    for line in status.splitlines():
+        key, _, value = line.partition(":")
+        if key in ("VmRSS", "VmHWM"):
+            memory[key] = int(value.split()[0])
+    return {
+        "time": time.time(),
+        "cpu_ms": (utime + stime) * 1000 / CLOCK_TICKS,
+        "rss_kb": memory.get("VmRSS", 0),
+        "hwm_kb": memory.get("VmHWM", 0),
+    }
+
+
+class CharonUsage:
+    """Differences between samples of charon"""
+
+    def __init__(self, pid=None):
+        self.pid = pid or find_charon()
+        if self.pid is None:
+            raise RuntimeError("charon is not running")
+
+    def sample(self):
+        return sample(self.pid) or {"cpu_ms": None, "rss_kb": None, "hwm_kb": None}
+
+    @staticmethod
+    def difference(before, after):
+        """CPU ms and kB of resident memory spent between two samples"""
+        if before["cpu_ms"] is None or after["cpu_ms"] is None:
+            return None, None
+        return (
+            after["cpu_ms"] - before["cpu_ms"],
+            after["rss_kb"] - before["rss_kb"],
+        )
+
+
+def watch(pid, output, interval, stop_file=None):
+    """Write samples of pid to output until stop_file exists or pid exits"""
+    while stop_file is None or not os.path.exists(stop_file):
+        usage = sample(pid)
+        if usage is None:
+            break
+        output.write(json.dumps(usage) + "\n")
+        output.flush()
+        time.sleep(interval)
+    if stop_file is not None and os.path.exists(stop_file):
+        os.remove(stop_file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sample charon's CPU and memory")
+    parser.add_argument("--pid", type=int)
+    parser.add_argument("--output", help="Append the samples to this file")
+    parser.add_argument(
+        "--interval", type=float, help="Keep sampling every this many seconds"
+    )
+    parser.add_argument("--stop-file", help="Stop sampling once this file exists")
+    args = parser.parse_args(argv)
+    pid = args.pid or find_charon()
+    if pid is None or sample(pid) is None:
+        print("charon is not running", file=sys.stderr)
+        return 1
+    output = open(args.output, "a") if args.output else sys.stdout
+    try:
+        if args.interval:
+            watch(pid, output, args.interval, args.stop_file)
+        else:
+            output.write(json.dumps(sample(pid)) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the primitives of a handshake: keygen, sign and verify
+of the signature families, keygen, encaps and decaps of the key exchanges.
+
+Post-quantum algorithms run through liboqs (the oqs package of
+liboqs-python), the classical ones through the cryptography package, with
+the key sizes pki generates by default, or the size or curve a family name
+like rsa3072 or ecdsa256 gives. Algorithms whose library is missing are
+skipped. Every operation is timed with time.perf_counter_ns and written
+to ~/measurements/crypto_bench.csv, one row per call, in seconds:
+
+    crypto_bench.py --iterations 200 dilithium2 falcon512 rsa rsa3072 kyber3 x25519
+"""
+import argparse
+import csv
+import os
+import re
+import statistics
+import sys
+import time
+
+SIGNATURES = ("rsa", "ecdsa", "ed25519", "dilithium2", "dilithium3",
+              "dilithium5", "falcon512", "falcon1024")
+KEMS = ("x25519", "ecp256", "ecp384", "kyber1", "kyber3", "kyber5", "mlkem512",
+        "mlkem768", "mlkem1024", "bike1", "bike3", "bike5", "hqc1", "hqc3", "hqc5")
+# liboqs names, newer releases only know the standardized ones
+OQS_MECHANISMS = {
+    "dilithium2": ("Dilithium2", "ML-DSA-44"),
+    "dilithium3": ("Dilithium3", "ML-DSA-65"),
+    "dilithium5": ("Dilithium5", "ML-DSA-87"),
+    "falcon512": ("Falcon-512",),
+    "falcon1024": ("Falcon-1024",),
+    "kyber1": ("Kyber512", "ML-KEM-512"),
+    "kyber3": ("Kyber768", "ML-KEM-768"),
+    "kyber5": ("Kyber1024", "ML-KEM-1024"),
+    "mlkem512": ("ML-KEM-512",),
+    "mlkem768": ("ML-KEM-768",),
+    "mlkem1024": ("ML-KEM-1024",),
+    "bike1": ("BIKE-L1",),
+    "bike3": ("BIKE-L3",),
+    "bike5": ("BIKE-L5",),
+    "hqc1": ("HQC-128",),
+    "hqc3": ("HQC-192",),
+    "hqc5": ("HQC-256",),
+}
+# RSA key sizes and ECDSA curves of sized families, as in certificate_factory.py
+SIZED_SIGNATURE = re.compile(r"(rsa|ecdsa)(\d+)")
+RSA_SIZES = (2048, 3072, 4096, 8192)
+ECDSA_CURVES = {256: "SECP256R1", 384: "SECP384R1", 521: "SECP521R1"}
+ECDSA_HASHES = {256: "SHA256", 384: "SHA384", 521: "SHA512"}
+# Roughly the size of the octets an IKE_AUTH signature covers
+MESSAGE = os.urandom(512)
+# The harness names the file with --output, see data_index.CRYPTO_RESULTS
+OUTPUT_NAME = "crypto_bench.csv"
+FIELDS = ["algorithm", "kind", "operation", "backend", "iteration", "seconds"]
+
+
+def _oqs_mechanism(algorithm, enabled):
+    for mechanism in OQS_MECHANISMS[algorithm]:
+        if mechanism in enabled:
+            return mechanism
+    raise LookupError(f"liboqs has none of {', '.join(OQS_MECHANISMS[algorithm])}")
+
+
+def oqs_signature(algorithm):
+    import oqs
+
+    mechanism = _oqs_mechanism(algorithm, oqs.get_enabled_sig_mechanisms())
+    signer = oqs.Signature(mechanism)
+    public_key = signer.generate_keypair()
+    signature = signer.sign(MESSAGE)
+    verifier = oqs.Signature(mechanism)
+    return mechanism, {
+        "keygen": lambda: oqs.Signature(mechanism).generate_keypair(),
+        "sign": lambda: signer.sign(MESSAGE),
+        "verify": lambda: verifier.verify(MESSAGE, signature, public_key),
+    }
+
+
+def oqs_kem(algorithm):
+    import oqs
+
+    mechanism = _oqs_mechanism(algorithm, oqs.get_enabled_kem_mechanisms())
+    initiator = oqs.KeyEncapsulation(mechanism)
+    public_key = initiator.generate_keypair()
+    responder = oqs.KeyEncapsulation(mechanism)
+    ciphertext, _ = responder.encap_secret(public_key)
+    return mechanism, {
+        "keygen": lambda: oqs.KeyEncapsulation(mechanism).generate_keypair(),
+        "encaps": lambda: responder.encap_secret(public_key),
+        "decaps": lambda: initiator.decap_secret(ciphertext),
+    }
+
+
+def classical_signature(algorithm):
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec, ed25519, padding, rsa
+
+    sized = SIZED_SIGNATURE.fullmatch(algorithm)
+    family, size = (sized.group(1), int(sized.group(2))) if sized else (algorithm, None)
+    if family == "rsa":
+        size = size or 2048
+        if size not in RSA_SIZES:
+            raise ValueError(f"{algorithm}: RSA keys have {RSA_SIZES} bits")
+        generate = lambda: rsa.generate_private_key(65537, size)
+        arguments = (padding.PKCS1v15(), hashes.SHA256())
+    elif family == "ecdsa":
+        size = size or 384
+        if size not in ECDSA_CURVES:
+            raise ValueError(f"{algorithm}: ECDSA curves are {tuple(ECDSA_CURVES)}")
+        curve = getattr(ec, ECDSA_CURVES[size])()
+        generate = lambda: ec.generate_private_key(curve)
+        arguments = (ec.ECDSA(getattr(hashes, ECDSA_HASHES[size])()),)
+    else:
+        generate = ed25519.Ed25519PrivateKey.generate
+        arguments = ()
+    key = generate()
+    public_key = key.public_key()
+    signature = key.sign(MESSAGE, *arguments)
+    return "cryptography", {
+        "keygen": generate,
+        "sign": lambda: key.sign(MESSAGE, *arguments),
+        "verify": lambda: public_key.verify(signature, MESSAGE, *arguments),
+    }
+
+
+def classical_kem(algorithm):
+    """(EC)DH as a KEM: the responder's keygen and exchange encapsulate"""
+    from cryptography.hazmat.primitives.asymmetric import ec, x25519
+
+    if algorithm == "x25519":
+        generate = x25519.X25519PrivateKey.generate
+        exchange = lambda key, peer: key.exchange(peer)
+    else:
+        curve = ec.SECP256R1() if algorithm == "ecp256" else ec.SECP384R1()
+        generate = lambda: ec.generate_private_key(curve)
+        exchange = lambda key, peer: key.exchange(ec.ECDH(), peer)
+    initiator = generate()
+    responder_public = generate().public_key()
+
+    def encaps():
+        responder = generate()
+        exchange(responder, initiator.public_key())
+        return responder.public_key()
+
+    return "cryptography", {
+        "keygen": lambda: generate().public_key(),
+        "encaps": encaps,
+        "decaps": lambda: exchange(initiator, responder_public),
+    }
+
+
+def operations(algorithm):
+    """
+    :return: The kind, the backend and the timed operations of algorithm
+    :raise ImportError: If its library is not installed
+    """
+    sized = SIZED_SIGNATURE.fullmatch(algorithm) is not None
+    kind = "signature" if algorithm in SIGNATURES or sized else "kem"
+    if algorithm in OQS_MECHANISMS:
+        factory = oqs_signature if kind == "signature" else oqs_kem
+    elif algorithm in SIGNATURES or sized:
+        factory = classical_signature
+    elif algorithm in KEMS:
+        factory = classical_kem
+    else:
+        raise ValueError(f"Unknown algorithm {algorithm}")
+    backend, timed = factory(algorithm)
+    return kind, backend, timed
+
+
+def bench(algorithm, iterations, warmup=3):
+    """
+    Time every operation of algorithm
+    :return: The rows for the output file
+    """
+    kind, backend, timed = operations(algorithm)
+    rows = []
+    for operation, function in timed.items():
+        for _ in range(warmup):
+            function()
+        for i in range(iterations):
+            start = time.perf_counter_ns()
+            function()
+            seconds = (time.perf_counter_ns() - start) / 1e9
+            rows.append([algorithm, kind, operation, backend, i, f"{seconds:.9f}"])
+    return rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "algorithms",
+        nargs="*",
+        help="Signature families and key exchanges, all by default",
+    )
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--output-dir", default="~/measurements")
+    parser.add_argument(
+        "--output", default=OUTPUT_NAME, help="Name of the timings in output-dir"
+    )
+    return parser.parse_args(argv)
+
+
+def main(args):
+    output_dir = os.path.expanduser(args.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    rows = []
+    for algorithm in args.algorithms or SIGNATURES + KEMS:
+        try:
+            algorithm_rows = bench(algorithm, args.iterations)
+        except (ImportError, LookupError, ValueError) as e:
+            print(f"Skipping {algorithm}: {e}", file=sys.stderr)
+            continue
+        rows += algorithm_rows
+        medians = {}
+        for _, _, operation, _, _, seconds in algorithm_rows:
+            medians.setdefault(operation, []).append(float(seconds))
+        print(
+            f"{algorithm}: "
+            + ", ".join(
+                f"{operation} {statistics.median(values) * 1e6:.1f}us"
+                for operation, values in medians.items()
+            )
+        )
+
+    # Each run replaces the previous one, the figures belong to this machine
+    path = os.path.join(output_dir, args.output)
+    with open(path + ".tmp", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        writer.writerows(rows)
+    os.replace(path + ".tmp", path)
+    return 0 if rows else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+In-guest load generator: establishes many concurrent IKE SAs from carol.
+
+Initiates the connections <prefix>0 ... <prefix><N - 1> (see
+StrongSwan.write_load_configs) over VICI, with at most --concurrency
+handshakes in flight, the limit growing linearly from 1 during --ramp
+seconds. All SAs are held until every handshake finished, then torn down.
+Prints, and writes to ~/measurements/load_<cell>.json, the handshake rate
+and latency percentiles, with --resources also charon's CPU time per
+handshake and resident memory per SA:
+
+    load_generator.py dilithium2 ke1_kyber3-x25519 unlimited 200 \
+        --concurrency 32 --ramp 2
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import vici_session as vici
+from benchmark_agent import RecordStream, run_as_root
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(q / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class Ramp:
+    """Concurrency limit that grows from 1 to `concurrency` over `seconds`"""
+
+    def __init__(self, concurrency, seconds):
+        self.concurrency = concurrency
+        self.seconds = seconds
+        self.in_flight = 0
+        self.start = None
+        self.condition = threading.Condition()
+
+    def limit(self):
+        if self.seconds <= 0:
+            return self.concurrency
+        elapsed = time.monotonic() - self.start
+        fraction = min(elapsed / self.seconds, 1.0)
+        return max(1, int(round(1 + fraction * (self.concurrency - 1))))
+
+    def acquire(self):
+        with self.condition:
+            if self.start is None:
+                self.start = time.monotonic()
+            # Wake up periodically, the limit also grows with time
+            while self.in_flight >= self.limit():
+                self.condition.wait(timeout=0.01)
+            self.in_flight += 1
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+
+
+def generate_load(args, cell, stream):
+    connections = [f"{args.prefix}{i}" for i in range(args.connections)]
+    pending = list(reversed(connections))
+    records = []
+    lock = threading.Lock()
+    ramp = Ramp(args.concurrency, args.ramp)
+    usage = None
+    if args.resources:
+        from charon_usage import CharonUsage
+
+        usage = CharonUsage()
+    before = usage.sample() if usage else None
+    wall_start = time.perf_counter_ns()
+
+    def worker():
+        with vici.Session(args.vici) as session:
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    ike = pending.pop()
+                ramp.acquire()
+                try:
+                    start = time.perf_counter_ns()
+                    try:
+                        session.request(
+                            "initiate", {"ike": ike, "timeout": args.timeout}
+                        )
+                        return_code = 0
+                    except vici.ViciError:
+                        return_code = 1
+                    end = time.perf_counter_ns()
+                finally:
+                    ramp.release()
+                record = {
+                    "cell": cell,
+                    "ike": ike,
+                    "offset": (start - wall_start) / 1e9,
+                    "latency": (end - start) / 1e9,
+                    "return_code": return_code,
+                }
+                with lock:
+                    records.append(record)
+                stream.send(record)
+
+    threads = [
+        threading.Thread(target=worker)
+        for _ in range(min(args.concurrency, args.connections))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = (time.perf_counter_ns() - wall_start) / 1e9
+    # Every SA is still up, so the memory charon grew by is theirs
+    charon = None
+    if usage is not None:
+        cpu_ms, rss_kb = usage.difference(before, usage.sample())
+        established = sum(1 for r in records if r["return_code"] == 0)
+        if cpu_ms is not None and established:
+            charon = {
+                "cpu_ms": cpu_ms,
+                "rss_kb": rss_kb,
+                "cpu_ms_per_handshake": cpu_ms / established,
+                "rss_kb_per_sa": rss_kb / established,
+            }
+
+    with vici.Session(args.vici) as session:
+        for ike in connections:
+            try:
+                session.request(
+                    "terminate", {"ike": ike, "timeout": args.timeout}
+                )
+            except vici.ViciError:
+                pass
+
+    latencies = sorted(r["latency"] for r in records if r["return_code"] == 0)
+    return {
+        "cell": cell,
+        "connections": args.connections,
+        "concurrency": args.concurrency,
+        "ramp": args.ramp,
+        "established": len(latencies),
+        "failed": len(records) - len(latencies),
+        "duration": wall,
+        "handshakes_per_second": len(latencies) / wall if wall else 0.0,
+        "latency": {
+            f"p{q:g}": percentile(latencies, q) for q in (50, 90, 99, 99.9)
+        },
+        "charon": charon,
+        "records": sorted(records, key=lambda r: r["offset"]),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("certificate")
+    parser.add_argument("proposal")
+    parser.add_argument("constraint")
+    parser.add_argument("connections", type=int)
+    parser.add_argument("password", nargs="?")
+    parser.add_argument("--prefix", default="home")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--ramp", type=float, default=0.0)
+    parser.add_argument("--timeout", type=int, default=60000)
+    parser.add_argument("--vici", default=vici.DEFAULT_URI)
+    parser.add_argument("--no-sudo", action="store_true")
+    parser.add_argument("--output-dir", default="~/measurements")
+    parser.add_argument("--stream", help="HOST:PORT to stream records to")
+    parser.add_argument(
+        "--resources",
+        action="store_true",
+        help="Sample charon's CPU time and memory before and after the load",
+    )
+    return parser.parse_args(argv)
+
+
+def main(args):
+    cell = f"{args.certificate}_{args.proposal}_{args.constraint}"
+    stream = RecordStream(args.stream)
+    try:
+        summary = generate_load(args, cell, stream)
+    finally:
+        stream.close()
+
+    output_dir = os.path.expanduser(args.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, f"load_{cell}.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+
+    latency = {q: v * 1000 for q, v in summary["latency"].items() if v is not None}
+    print(
+        f"{cell}: {summary['established']}/{args.connections} SAs in "
+        f"{summary['duration']:.2f}s, {summary['handshakes_per_second']:.1f} "
+        "handshakes/s, "
+        + ", ".join(f"{q} {v:.1f}ms" for q, v in latency.items())
+    )
+    if summary["charon"]:
+        print(
+            f"charon: {summary['charon']['cpu_ms_per_handshake']:.2f} CPU ms per "
+            f"handshake, {summary['charon']['rss_kb_per_sa']:.1f} kB per SA"
+        )
+    return 0 if summary["established"] else 1
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.vici.startswith("unix://") and os.geteuid() != 0 and not args.no_sudo:
+        sys.exit(run_as_root(args, __file__))
+    sys.exit(main(args))
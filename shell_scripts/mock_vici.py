@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Mock charon VICI server for running the VICI benchmark mode without
+strongSwan. Every initiate takes --handshake-ms, raises an ike-updown event
+for registered clients and succeeds:
+
+    mock_vici.py /tmp/charon.vici --handshake-ms 15
+"""
+import argparse
+import os
+import socketserver
+import threading
+import time
+
+import vici_session as vici
+
+
+class MockCharon(socketserver.ThreadingUnixStreamServer):
+    """Unix socket server that answers a subset of the VICI commands"""
+
+    daemon_threads = True
+
+    def __init__(self, path, handshake_ms=15.0, fail_every=0):
+        """
+        :param path: The socket path
+        :param handshake_ms: The simulated duration of an initiate
+        :param fail_every: Fail every n-th initiate, 0 to never fail
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        self.path = path
+        self.handshake_ms = handshake_ms
+        self.fail_every = fail_every
+        self.initiated = 0
+        self.established = set()
+        self.lock = threading.Lock()
+        super().__init__(path, MockCharonHandler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class MockCharonHandler(socketserver.BaseRequestHandler):
+    def setup(self):
+        self.events = set()
+
+    def send(self, packet_type, name=None, message=None):
+        self.request.sendall(vici.encode_packet(packet_type, name, message))
+
+    def event(self, name, message):
+        if name in self.events:
+            self.send(vici.EVENT, name, message)
+
+    def initiate(self, message):
+        server = self.server
+        ike = message.get("ike", "")
+        time.sleep(server.handshake_ms / 1000)
+        with server.lock:
+            server.initiated += 1
+            failed = server.fail_every and server.initiated % server.fail_every == 0
+            if not failed:
+                server.established.add(ike)
+        if failed:
+            return {"success": "no", "errmsg": "establishing CHILD_SA failed"}
+        self.event("ike-updown", {"up": "yes", ike: {"state": "ESTABLISHED"}})
+        return {"success": "yes"}
+
+    def terminate(self, message):
+        server = self.server
+        ike = message.get("ike", "")
+        with server.lock:
+            if ike not in server.established:
+                return {"success": "no", "errmsg": "no matching SAs to terminate found"}
+            server.established.discard(ike)
+        self.event("ike-updown", {ike: {"state": "DELETING"}})
+        return {"success": "yes"}
+
+    def handle(self):
+        commands = {
+            "version": lambda message: {"daemon": "charon", "version": "mock"},
+            "initiate": self.initiate,
+            "terminate": self.terminate,
+        }
+        while True:
+            try:
+                packet_type, name, message = vici.read_packet(self.request)
+            except ConnectionError:
+                return
+            if packet_type == vici.CMD_REQUEST:
+                if name in commands:
+                    self.send(vici.CMD_RESPONSE, message=commands[name](message))
+                else:
+                    self.send(vici.CMD_UNKNOWN)
+            elif packet_type == vici.EVENT_REGISTER:
+                self.events.add(name)
+                self.send(vici.EVENT_CONFIRM)
+            elif packet_type == vici.EVENT_UNREGISTER:
+                self.events.discard(name)
+                self.send(vici.EVENT_CONFIRM)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", nargs="?", default="/tmp/charon.vici")
+    parser.add_argument("--handshake-ms", type=float, default=15.0)
+    parser.add_argument("--fail-every", type=int, default=0)
+    args = parser.parse_args()
+
+    with MockCharon(args.path, args.handshake_ms, args.fail_every) as server:
+        print(f"Mock charon listening on unix://{args.path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -1,58 +1,38 @@
 #!/bin/bash
 
-# Kill charon process
-sudo pkill -9 charon
-
 # Define valid signatures
 valid_signatures=("rsa" "ecdsa" "ed25519" "dilithium2" "dilithium3" "dilithium5" "falcon512" "falcon1024")
 
-# Create base certificates directory
+# Generate the missing or invalid certificates of every signature type in
+# parallel, valid ones are kept. A sized or chained family, e.g. rsa3072 or
+# falcon512-chain2, is generated when it is given. Needs python3 and
+# certificate_factory.py in the working directory.
 base_dir="certificates"
-mkdir -p $base_dir
-
-# Generate certificates for each signature type
-for signature in "${valid_signatures[@]}"; do
-    echo "Generating certificates for $signature"
-    cert_dir="$base_dir/$signature"
-    mkdir -p $cert_dir
-    cd $cert_dir
-
-    # Generate CA key and certificate
-    pki --gen --type $signature --outform pem > caKey.pem
-    pki --self --type priv --in caKey.pem --ca --lifetime 3652 \
-        --dn "C=CH, O=Cyber, CN=Cyber Root CA"                 \
-        --outform pem > caCert.pem
-
-    # Generate moon key and certificate
-    pki --gen --type $signature --outform pem > moonKey.pem
-    pki --issue --cacert caCert.pem --cakey caKey.pem  \
-        --type priv --in moonKey.pem --lifetime 1461   \
-        --dn "C=CH, O=Cyber, CN=moon.strongswan.org"   \
-        --san moon.strongswan.org --outform pem > moonCert.pem
-
-    # Generate carol key and certificate
-    pki --gen --type $signature --outform pem > carolKey.pem
-    pki --issue --cacert caCert.pem --cakey caKey.pem   \
-        --type priv --in carolKey.pem --lifetime 1461   \
-        --dn "C=CH, O=Cyber, CN=carol@strongswan.org"   \
-        --san carol@strongswan.org --outform pem > carolCert.pem
-
-    cd - > /dev/null
-done
+if [ $# -eq 1 ] && [[ ! " ${valid_signatures[@]} " =~ " $1 " ]]; then
+    python3 certificate_factory.py "$base_dir" --family "$1" || exit 1
+    valid_signatures+=("$1")
+else
+    python3 certificate_factory.py "$base_dir" || exit 1
+fi
 
 # Copy certs for the specified signature to SwanCtl directories
 copy_certs_to_swanctl() {
-    local sig=$1
-    sudo cp $base_dir/$sig/caCert.pem /etc/swanctl/x509ca/
-    sudo cp $base_dir/$sig/moonCert.pem /etc/swanctl/x509/
-    sudo cp $base_dir/$sig/moonKey.pem /etc/swanctl/pkcs8/
+    local sig="$1"
+    sudo cp "$base_dir/$sig/caCert.pem" /etc/swanctl/x509ca/
+    # The intermediate CAs of a chained family, if any
+    sudo find "$base_dir/$sig" -maxdepth 1 -name 'int*Cert.pem' -exec cp {} /etc/swanctl/x509ca/ \;
+    sudo cp "$base_dir/$sig/moonCert.pem" /etc/swanctl/x509/
+    sudo cp "$base_dir/$sig/moonKey.pem" /etc/swanctl/pkcs8/
 }
 
 # Check if a signature argument was provided
 if [ $# -eq 1 ]; then
-    signature=$1
+    signature="$1"
     if [[ " ${valid_signatures[@]} " =~ " $signature " ]]; then
-        copy_certs_to_swanctl $signature
+        # Restart charon with the new certificates
+        sudo pkill -9 charon
+        copy_certs_to_swanctl "$signature"
+        sudo /charon &
     else
         echo "Error: Invalid signature. Valid options are: ${valid_signatures[*]}"
         exit 1
@@ -62,5 +42,3 @@ else
     echo "To copy certificates for a specific signature to SwanCtl directories, run the script with a signature argument."
 fi
 
-# Start charon process in the background
-sudo /charon &
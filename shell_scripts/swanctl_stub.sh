@@ -0,0 +1,14 @@
+#!/bin/bash
+# Stand-in for swanctl so the benchmark agents can run on any Linux box.
+# Every call sleeps for SWANCTL_STUB_DELAY seconds (default 0.015) and
+# fails with SWANCTL_STUB_FAIL percent probability (default 0).
+
+delay=${SWANCTL_STUB_DELAY:-0.015}
+fail=${SWANCTL_STUB_FAIL:-0}
+
+sleep "$delay"
+if [ $((RANDOM % 100)) -lt "$fail" ]; then
+  echo "initiate failed" >&2
+  exit 1
+fi
+echo "$@ completed successfully"
@@ -0,0 +1,226 @@
+"""
+Minimal client for charon's VICI protocol, so handshakes can be driven over
+a persistent connection instead of spawning swanctl for every command.
+Only the standard library is needed, the guest does not have to have the
+strongSwan vici Python package installed.
+"""
+import socket
+import struct
+
+DEFAULT_URI = "unix:///var/run/charon.vici"
+
+# Packet types
+CMD_REQUEST = 0
+CMD_RESPONSE = 1
+CMD_UNKNOWN = 2
+EVENT_REGISTER = 3
+EVENT_UNREGISTER = 4
+EVENT_CONFIRM = 5
+EVENT_UNKNOWN = 6
+EVENT = 7
+
+NAMED_PACKETS = (CMD_REQUEST, EVENT_REGISTER, EVENT_UNREGISTER, EVENT)
+
+# Message element types
+SECTION_START = 1
+SECTION_END = 2
+KEY_VALUE = 3
+LIST_START = 4
+LIST_ITEM = 5
+LIST_END = 6
+
+
+class ViciError(Exception):
+    """Raised when charon rejects or does not know a request"""
+
+
+def _name(name):
+    name = name.encode("utf-8")
+    return struct.pack("!B", len(name)) + name
+
+
+def _value(value):
+    if isinstance(value, bool):
+        value = "yes" if value else "no"
+    if not isinstance(value, bytes):
+        value = str(value).encode("utf-8")
+    return struct.pack("!H", len(value)) + value
+
+
+def encode_message(message):
+    """
+    Encode a dictionary as a VICI message
+    :param message: Values may be strings, numbers, lists or nested dictionaries
+    :return: The encoded message
+    """
+    encoded = b""
+    for key, value in message.items():
+        if isinstance(value, dict):
+            encoded += bytes([SECTION_START]) + _name(key)
+            encoded += encode_message(value) + bytes([SECTION_END])
+        elif isinstance(value, (list, tuple)):
+            encoded += bytes([LIST_START]) + _name(key)
+            for item in value:
+                encoded += bytes([LIST_ITEM]) + _value(item)
+            encoded += bytes([LIST_END])
+        else:
+            encoded += bytes([KEY_VALUE]) + _name(key) + _value(value)
+    return encoded
+
+
+def decode_message(data):
+    """
+    Decode a VICI message into a dictionary of str, list and dict values
+    :param data: The encoded message
+    :return: The decoded message
+    """
+    root = {}
+    stack = [root]
+    current_list = None
+    pos = 0
+
+    def read_name():
+        nonlocal pos
+        length = data[pos]
+        name = data[pos + 1 : pos + 1 + length].decode("utf-8")
+        pos += 1 + length
+        return name
+
+    def read_value():
+        nonlocal pos
+        (length,) = struct.unpack_from("!H", data, pos)
+        value = data[pos + 2 : pos + 2 + length].decode("utf-8", "replace")
+        pos += 2 + length
+        return value
+
+    while pos < len(data):
+        element = data[pos]
+        pos += 1
+        if element == SECTION_START:
+            section = {}
+            stack[-1][read_name()] = section
+            stack.append(section)
+        elif element == SECTION_END:
+            stack.pop()
+        elif element == KEY_VALUE:
+            name = read_name()
+            stack[-1][name] = read_value()
+        elif element == LIST_START:
+            current_list = []
+            stack[-1][read_name()] = current_list
+        elif element == LIST_ITEM:
+            current_list.append(read_value())
+        elif element == LIST_END:
+            current_list = None
+        else:
+            raise ViciError(f"Invalid message element type {element}")
+    return root
+
+
+def encode_packet(packet_type, name=None, message=None):
+    payload = bytes([packet_type])
+    if packet_type in NAMED_PACKETS:
+        payload += _name(name)
+    if message:
+        payload += encode_message(message)
+    return struct.pack("!I", len(payload)) + payload
+
+
+def _recv_exactly(sock, length):
+    data = b""
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+        if not chunk:
+            raise ConnectionError("VICI connection closed")
+        data += chunk
+    return data
+
+
+def read_packet(sock):
+    """
+    Read one packet from a VICI socket
+    :return: The packet type, the name (or None) and the decoded message
+    """
+    (length,) = struct.unpack("!I", _recv_exactly(sock, 4))
+    payload = _recv_exactly(sock, length)
+    packet_type = payload[0]
+    pos = 1
+    name = None
+    if packet_type in NAMED_PACKETS:
+        name = payload[pos + 1 : pos + 1 + payload[pos]].decode("utf-8")
+        pos += 1 + payload[pos]
+    return packet_type, name, decode_message(payload[pos:])
+
+
+def connect(uri=DEFAULT_URI):
+    """
+    Open a socket to charon
+    :param uri: unix:///path/to/socket or tcp://host:port
+    """
+    if uri.startswith("unix://"):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(uri[len("unix://") :])
+    elif uri.startswith("tcp://"):
+        host, port = uri[len("tcp://") :].rsplit(":", 1)
+        sock = socket.create_connection((host, int(port)))
+    else:
+        raise ValueError(f"Unsupported VICI URI {uri}")
+    return sock
+
+
+class Session:
+    """A persistent VICI connection"""
+
+    def __init__(self, uri=DEFAULT_URI, sock=None):
+        self.sock = sock or connect(uri)
+        self.events = []
+        self.on_event = None
+
+    def _read_until(self, expected):
+        while True:
+            packet_type, name, message = read_packet(self.sock)
+            if packet_type == EVENT:
+                self.events.append((name, message))
+                if self.on_event is not None:
+                    self.on_event(name, message)
+                continue
+            if packet_type in expected:
+                return packet_type, message
+            raise ViciError(f"Unexpected VICI packet type {packet_type}")
+
+    def request(self, command, message=None):
+        """
+        Send a command and wait for its response. Events received meanwhile
+        are appended to self.events and passed to self.on_event.
+        :param command: The command, e.g. initiate
+        :param message: The command arguments
+        :return: The response message
+        """
+        self.sock.sendall(encode_packet(CMD_REQUEST, command, message))
+        packet_type, response = self._read_until((CMD_RESPONSE, CMD_UNKNOWN))
+        if packet_type == CMD_UNKNOWN:
+            raise ViciError(f"Unknown VICI command {command}")
+        if response.get("success") == "no":
+            raise ViciError(response.get("errmsg", f"{command} failed"))
+        return response
+
+    def register(self, event):
+        """Register for an event, e.g. ike-updown"""
+        self.sock.sendall(encode_packet(EVENT_REGISTER, event))
+        packet_type, _ = self._read_until((EVENT_CONFIRM, EVENT_UNKNOWN))
+        if packet_type == EVENT_UNKNOWN:
+            raise ViciError(f"Unknown VICI event {event}")
+
+    def unregister(self, event):
+        """Unregister from an event"""
+        self.sock.sendall(encode_packet(EVENT_UNREGISTER, event))
+        self._read_until((EVENT_CONFIRM, EVENT_UNKNOWN))
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,236 @@
+"""
+Significance of the latency differences between configurations.
+
+Cells are compared along one axis, e.g. every proposal against x25519 with
+the certificate and mode fixed. Each cell is bootstrapped once and the
+differences of all compared pairs are taken from the resampled means at
+once, or their labels are permuted in batches (method="permutation"):
+
+    python significance.py data/ --axis proposal --baseline x25519 \\
+        --where mode=100ping05pl
+
+The effect size table lists the mean difference with its confidence
+interval, the ratio of the means, Hedges' g and Holm adjusted p-values.
+"""
+import argparse
+import collections
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+
+from latency_stats import BOOTSTRAP_BATCH, KEY, bootstrap_means, padded, select
+from results_store import load_results
+
+METHODS = ("bootstrap", "permutation")
+
+
+def comparisons(keys, axis, baseline=None):
+    """
+    The pairs of cells that differ only in axis
+    :param baseline: Compare every cell against this value of axis only,
+        otherwise every pair is compared
+    :return: An array of (index, index) rows into keys, the second cell is
+        the baseline of the comparison
+    """
+    position = KEY.index(axis)
+    groups = collections.defaultdict(list)
+    for i, key in enumerate(keys):
+        groups[key[:position] + key[position + 1 :]].append(i)
+    pairs = []
+    for members in groups.values():
+        if baseline is None:
+            pairs += [(b, a) for a, b in itertools.combinations(members, 2)]
+            continue
+        for base in (i for i in members if keys[i][position] == baseline):
+            pairs += [(i, base) for i in members if i != base]
+    return np.array(pairs, dtype=np.int64).reshape(-1, 2)
+
+
+def holm(p_values):
+    """Holm-Bonferroni adjusted p-values"""
+    p_values = np.asarray(p_values, dtype=np.float64)
+    order = np.argsort(p_values)
+    scaled = (len(p_values) - np.arange(len(p_values))) * p_values[order]
+    adjusted = np.empty_like(p_values)
+    adjusted[order] = np.minimum(np.maximum.accumulate(scaled), 1)
+    return adjusted
+
+
+def bootstrap_differences(matrix, counts, pairs, resamples=2000, rng=None):
+    """
+    Resampled differences of the means of every pair
+    :return: A (pairs x resamples) matrix
+    """
+    cells = np.unique(pairs)
+    means = np.empty((len(counts), resamples))
+    means[cells] = bootstrap_means(matrix[cells], counts[cells], resamples, rng)
+    return means[pairs[:, 0]] - means[pairs[:, 1]]
+
+
+def permutation_p_values(
+    matrix, counts, pairs, resamples=2000, rng=None, batch=BOOTSTRAP_BATCH
+):
+    """
+    Two-sided permutation test of the difference of means of every pair.
+    Each resample shuffles the pooled latencies of a pair and splits them
+    into groups of the original sizes.
+    """
+    rng = np.random.default_rng(rng)
+    a, b = pairs[:, 0], pairs[:, 1]
+    n_a, n_b = counts[a], counts[b]
+    pooled = np.concatenate([matrix[a], matrix[b]], axis=1)
+    padding = np.isnan(pooled)
+    pooled = np.nan_to_num(pooled)
+    totals = pooled.sum(axis=1)
+    totals_a = pooled[:, : matrix.shape[1]].sum(axis=1)
+    observed = np.abs(totals_a / n_a - (totals - totals_a) / n_b)
+
+    width = pooled.shape[1]
+    first = int(n_a.max(initial=0))
+    extreme = np.zeros(len(pairs))
+    step = max(1, batch // max(1, resamples * width))
+    for start in range(0, len(pairs), step):
+        part = slice(start, start + step)
+        # Padding sorts last, so the first n_a of a shuffle are real values
+        shuffle = rng.random((len(pooled[part]), resamples, width))
+        shuffle[np.broadcast_to(padding[part][:, None, :], shuffle.shape)] = np.inf
+        drawn = np.argsort(shuffle, axis=2)[:, :, :first]
+        values = np.take_along_axis(pooled[part][:, None, :], drawn, axis=2)
+        mask = np.arange(first)[None, None, :] < n_a[part][:, None, None]
+        sums_a = (values * mask).sum(axis=2)
+        differences = np.abs(
+            sums_a / n_a[part][:, None]
+            - (totals[part][:, None] - sums_a) / n_b[part][:, None]
+        )
+        extreme[part] = (differences >= observed[part][:, None] - 1e-12).sum(axis=1)
+    return (extreme + 1) / (resamples + 1)
+
+
+def compare(
+    frame,
+    axis="proposal",
+    baseline=None,
+    method="bootstrap",
+    resamples=2000,
+    confidence=0.95,
+    alpha=0.05,
+    seed=0,
+):
+    """
+    Compare the cells of a results table that differ only in axis
+    :param baseline: The value of axis the others are compared against,
+        every pair is compared if None
+    :param method: bootstrap or permutation, how p-values are computed. The
+        confidence interval of the difference is always bootstrapped.
+    :return: The effect size table, one row per comparison, with the
+        latencies in seconds
+    """
+    if method not in METHODS:
+        raise ValueError(f"method has to be one of {', '.join(METHODS)}")
+    keys, matrix, counts = padded(frame)
+    pairs = comparisons(keys, axis, baseline)
+    if not len(pairs):
+        return pd.DataFrame()
+    rng = np.random.default_rng(seed)
+
+    means = np.nanmean(matrix, axis=1)
+    # A single sample has no spread
+    variances = np.zeros(len(counts))
+    several = counts > 1
+    variances[several] = np.nanvar(matrix[several], axis=1, ddof=1)
+    a, b = pairs[:, 0], pairs[:, 1]
+    n_a, n_b = counts[a], counts[b]
+    difference = means[a] - means[b]
+    hedges_g = np.full(len(pairs), np.nan)
+    spread = (n_a - 1) * variances[a] + (n_b - 1) * variances[b]
+    valid = (n_a + n_b > 2) & (spread > 0)
+    pooled_sd = np.sqrt(spread[valid] / (n_a + n_b - 2)[valid])
+    correction = 1 - 3 / (4 * (n_a + n_b)[valid] - 9)
+    hedges_g[valid] = correction * difference[valid] / pooled_sd
+
+    resampled = bootstrap_differences(matrix, counts, pairs, resamples, rng)
+    tail = (1 - confidence) / 2
+    ci_low, ci_high = np.percentile(resampled, [100 * tail, 100 * (1 - tail)], axis=1)
+    if method == "bootstrap":
+        # Like the permutation test, never 0 for a finite number of resamples
+        below = (resampled <= 0).sum(axis=1)
+        above = (resampled >= 0).sum(axis=1)
+        extreme = np.minimum(below, above)
+        p_values = np.minimum(1, 2 * (extreme + 1) / (resamples + 1))
+    else:
+        p_values = permutation_p_values(matrix, counts, pairs, resamples, rng)
+    adjusted = holm(p_values)
+
+    position = KEY.index(axis)
+    fixed = [column for column in KEY if column != axis]
+    table = {
+        column: [keys[i][KEY.index(column)] for i in a] for column in fixed
+    }
+    table.update(
+        {
+            axis: [keys[i][position] for i in a],
+            "baseline": [keys[i][position] for i in b],
+            "n": n_a,
+            "n_baseline": n_b,
+            "mean": means[a],
+            "mean_baseline": means[b],
+            "difference": difference,
+            "ci_low": ci_low,
+            "ci_high": ci_high,
+            "ratio": means[a] / means[b],
+            "hedges_g": hedges_g,
+            "p_value": p_values,
+            "p_adjusted": adjusted,
+            "significant": adjusted < alpha,
+        }
+    )
+    return pd.DataFrame(table)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare configurations")
+    parser.add_argument("data_dir", nargs="?", default=os.getenv("HOST_DATA_PATH"))
+    parser.add_argument("--axis", choices=KEY, default="proposal")
+    parser.add_argument("--baseline", help="Compare against this value of axis")
+    parser.add_argument(
+        "--where", action="append", default=[], help="column=value, e.g. mode=100ping"
+    )
+    parser.add_argument("--method", choices=METHODS, default="bootstrap")
+    parser.add_argument("--resamples", type=int, default=2000)
+    parser.add_argument("--csv", help="Write the effect size table here")
+    args = parser.parse_args(argv)
+    if not args.data_dir:
+        parser.error("data_dir or HOST_DATA_PATH is required")
+
+    try:
+        frame = select(
+            load_results(args.data_dir),
+            **dict(condition.split("=", 1) for condition in args.where),
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    table = compare(
+        frame, args.axis, args.baseline, args.method, args.resamples
+    )
+    if table.empty:
+        print("Nothing to compare")
+        return 1
+    if args.csv:
+        table.to_csv(args.csv, index=False)
+    shown = table.assign(
+        **{
+            column: table[column] * 1000
+            for column in ("mean", "mean_baseline", "difference", "ci_low", "ci_high")
+        }
+    )
+    with pd.option_context(
+        "display.max_rows", None, "display.max_columns", None, "display.width", 250
+    ):
+        print(shown.to_string(index=False, float_format="{:.4g}".format))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
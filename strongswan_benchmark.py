@@ -1,34 +1,45 @@
 import os
-import time
+import sys
+import json
 import shutil
-from vmware_fusion_py import VMware
-from strongswan_manager import StrongSwan
+import asyncio
+from vmware_fusion_py import (
+    AsyncVMware,
+    GuestSessionBackend,
+    UploadCache,
+    ssh_session_command,
+)
+from benchmark_runner import (
+    BenchmarkRunner,
+    SnapshotIsolation,
+    VMPair,
+    clone_pairs,
+    link_netns_pair,
+    netns_pairs,
+)
+from certificate_factory import signature_algorithm
+from data_index import kem_chain
+from experiment import Cell, load as load_experiment
+from matrix_scheduler import MatrixScheduler, check_pair_names
+from netem import NetworkShaper
+from run_manifest import RunManifest
+from result_stream import ResultStreamServer
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-certificates = [
-    # "ecdsa",
-    # "ed25519",
-    # "rsa",
-    # "falcon512",
-    # "falcon1024",
-    "dilithium2",
-    # "dilithium3",
-    # "dilithium5",
-]
-base_proposal = "aes256-sha256"
-kem_proposals = [
-    "x25519",
-    "ke1_kyber1-x25519",
-    "ke1_kyber3-x25519",
-    "ke1_kyber5-x25519",
-    "ke1_kyber3-ke2_bike3-ke3_hqc3-x25519",
-]
-mode = "200ping0pl"
-log_names = []
-iterations = str(500)
+# Certificate families, proposals, modes and iterations, see experiments/.
+# The spec is the first argument, $EXPERIMENT or experiments/default.toml
+experiment = load_experiment(sys.argv[1] if len(sys.argv) > 1 else None)
+# Concurrent road warriors per cell for throughput runs, 0 for latency runs
+load_connections = int(os.getenv("LOAD_CONNECTIONS") or 0)
+# Extra VM pairs to clone from the first one, see clone_pairs
+clone_count = int(os.getenv("CLONE_PAIRS") or 0)
+# Completed cells are skipped and interrupted ones resumed on re-runs
+manifest = None
+if os.getenv("RUN_MANIFEST"):
+    manifest = RunManifest(os.getenv("RUN_MANIFEST"))
 
 carol_conf_path = os.getenv("CAROL_CONF_PATH")
 moon_conf_path = os.getenv("MOON_CONF_PATH")
@@ -38,114 +49,220 @@ if not carol_conf_path or not moon_conf_path or not certificates_path:
     print("Please provideCAROL_CONF_PATH, MOON_CONF_PATH and CERTIFICATES_PATH!")
     exit(1)
 
+# Pairs of network namespaces on this host to use instead of VMs
+netns_pair_count = int(os.getenv("NETNS_PAIRS") or 0)
+
 # Initialize vmware class
 vmrun_path = shutil.which("vmrun")
-if not vmrun_path:
+if not vmrun_path and not netns_pair_count:
     print(
         f"Could not find vmrun. Install vmrun from {"".format('', "https://www.vmware.com/products/desktop-hypervisor.html", "VMware")}"
     )
     exit()
 
-carol = VMware(
-    vmrun_path=vmrun_path,
-    vm_path=os.getenv("CAROL_VM_PATH") or "",
-)
-
-carol.set_guest_user(os.getenv("CAROL_USER"))
-carol.set_guest_password(os.getenv("CAROL_PASSWORD"))
+# Skip uploads of files the guests already hold
+upload_cache = UploadCache()
 
-moon = VMware(
-    vmrun_path=vmrun_path,
-    vm_path=os.getenv("MOON_VM_PATH") or "",
-)
 
-moon.set_guest_user(os.getenv("MOON_USER"))
-moon.set_guest_password(os.getenv("MOON_PASSWORD"))
+def make_vm(spec, prefix):
+    # spec holds the VM's settings, falling back to the <prefix>_* variables
+    def setting(key):
+        return spec.get(key.lower()) or os.getenv(f"{prefix}_{key}")
 
-# Start the VMs
-carol.start()
-moon.start()
+    vm = AsyncVMware(
+        vmrun_path=vmrun_path,
+        upload_cache=upload_cache,
+        vm_path=setting("VM_PATH") or "",
+    )
+    vm.set_guest_user(setting("USER"))
+    vm.set_guest_password(setting("PASSWORD"))
 
-# Initialize StrongSwan class
-strongswan = StrongSwan(carol_conf_path, moon_conf_path)
+    # Reuse logged in guest shells over ssh when the guest is reachable
+    if setting("SSH_HOST"):
+        vm.set_backend(
+            GuestSessionBackend(
+                ssh_session_command(
+                    setting("SSH_HOST"),
+                    setting("USER"),
+                    identity_file=setting("SSH_KEY"),
+                )
+            )
+        )
+    return vm
 
-for certificate in certificates:
-    print(f"Updating certificates to {certificate}")
-    certificate_path = certificates_path + "/" + certificate + "/"
 
-    print(
-        carol.copy_file_from_host_to_guest(
-            host_path=certificate_path + "carolCert.pem",
-            guest_path="/etc/swanctl/x509/carolCert.pem",
+def load_pairs():
+    """
+    The VM pairs listed in VM_PAIRS_FILE, a JSON list of
+    {"name", "carol": {...}, "moon": {...}, "moon_address"} objects whose
+    carol/moon entries may set vm_path, user, password, ssh_host and ssh_key.
+    Without it, the single pair described by the CAROL_*/MOON_* variables.
+    """
+    specs = [{"name": "pair0"}]
+    if os.getenv("VM_PAIRS_FILE"):
+        with open(os.getenv("VM_PAIRS_FILE")) as f:
+            specs = json.load(f)
+    return [
+        VMPair(
+            spec.get("name") or f"pair{i}",
+            make_vm(spec.get("carol", {}), "CAROL"),
+            make_vm(spec.get("moon", {}), "MOON"),
+            carol_conf_path,
+            moon_conf_path,
+            moon_address=spec.get("moon_address"),
         )
-    )
-    print(
-        carol.copy_file_from_host_to_guest(
-            host_path=certificate_path + "carolKey.pem",
-            guest_path="/etc/swanctl/pkcs8/carolKey.pem",
-        )
-    )
-    print(
-        carol.copy_file_from_host_to_guest(
-            host_path=certificate_path + "caCert.pem",
-            guest_path="/etc/swanctl/x509ca/caCert.pem",
-        )
-    )
-    print(
-        moon.copy_file_from_host_to_guest(
-            host_path=certificate_path + "moonCert.pem",
-            guest_path="/etc/swanctl/x509/moonCert.pem",
+        for i, spec in enumerate(specs)
+    ]
+
+
+def stream_arguments():
+    # The in-guest scripts stream their records to the host when asked to
+    if stream_server is None:
+        return []
+    return ["--stream", f"{os.getenv('RESULT_STREAM_HOST')}:{stream_port}"]
+
+
+def agent_arguments():
+    # Options understood by shell_scripts/benchmark_agent.py
+    arguments = stream_arguments()
+    if os.getenv("HANDSHAKE_DRIVER") == "vici":
+        arguments.append("--vici")
+    return arguments
+
+
+async def main():
+    if netns_pair_count:
+        pairs = netns_pairs(
+            netns_pair_count, carol_conf_path, moon_conf_path, upload_cache
         )
-    )
-    print(
-        moon.copy_file_from_host_to_guest(
-            host_path=certificate_path + "moonKey.pem",
-            guest_path="/etc/swanctl/pkcs8/moonKey.pem",
+        await asyncio.gather(*(link_netns_pair(pair) for pair in pairs))
+    else:
+        pairs = load_pairs()
+        # Linked clones of the first pair, e.g. to use a second host's cores
+        clones = []
+        if clone_count:
+            clones = await clone_pairs(
+                pairs[0],
+                clone_count,
+                os.getenv("CLONE_PATH"),
+                snapshot=os.getenv("CLONE_SNAPSHOT"),
+            )
+            pairs += clones
+        try:
+            check_pair_names(pairs)
+        except ValueError as e:
+            raise SystemExit(str(e))
+
+        # Start the VMs
+        await asyncio.gather(*(pair.start() for pair in pairs))
+        await asyncio.gather(*(pair.discover_moon_address() for pair in clones))
+
+    # Revert the pairs to a warm per-family snapshot before every cell
+    isolation = None
+    if os.getenv("ISOLATION") == "snapshot":
+        isolation = SnapshotIsolation(
+            prefix=os.getenv("SNAPSHOT_PREFIX") or "warm",
+            baseline=os.getenv("BASELINE_SNAPSHOT"),
         )
-    )
-    print(
-        moon.copy_file_from_host_to_guest(
-            host_path=certificate_path + "caCert.pem",
-            guest_path="/etc/swanctl/x509ca/caCert.pem",
+
+    # Shape the link of every pair with tc netem for each cell's mode
+    network = None
+    if os.getenv("NETEM"):
+        network = NetworkShaper(
+            experiment,
+            interface=os.getenv("NETEM_INTERFACE"),
+            probe_count=int(os.getenv("NETEM_PROBE_COUNT") or 20),
         )
+
+    # Cells measured on every pair, as certificate:proposal:mode
+    replicated = []
+    if os.getenv("REPLICATE_CELLS") and len(pairs) > 1:
+        replicated = [
+            Cell(*cell.split(":")) for cell in os.getenv("REPLICATE_CELLS").split(",")
+        ]
+
+    runner = BenchmarkRunner(
+        certificates_path,
+        scripts={
+            "carol_reload": os.getenv("CAROL_RELOAD_SCRIPT"),
+            "moon_reload": os.getenv("MOON_RELOAD_SCRIPT"),
+            "carol_benchmark": os.getenv("CAROL_BENCHMARK_SCRIPT"),
+            "carol_load": os.getenv("CAROL_LOAD_SCRIPT"),
+            "charon_usage": os.getenv("CHARON_USAGE_SCRIPT"),
+            "crypto_bench": os.getenv("CRYPTO_BENCH_SCRIPT"),
+        },
+        base_proposal=experiment.base_proposal,
+        iterations=experiment.iterations,
+        mode_iterations=experiment.mode_iterations(),
+        agent_arguments=agent_arguments(),
+        load_arguments=[
+            "--concurrency",
+            os.getenv("LOAD_CONCURRENCY") or "16",
+            "--ramp",
+            os.getenv("LOAD_RAMP") or "0",
+            *stream_arguments(),
+        ],
+        load_connections=load_connections,
+        guest_measurements_path=os.getenv("GUEST_MEASUREMENTS_PATH"),
+        host_data_path=os.getenv("HOST_DATA_PATH"),
+        tag_results=len(pairs) > 1,
+        manifest=manifest,
+        replicated=replicated,
+        isolation=isolation,
+        network=network,
+        # Record each cell's IKE traffic on carol for pcap_analyzer.py
+        capture=(os.getenv("CAPTURE_INTERFACE") or "any")
+        if os.getenv("CAPTURE")
+        else None,
+        # Sample charon's CPU time and memory, see resource_usage.py
+        resources=bool(os.getenv("RESOURCES")),
     )
-    print(f"Updated certificates to {certificate}")
-
-    for proposal in kem_proposals:
-        print(f"Updating proposals to {base_proposal}-{proposal}")
-        proposals = f"{base_proposal}-{proposal}"
-        strongswan.update_proposals(proposals)
-        carol.copy_file_from_host_to_guest(
-            host_path=carol_conf_path, guest_path="/etc/swanctl/swanctl.conf"
-        )
-        moon.copy_file_from_host_to_guest(
-            host_path=moon_conf_path, guest_path="/etc/swanctl/swanctl.conf"
-        )
-        print(f"Updated proposals")
-        carol.run_program_in_guest(
-            os.getenv("CAROL_RELOAD_SCRIPT"),
-            program_arguments=[os.getenv("CAROL_PASSWORD")],
-        )
-        moon.run_program_in_guest(
-            os.getenv("MOON_RELOAD_SCRIPT"),
-            program_arguments=[
-                os.getenv("MOON_PASSWORD")
-            ],  # Fixed: now uses MOON_PASSWORD
-        )
-        carol.run_program_in_guest(
-            os.getenv("CAROL_BENCHMARK_SCRIPT"),
-            program_arguments=[
-                certificate,
-                proposal,
-                mode,
-                iterations,
-                os.getenv("CAROL_PASSWORD"),
-            ],
+    # Time the primitives of the queued cells once, see handshake_budget.py
+    if os.getenv("CRYPTO_BENCH_SCRIPT"):
+        algorithms = list(
+            dict.fromkeys(map(signature_algorithm, experiment.run_certificates))
         )
-        log_names.append(f"{certificate}_{proposal}_{mode}")
-        print(
-            f"Completed benchmark for {certificate}-{proposal}-{mode} with {iterations} connections."
+        for proposal in experiment.run_proposals:
+            algorithms += [kem for kem in kem_chain(proposal) if kem not in algorithms]
+        await runner.crypto_benchmark(
+            pairs[0], algorithms, int(os.getenv("CRYPTO_BENCH_ITERATIONS") or 100)
         )
 
-print(log_names)
-print("Complete")
+    scheduler = MatrixScheduler(pairs, runner.run_cell)
+    cells = experiment.cells()
+    if manifest is not None:
+        # Interrupted cells continue on the pair holding their first iterations
+        names = {pair.name for pair in pairs}
+        for cell in [
+            cell
+            for cell in cells
+            if cell not in replicated and not manifest.is_complete(cell.name)
+        ]:
+            entry = manifest.entry(cell.name)
+            if entry["iterations"] and entry.get("pair") in names:
+                scheduler.pin(entry["pair"], [cell])
+                cells.remove(cell)
+    if replicated:
+        scheduler.replicate(replicated)
+    results = await scheduler.run(cells)
+
+    for entry in results:
+        print(f"{entry['pair']}: {entry['cell'].name}: {entry['error'] or 'ok'}")
+    if manifest is not None:
+        print(manifest.summary())
+    print("Complete")
+
+
+# Show live progress of benchmark_agent.py runs
+stream_server = None
+if os.getenv("RESULT_STREAM_HOST"):
+    stream_port = int(os.getenv("RESULT_STREAM_PORT") or 5555)
+    stream_server = ResultStreamServer(
+        port=stream_port,
+        on_record=manifest.record_progress if manifest is not None else None,
+    ).start()
+
+asyncio.run(main())
+
+if stream_server is not None:
+    stream_server.stop()
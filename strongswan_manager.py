@@ -1,3 +1,28 @@
+import ipaddress
+import re
+
+
+def _find_block(lines, name):
+    # First and last line of the `name {` block
+    for start, line in enumerate(lines):
+        if line.strip() == f"{name} {{":
+            depth = 0
+            for end in range(start, len(lines)):
+                depth += lines[end].count("{") - lines[end].count("}")
+                if depth == 0:
+                    return start, end
+    raise ValueError(f"No {name} block found")
+
+
+def _pool_for(addrs, count):
+    # Grow the pool's subnet until it holds count virtual IPs
+    network = ipaddress.ip_network(addrs, strict=False)
+    prefix = network.prefixlen
+    while prefix > 0 and 2 ** (network.max_prefixlen - prefix) - 2 < count:
+        prefix -= 1
+    return str(network.supernet(new_prefix=prefix))
+
+
 class StrongSwan:
     def __init__(self, carol_conf_path, moon_conf_path):
         self.carol_conf_path = carol_conf_path
@@ -18,3 +43,52 @@ class StrongSwan:
     def update_proposals(self, proposals):
         self._update_proposal(self.carol_conf_path, proposals)
         self._update_proposal(self.moon_conf_path, proposals)
+
+    def write_load_configs(
+        self, carol_out, moon_out, count, connection="home", identities=None
+    ):
+        """
+        Write configs for `count` concurrent road warriors on carol, named
+        <connection>0 ... <connection><count - 1>. Each copy uses the
+        matching (id, certificate file) from identities, or carol's own
+        identity if none are given, in which case moon keeps every SA of
+        that identity instead of replacing them.
+        """
+        with open(self.carol_conf_path, "r") as f:
+            lines = f.readlines()
+        start, end = _find_block(lines, connection)
+        block = lines[start : end + 1]
+
+        copies = []
+        for i in range(count):
+            copies.append(block[0].replace(f"{connection} {{", f"{connection}{i} {{"))
+            in_local = False
+            for line in block[1:]:
+                stripped = line.strip()
+                if stripped == "local {":
+                    in_local = True
+                elif stripped == "}":
+                    in_local = False
+                elif in_local and identities and stripped.startswith("id ="):
+                    line = re.sub(r"id = .*", f"id = {identities[i][0]}", line)
+                elif in_local and identities and stripped.startswith("certs ="):
+                    line = re.sub(r"certs = .*", f"certs = {identities[i][1]}", line)
+                copies.append(line)
+
+        with open(carol_out, "w") as f:
+            f.writelines(lines[:start] + copies + lines[end + 1 :])
+
+        with open(self.moon_conf_path, "r") as f:
+            lines = f.readlines()
+
+        for i, line in enumerate(lines):
+            stripped = line.strip()
+            if stripped.startswith("addrs ="):
+                addrs = stripped.split("=", 1)[1].strip()
+                lines[i] = line.replace(addrs, _pool_for(addrs, count))
+            elif stripped.startswith("pools =") and not identities:
+                indent = line[: len(line) - len(line.lstrip())]
+                lines[i] = line + f"{indent}unique = never\n"
+
+        with open(moon_out, "w") as f:
+            f.writelines(lines)
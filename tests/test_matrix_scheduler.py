@@ -0,0 +1,112 @@
+"""
+MatrixScheduler over VM pairs whose vmrun is the fake one of
+vmware_fusion_py.benchmark, so no VMware is needed:
+
+    python -m pytest tests/
+"""
+import asyncio
+import collections
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmark_runner import VMPair, clone_pairs
+from experiment import Cell
+from matrix_scheduler import MatrixScheduler, check_pair_names
+from vmware_fusion_py import AsyncVMware
+from vmware_fusion_py.benchmark import write_fake_vmrun
+
+CONFIGS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "configs")
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.vmrun = write_fake_vmrun(self.directory)
+        self.confs = []
+        for name in ("carol_swanctl.conf", "moon_swanctl.conf"):
+            path = os.path.join(self.directory, name)
+            shutil.copyfile(os.path.join(CONFIGS, name), path)
+            self.confs.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def pair(self, name):
+        carol, moon = (
+            AsyncVMware(
+                self.vmrun, vm_path=os.path.join(self.directory, f"{role}_{name}.vmx")
+            )
+            for role in ("carol", "moon")
+        )
+        return VMPair(name, carol, moon, *self.confs)
+
+    def run_matrix(self, pairs, cells, replicated=()):
+        ran = []
+
+        async def run_cell(pair, cell):
+            ran.append((pair.name, cell))
+            await asyncio.sleep(0)
+
+        scheduler = MatrixScheduler(pairs, run_cell)
+        if replicated:
+            scheduler.replicate(replicated)
+        asyncio.run(scheduler.run(cells))
+        return ran
+
+    def test_clones_do_not_reuse_pair_names(self):
+        pairs = [self.pair("pair0"), self.pair("pair1")]
+        clones = asyncio.run(
+            clone_pairs(pairs[0], 2, os.path.join(self.directory, "clones"))
+        )
+        names = [pair.name for pair in pairs + clones]
+        self.assertEqual(len(set(names)), len(names))
+        check_pair_names(pairs + clones)
+
+    def test_duplicate_names_are_rejected(self):
+        with self.assertRaises(ValueError):
+            MatrixScheduler([self.pair("pair1"), self.pair("pair1")], None)
+
+    def test_every_cell_runs_once(self):
+        pairs = [self.pair(f"pair{i}") for i in range(3)]
+        cells = [
+            Cell(certificate, proposal, "unlimited")
+            for certificate in ("rsa", "dilithium2", "falcon512")
+            for proposal in ("x25519", "ke1_kyber3-x25519")
+        ]
+        ran = self.run_matrix(pairs, cells)
+        self.assertEqual(sorted(cell for _, cell in ran), sorted(cells))
+
+    def test_replicated_cells_run_once_per_pair(self):
+        pairs = [self.pair(f"pair{i}") for i in range(3)]
+        cells = [
+            Cell(certificate, "x25519", mode)
+            for certificate in ("rsa", "dilithium2")
+            for mode in ("unlimited", "100ping")
+        ]
+        replicated = [cells[0]]
+        ran = self.run_matrix(pairs, cells, replicated)
+        runs = collections.Counter(ran)
+        for pair in pairs:
+            self.assertEqual(runs[(pair.name, cells[0])], 1)
+        for cell in cells[1:]:
+            self.assertEqual(sum(runs[(pair.name, cell)] for pair in pairs), 1)
+
+    def test_resumed_cell_is_not_run_twice_when_replicated(self):
+        pairs = [self.pair(f"pair{i}") for i in range(2)]
+        cell = Cell("rsa", "x25519", "unlimited")
+        ran = []
+
+        async def run_cell(pair, cell):
+            ran.append((pair.name, cell))
+
+        scheduler = MatrixScheduler(pairs, run_cell)
+        scheduler.pin("pair1", [cell])
+        scheduler.replicate([cell])
+        asyncio.run(scheduler.run([cell]))
+        self.assertEqual(sorted(ran), [("pair0", cell), ("pair1", cell)])
+
+
+if __name__ == "__main__":
+    unittest.main()
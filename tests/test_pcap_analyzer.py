@@ -0,0 +1,95 @@
+"""
+pcap_analyzer's matching of captured handshakes to iterations, on
+synthetic captures of raw IPv4 IKE packets
+"""
+import contextlib
+import io
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from pcap_analyzer import IKE_AUTH, IKE_SA_INIT, ingest_captures
+
+CELL = "rsa_x25519_05pl"
+
+
+def ike_packet(spi, exchange, response):
+    ike = struct.pack(
+        "!8s8sBBBBII", spi, bytes(8), 33, 0x20, exchange, 0x20 * response, 0, 28
+    )
+    udp = struct.pack("!HHHH", 500, 500, 8 + len(ike), 0) + ike
+    return bytes([0x45, 0, 0, 0, 0, 0, 0, 0, 64, 17]) + bytes(10) + udp
+
+
+def write_capture(path, handshakes):
+    """A capture with an IKE_SA_INIT request and IKE_AUTH response per start"""
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 101))
+        for number, start in enumerate(handshakes):
+            spi = struct.pack("!Q", number + 1)
+            for offset, exchange, response in (
+                (0, IKE_SA_INIT, False),
+                (0.05, IKE_AUTH, True),
+            ):
+                packet = ike_packet(spi, exchange, response)
+                seconds, fraction = divmod(round((start + offset) * 1e6), 10**6)
+                length = len(packet)
+                f.write(struct.pack("<IIII", seconds, fraction, length, length))
+                f.write(packet)
+
+
+class CaptureTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, f"{CELL}.txt"), "w") as f:
+            f.write("0.1\n0.1\n0.1\n0.1\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def ingest(self):
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            captures = ingest_captures(self.directory)
+        return captures, stderr.getvalue()
+
+    def test_handshakes_are_matched_by_time(self):
+        # Iteration 1 has a second handshake, iteration 2 none
+        write_capture(
+            os.path.join(self.directory, f"{CELL}.pcap"), [10.01, 11.01, 11.5, 13.01]
+        )
+        with open(os.path.join(self.directory, f"{CELL}.times"), "w") as f:
+            f.write("10.0\n11.0\n12.0\n13.0\n")
+        captures, _ = self.ingest()
+        self.assertEqual(list(captures["iteration"]), [0, 1, 3])
+        self.assertEqual(
+            [round(start, 2) for start in captures["start"]], [10.01, 11.01, 13.01]
+        )
+
+    def test_resumed_captures_end_where_the_next_starts(self):
+        write_capture(
+            os.path.join(self.directory, f"{CELL}.pcap"), [10.01, 11.01, 12.01]
+        )
+        with open(os.path.join(self.directory, f"{CELL}.times"), "w") as f:
+            f.write("10.0\n11.0\n12.0\n")
+        write_capture(os.path.join(self.directory, f"{CELL}.2.pcap"), [20.01, 21.01])
+        with open(os.path.join(self.directory, f"{CELL}.2.times"), "w") as f:
+            f.write("20.0\n21.0\n")
+        captures, _ = self.ingest()
+        self.assertEqual(list(captures["iteration"]), [0, 1, 2, 3])
+        self.assertEqual(
+            [round(start, 2) for start in captures["start"]],
+            [10.01, 11.01, 20.01, 21.01],
+        )
+
+    def test_capture_without_times_needs_one_handshake_per_iteration(self):
+        write_capture(os.path.join(self.directory, f"{CELL}.pcap"), [10.01, 11.01])
+        captures, warning = self.ingest()
+        self.assertTrue(captures.empty)
+        self.assertIn("2 handshakes for 4 iterations", warning)
+
+
+if __name__ == "__main__":
+    unittest.main()
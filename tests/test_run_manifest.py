@@ -0,0 +1,98 @@
+"""
+RunManifest bookkeeping of BenchmarkRunner.run_cell for cells run on one
+and on every pair
+"""
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmark_runner import BenchmarkRunner
+from experiment import Cell
+from matrix_scheduler import MatrixScheduler
+from run_manifest import COMPLETE, RunManifest, entry_name
+
+
+class Pair:
+    def __init__(self, name):
+        self.name = name
+
+
+class RecordingRunner(BenchmarkRunner):
+    """Writes a result file per run instead of running the cell"""
+
+    def __init__(self, directory, **kwargs):
+        super().__init__(directory, {}, iterations=3, **kwargs)
+        self.directory = directory
+        self.ran = []
+
+    async def _run_cell(self, pair, cell, start=None):
+        self.ran.append((pair.name, cell))
+        host_path = os.path.join(self.directory, pair.name, f"{cell.name}.txt")
+        os.makedirs(os.path.dirname(host_path), exist_ok=True)
+        with open(host_path, "w") as f:
+            f.write("0.1\n0.2\n0.3\n")
+        await asyncio.sleep(0)
+        return {
+            "result": {"return_code": 0},
+            "host_path": host_path,
+            "revert_timings": None,
+            "network": None,
+            "capture_path": None,
+            "usage_paths": None,
+        }
+
+
+class ManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "manifest.json")
+        self.pairs = [Pair("pair0"), Pair("pair1")]
+        self.cells = [
+            Cell("rsa", "x25519", "unlimited"),
+            Cell("dilithium2", "x25519", "unlimited"),
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def sweep(self, replicated):
+        runner = RecordingRunner(
+            self.directory, manifest=RunManifest(self.path), replicated=replicated
+        )
+        scheduler = MatrixScheduler(self.pairs, runner.run_cell)
+        scheduler.replicate(replicated)
+        asyncio.run(scheduler.run(list(self.cells)))
+        return runner.ran
+
+    def test_replicated_cell_completes_per_pair(self):
+        replicated = self.cells[:1]
+        ran = self.sweep(replicated)
+        self.assertEqual(
+            sorted(pair for pair, cell in ran if cell == replicated[0]),
+            ["pair0", "pair1"],
+        )
+        manifest = RunManifest(self.path)
+        host_paths = set()
+        for pair in self.pairs:
+            entry = manifest.entry(entry_name(replicated[0].name, pair.name))
+            self.assertEqual(entry["status"], COMPLETE)
+            self.assertEqual(entry["pair"], pair.name)
+            host_paths.add(entry["host_path"])
+        self.assertEqual(len(host_paths), 2)
+        self.assertEqual(manifest.entry(self.cells[1].name)["status"], COMPLETE)
+
+    def test_rerun_skips_completed_replicas(self):
+        replicated = self.cells[:1]
+        self.sweep(replicated)
+        self.assertEqual(self.sweep(replicated), [])
+
+    def test_progress_of_replicated_cells_is_not_merged(self):
+        manifest = RunManifest(self.path)
+        manifest.record_progress({"cell": self.cells[0].name, "iteration": 9})
+        self.assertNotIn(self.cells[0].name, manifest.cells)
+
+
+if __name__ == "__main__":
+    unittest.main()
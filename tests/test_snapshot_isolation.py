@@ -0,0 +1,110 @@
+"""
+SnapshotIsolation with VMs that only record snapshots and reverts
+"""
+import asyncio
+import shutil
+import tempfile
+import unittest
+
+from benchmark_runner import BenchmarkRunner, SnapshotIsolation
+from experiment import Cell
+
+
+class FakeVM:
+    def __init__(self, vm_path):
+        self.vm_path = vm_path
+        self.snapshots = []
+        self.reverts = []
+
+    async def list_snapshots(self):
+        return {"return_code": 0, "output": "Total snapshots: 0\n"}
+
+    async def snapshot(self, name):
+        self.snapshots.append(name)
+        return {"return_code": 0, "output": ""}
+
+    async def revert_to_snapshot(self, name):
+        self.reverts.append(name)
+        return {"return_code": 0, "output": ""}
+
+    async def start(self):
+        return {"return_code": 0, "output": ""}
+
+    async def get_guest_ip_address(self, wait=False):
+        return {"return_code": 0, "output": "192.168.0.2"}
+
+
+class Pair:
+    def __init__(self):
+        self.name = "pair0"
+        self.carol, self.moon = FakeVM("carol.vmx"), FakeVM("moon.vmx")
+        self.measurements_path = None
+        self.certificate = self.mode = None
+
+
+class RecordingRunner(BenchmarkRunner):
+    """Counts configurations and fetches instead of running them"""
+
+    def __init__(self, directory, return_code=0):
+        super().__init__(
+            directory,
+            {},
+            guest_measurements_path="/home/carol/measurements",
+            host_data_path=directory,
+            isolation=SnapshotIsolation(),
+        )
+        self.return_code = return_code
+        self.configured = []
+        self.fetched = []
+
+    async def install_certificates(self, pair, certificate):
+        pass
+
+    async def configure(self, pair, cell):
+        self.configured.append(cell)
+
+    async def measure(self, pair, cell, start=None):
+        return {"return_code": self.return_code, "output": "failed"}
+
+    async def fetch_results(self, pair, cell, name=None):
+        self.fetched.append(name or self.result_name(cell))
+        return None
+
+
+class IsolationTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_requires_a_host_copy(self):
+        with self.assertRaises(ValueError):
+            BenchmarkRunner(self.directory, {}, isolation=SnapshotIsolation())
+
+    def test_revert_replaces_configure(self):
+        runner = RecordingRunner(self.directory)
+        pair = Pair()
+        cells = [
+            Cell("rsa", "x25519", "unlimited"),
+            Cell("rsa", "x25519", "100ping"),
+            Cell("rsa", "ke1_kyber3-x25519", "unlimited"),
+        ]
+        for cell in cells:
+            asyncio.run(runner.run_cell(pair, cell))
+        self.assertEqual(runner.configured, [cells[0], cells[2]])
+        self.assertEqual(
+            pair.carol.snapshots, ["warm-rsa-x25519", "warm-rsa-ke1_kyber3-x25519"]
+        )
+        self.assertEqual(len(pair.carol.reverts), len(cells))
+
+    def test_failed_cell_results_are_copied(self):
+        runner = RecordingRunner(self.directory, return_code=1)
+        cell = Cell("rsa", "x25519", "unlimited")
+        with self.assertRaises(RuntimeError):
+            asyncio.run(runner.run_cell(Pair(), cell))
+        self.assertEqual(runner.fetched, [runner.result_name(cell)])
+
+
+if __name__ == "__main__":
+    unittest.main()
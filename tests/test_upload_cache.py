@@ -0,0 +1,51 @@
+"""
+UploadCache invalidation by the commands of a VMware wrapper whose vmrun
+is the fake one of vmware_fusion_py.benchmark
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from vmware_fusion_py import UploadCache, VMware
+from vmware_fusion_py.benchmark import write_fake_vmrun
+
+
+class UploadCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.host_path = os.path.join(self.directory, "swanctl.conf")
+        with open(self.host_path, "w") as f:
+            f.write("connections {}\n")
+        self.cache = UploadCache()
+        self.vm = VMware(
+            write_fake_vmrun(self.directory),
+            vm_path="carol.vmx",
+            upload_cache=self.cache,
+        )
+        for guest_path in (
+            "/etc/swanctl/swanctl.conf",
+            "/tmp/certs/carol.pem",
+            "/tmp/certs/x509/ca.pem",
+            "/tmp/certs2/moon.pem",
+        ):
+            self.vm.copy_file_from_host_to_guest(self.host_path, guest_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_deleting_a_directory_forgets_only_its_files(self):
+        self.vm.delete_directory_in_guest("/tmp/certs/")
+        self.assertEqual(len(self.cache), 2)
+        result = self.vm.copy_file_from_host_to_guest(
+            self.host_path, "/etc/swanctl/swanctl.conf"
+        )
+        self.assertTrue(result["output"].startswith("Skipped"))
+
+    def test_revert_forgets_every_file(self):
+        self.vm.revert_to_snapshot("warm")
+        self.assertEqual(len(self.cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1 +1,5 @@
 from .vmware import *
+from .backends import *
+from .async_vmware import *
+from .upload_cache import *
+from .netns_backend import *
@@ -0,0 +1,91 @@
+"""This module contains the asyncio variant of the VMware wrapper class."""
+import asyncio
+
+from .backends import FILE_NOT_FOUND, PopenBackend
+from .vmware import (
+    VMware,
+    _parse_directory_listing,
+    _parse_processes,
+    _provide_vm_path,
+)
+
+
+class AsyncVMware(VMware):
+    """
+    Asyncio wrapper class for the vmrun cli. Every method of VMware is
+    available and returns a coroutine resolving to the same result, so
+    several VMs can be driven concurrently with asyncio.gather.
+    """
+
+    async def _run_command(self, command, vm_path, options=None):
+        skipped, digest = self._before_command(command, vm_path, options)
+        if skipped:
+            return skipped
+        cmd = self._build_command(command, vm_path, options)
+        result = await self._execute(cmd, command, options)
+        self._after_command(command, vm_path, options, result, digest)
+        return result
+
+    async def _drive(self, steps):
+        """VMware._drive, awaiting each command"""
+        try:
+            command = next(steps)
+            while True:
+                command = steps.send(await self._run_command(*command))
+        except StopIteration as stop:
+            return stop.value
+
+    async def _execute(self, cmd, command, options):
+        if not isinstance(self.backend, PopenBackend):
+            # Other backends are blocking, keep them off the event loop
+            return await asyncio.to_thread(self.backend.run, cmd, command, options)
+
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except FileNotFoundError:
+            return dict(FILE_NOT_FOUND)
+        stdout, _ = await proc.communicate()
+        stdout = stdout.decode("utf-8").strip()
+        return {"return_code": proc.returncode, "output": stdout}
+
+    @_provide_vm_path
+    async def list_processes_in_guest(self, vm_path=None):
+        """
+        List the processes in the guest VM.
+
+        :param vm_path: The path to the VM
+        :return: A list of dictionaries containing process information {pid: {owner, cmd}}, or an error dictionary
+        """
+        output = await self._run_command("listProcessesInGuest", vm_path)
+        return _parse_processes(output)
+
+    @_provide_vm_path
+    async def get_process_by_id(self, process_id, vm_path=None):
+        """
+        Get a process by its id
+        :param process_id: The id of the process
+        :param vm_path: The path to the vm
+        :return: The process {owner, cmd} or None
+        """
+        process_id = str(process_id)
+        processes = await self.list_processes_in_guest(vm_path=vm_path)
+
+        if processes and process_id in processes:
+            return processes[process_id]
+        return None
+
+    @_provide_vm_path
+    async def list_directory_entries_in_guest(self, directory_path, vm_path=None):
+        """
+        List the names in a guest directory
+        :param directory_path: The path to the directory in vm
+        :param vm_path: The path to the vm
+        :return: The names, or None if the directory cannot be listed
+        """
+        return _parse_directory_listing(
+            await self.list_directory_in_guest(directory_path, vm_path=vm_path)
+        )
@@ -0,0 +1,292 @@
+"""This module contains the command execution backends used by the VMware wrapper."""
+import base64
+import os
+import queue
+import shlex
+import subprocess
+import threading
+
+FILE_NOT_FOUND = {"return_code": 2, "output": "File not found!"}
+
+
+class CommandBackend:
+    """Interface for executing vmrun commands"""
+
+    def run(self, cmd, command, options):
+        """
+        Run a vmrun command
+        :param cmd: The full vmrun command line as a list of arguments
+        :param command: The vmrun command, e.g. runProgramInGuest
+        :param options: The options passed after the vm path
+        :return: The return code and the output
+        """
+        raise NotImplementedError
+
+    def reset(self):
+        """
+        Forget state tied to the running guest, called after it was reverted
+        or restarted
+        """
+
+    def close(self):
+        """
+        Release any resources held by the backend
+        """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PopenBackend(CommandBackend):
+    """Backend that starts a new vmrun process for every command"""
+
+    def run(self, cmd, command=None, options=None):
+        try:
+            with subprocess.Popen(
+                cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            ) as proc:
+                stdout, _ = proc.communicate()
+                stdout = stdout.decode("utf-8").strip()
+                return {"return_code": proc.returncode, "output": stdout}
+        except FileNotFoundError:
+            return dict(FILE_NOT_FOUND)
+
+
+class _ShellSession:
+    """A long-lived shell that executes one script at a time"""
+
+    def __init__(self, session_command):
+        self.marker = "__vmrun_done_" + os.urandom(8).hex()
+        self.proc = subprocess.Popen(
+            session_command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def send(self, script):
+        framed = (
+            f"{{\n{script}\n}} </dev/null 2>/dev/null\n"
+            f"printf '\\n%s %d\\n' {self.marker} $?\n"
+        )
+        self.proc.stdin.write(framed.encode("utf-8"))
+        self.proc.stdin.flush()
+
+    def receive(self):
+        marker = self.marker.encode("ascii")
+        lines = []
+        while True:
+            line = self.proc.stdout.readline()
+            if not line:
+                raise EOFError("Shell session terminated")
+            if line.startswith(marker):
+                return_code = int(line[len(marker) :].strip())
+                output = b"".join(lines).decode("utf-8").strip()
+                return {"return_code": return_code, "output": output}
+            lines.append(line)
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        self.proc.wait()
+        self.proc.stdout.close()
+
+
+def _quote(args):
+    return " ".join(shlex.quote(str(arg)) for arg in args)
+
+
+def _split_flags(options):
+    flags = []
+    options = list(options or [])
+    while options and options[0] in ("-noWait", "-activeWindow", "-interactive"):
+        flags.append(options.pop(0))
+    return flags, options
+
+
+def _heredoc(text, marker):
+    return f"<<'{marker}'\n{text}\n{marker}"
+
+
+class GuestSessionBackend(CommandBackend):
+    """
+    Backend that keeps a pool of authenticated shell sessions in the guest
+    (e.g. over ssh) and runs guest operations through them, so the vmrun
+    start-up and guest login are paid once per session instead of once per
+    call. Every other command, and every command when no session can be
+    established, is executed by the fallback backend.
+    """
+
+    def __init__(self, session_command, size=1, fallback=None):
+        """
+        :param session_command: The command that opens a shell in the guest,
+            see ssh_session_command
+        :param size: The maximum number of concurrent sessions
+        :param fallback: The backend used for non-guest commands
+        """
+        self.session_command = session_command
+        self.size = size
+        self.fallback = fallback or PopenBackend()
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._translators = {
+            "runProgramInGuest": self._run_program,
+            "runScriptInGuest": self._run_script,
+            "CopyFileFromHostToGuest": self._copy_to_guest,
+            "CopyFileFromGuestToHost": self._copy_from_guest,
+            "fileExistsInGuest": self._file_exists,
+            "directoryExistsInGuest": self._directory_exists,
+            "listDirectoryInGuest": self._list_directory,
+            "createDirectoryInGuest": lambda o: f"mkdir -p {_quote(o[:1])}",
+            "deleteFileInGuest": lambda o: f"rm {_quote(o[:1])}",
+            "deleteDirectoryInGuest": lambda o: f"rm -r {_quote(o[:1])}",
+            "renameFileInGuest": lambda o: f"mv {_quote(o[:2])}",
+            "killProcessInGuest": lambda o: f"kill {_quote(o[:1])}",
+            "createTempfileInGuest": lambda o: "mktemp",
+        }
+
+    @staticmethod
+    def _run_program(options):
+        flags, options = _split_flags(options)
+        if "-noWait" in flags:
+            return f"nohup {_quote(options)} >/dev/null 2>&1 &"
+        return _quote(options)
+
+    @staticmethod
+    def _run_script(options):
+        flags, (interpreter, script_text) = _split_flags(options)
+        marker = "__vmrun_script_" + os.urandom(8).hex()
+        write = f'f=$(mktemp) && cat > "$f" {_heredoc(script_text, marker)}\n'
+        run = f'{shlex.quote(interpreter)} "$f"'
+        if "-noWait" in flags:
+            return write + f'(nohup {run} >/dev/null 2>&1; rm -f "$f") &'
+        return write + f'{run}; rc=$?; rm -f "$f"; (exit $rc)'
+
+    @staticmethod
+    def _copy_to_guest(options):
+        host_path, guest_path = options[:2]
+        with open(host_path, "rb") as f:
+            payload = base64.encodebytes(f.read()).decode("ascii").strip()
+        marker = "__vmrun_file_" + os.urandom(8).hex()
+        return f"base64 -d > {shlex.quote(guest_path)} {_heredoc(payload, marker)}"
+
+    @staticmethod
+    def _copy_from_guest(options):
+        return f"base64 < {shlex.quote(options[0])}"
+
+    @staticmethod
+    def _file_exists(options):
+        return (
+            f"if [ -f {_quote(options[:1])} ]; then echo 'The file exists.'; "
+            "else echo 'The file does not exist.'; false; fi"
+        )
+
+    @staticmethod
+    def _directory_exists(options):
+        return (
+            f"if [ -d {_quote(options[:1])} ]; then echo 'The directory exists.'; "
+            "else echo 'The directory does not exist.'; false; fi"
+        )
+
+    @staticmethod
+    def _list_directory(options):
+        path = _quote(options[:1])
+        return f'echo "Directory list: $(ls -1A {path} | wc -l)" && ls -1A {path}'
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            session = self._idle.get_nowait()
+            if session.alive():
+                return session
+            session.close()
+        except queue.Empty:
+            pass
+        session = None
+        try:
+            session = _ShellSession(self.session_command)
+            # Make sure the session is usable before trusting it with a command
+            session.send("true")
+            session.receive()
+            return session
+        except (OSError, EOFError):
+            if session is not None:
+                session.close()
+            self._slots.release()
+            return None
+
+    def _release(self, session):
+        if session.alive():
+            self._idle.put(session)
+        else:
+            session.close()
+        self._slots.release()
+
+    def _execute(self, script):
+        session = self._acquire()
+        if session is None:
+            return None
+        try:
+            session.send(script)
+            return session.receive()
+        except (OSError, EOFError):
+            session.close()
+            return {"return_code": 1, "output": "Guest session terminated"}
+        finally:
+            self._release(session)
+
+    def run(self, cmd, command, options):
+        if command not in self._translators:
+            return self.fallback.run(cmd, command, options)
+
+        try:
+            script = self._translators[command](options)
+        except FileNotFoundError:
+            return dict(FILE_NOT_FOUND)
+        result = self._execute(script)
+        if result is None:
+            return self.fallback.run(cmd, command, options)
+
+        if command == "CopyFileFromGuestToHost" and result["return_code"] == 0:
+            with open(options[1], "wb") as f:
+                f.write(base64.b64decode(result["output"]))
+            result["output"] = ""
+        return result
+
+    def reset(self):
+        # Shells of the previous guest run hang instead of failing
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        self.fallback.reset()
+
+    def close(self):
+        self.reset()
+        self.fallback.close()
+
+
+def ssh_session_command(host, user, identity_file=None, port=22, shell="/bin/sh"):
+    """
+    Build the command that opens a persistent shell in a guest over ssh
+    :param host: The guest address, e.g. from get_guest_ip_address
+    :param user: The guest user
+    :param identity_file: The private key used to log in
+    :param port: The ssh port
+    :param shell: The shell started in the guest
+    :return: The command as a list of arguments
+    """
+    cmd = ["ssh", "-T", "-p", str(port), "-o", "BatchMode=yes"]
+    if identity_file:
+        cmd.extend(["-i", identity_file])
+    cmd.extend([f"{user}@{host}", shell])
+    return cmd
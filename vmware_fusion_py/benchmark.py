@@ -0,0 +1,141 @@
+"""
+Micro-benchmark for the vmrun execution backends.
+
+Drives the VMware wrapper against a fake vmrun executable, which sleeps for
+--startup-ms to stand in for vmrun's start-up and guest login, so the
+per-call overhead of each backend can be measured without VMware
+installed. The guest session backend uses a local shell as its "guest":
+
+    python -m vmware_fusion_py.benchmark --calls 200 --startup-ms 50
+"""
+import argparse
+import asyncio
+import os
+import stat
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .async_vmware import AsyncVMware
+from .backends import GuestSessionBackend, PopenBackend
+from .vmware import VMware
+
+FAKE_VMRUN = """#!/bin/sh
+sleep {delay}
+echo "$@"
+"""
+
+
+def write_fake_vmrun(directory, startup_ms=0):
+    """
+    Write a fake vmrun executable that echoes its arguments
+    :param directory: The directory to write the executable to
+    :param startup_ms: The simulated start-up time of each call
+    :return: The path to the executable
+    """
+    path = os.path.join(directory, "vmrun")
+    with open(path, "w") as f:
+        f.write(FAKE_VMRUN.format(delay=startup_ms / 1000))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+    return path
+
+
+def measure(call, calls, threads=1):
+    """
+    Measure the call rate of an operation
+    :param call: The operation, called with the call index
+    :param calls: The number of calls to make
+    :param threads: The number of concurrent callers
+    :return: The number of calls per second
+    """
+    start = time.perf_counter()
+    if threads == 1:
+        for i in range(calls):
+            call(i)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(call, range(calls)))
+    return calls / (time.perf_counter() - start)
+
+
+async def measure_two_vms(vmrun_path, directory, calls):
+    """
+    Measure how long AsyncVMware takes to drive two VMs one after the other
+    and concurrently
+    :param vmrun_path: The path to the vmrun executable
+    :param directory: The directory holding the fake vm paths
+    :param calls: The number of calls made to each VM
+    :return: The sequential and concurrent durations in seconds
+    """
+    vms = [
+        AsyncVMware(vmrun_path, vm_path=os.path.join(directory, f"{name}.vmx"))
+        for name in ("carol", "moon")
+    ]
+
+    async def drive(vm):
+        for _ in range(calls):
+            await vm.run_program_in_guest("/bin/true")
+
+    start = time.perf_counter()
+    for vm in vms:
+        await drive(vm)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await asyncio.gather(*(drive(vm) for vm in vms))
+    return sequential, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--startup-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        vmrun_path = write_fake_vmrun(tmp, args.startup_ms)
+        payload = os.path.join(tmp, "payload.pem")
+        with open(payload, "wb") as f:
+            f.write(os.urandom(4096))
+
+        backends = {
+            "popen": PopenBackend(),
+            "guest-session": GuestSessionBackend(["/bin/sh"], size=args.threads),
+        }
+        for name, backend in backends.items():
+            with backend:
+                vm = VMware(vmrun_path, vm_path=f"{tmp}/fake.vmx", backend=backend)
+
+                def run_program(i, vm=vm):
+                    result = vm.run_program_in_guest("/bin/true")
+                    if result["return_code"] != 0:
+                        raise RuntimeError(f"runProgramInGuest failed: {result}")
+
+                def copy_file(i, vm=vm):
+                    result = vm.copy_file_from_host_to_guest(
+                        payload, os.path.join(tmp, f"copy{i % args.threads}.pem")
+                    )
+                    if result["return_code"] != 0:
+                        raise RuntimeError(f"CopyFileFromHostToGuest failed: {result}")
+
+                # Warm up so the sessions are already logged in
+                measure(run_program, args.threads, threads=args.threads)
+                for label, call in (("run", run_program), ("copy", copy_file)):
+                    serial = measure(call, args.calls)
+                    parallel = measure(call, args.calls, threads=args.threads)
+                    print(
+                        f"{name:>13} {label:>4}: {serial:8.1f} calls/s serial, "
+                        f"{parallel:8.1f} calls/s with {args.threads} threads"
+                    )
+
+        calls = max(args.calls // 10, 1)
+        sequential, concurrent = asyncio.run(measure_two_vms(vmrun_path, tmp, calls))
+        print(
+            f"{'async':>13} pair: {sequential:8.3f}s one VM after the other, "
+            f"{concurrent:8.3f}s concurrently ({calls} calls per VM)"
+        )
+
+
+if __name__ == "__main__":
+    main()
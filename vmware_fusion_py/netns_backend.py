@@ -0,0 +1,166 @@
+"""This module contains a backend that emulates guests with Linux network namespaces."""
+import os
+import shlex
+import shutil
+import subprocess
+
+from .backends import CommandBackend, GuestSessionBackend
+
+DEFAULT_STATE_DIR = "/var/lib/vmware_fusion_py/netns"
+DEFAULT_DAEMON = ("/usr/lib/ipsec/charon",)
+
+
+class _UnsupportedBackend(CommandBackend):
+    """Answers commands that have no network namespace equivalent"""
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+
+    def run(self, cmd, command, options):
+        return {
+            "return_code": 1,
+            "output": f"{command} is not supported for namespace {self.namespace}, "
+            "or the namespace is not started",
+        }
+
+
+def _ip(*args, check=True):
+    return subprocess.run(["ip", *args], check=check, capture_output=True, text=True)
+
+
+def namespace_exists(namespace):
+    output = _ip("netns", "list", check=False).stdout
+    return namespace in (line.split()[0] for line in output.splitlines() if line)
+
+
+class NetnsBackend(GuestSessionBackend):
+    """
+    Backend that runs a "guest" in a Linux network namespace on this host,
+    so VMware and AsyncVMware drive it without vmrun. Guest operations go
+    through persistent shells inside the namespace. Those shells see
+    /etc/netns/<namespace> over /etc (see ip-netns(8)) and get their own /run
+    and home directory below state_dir. That way several guests, each with
+    its own charon and VICI socket, can share one host.
+
+    start creates the namespace and starts daemon in it, stop kills the
+    daemon, and deleteVM removes the namespace and its files. Snapshots and
+    other VM management commands fail. Needs root.
+    """
+
+    def __init__(
+        self, namespace, state_dir=DEFAULT_STATE_DIR, daemon=DEFAULT_DAEMON, size=1
+    ):
+        """
+        :param namespace: The name of the network namespace
+        :param state_dir: Where the guests' /run and home directories live
+        :param daemon: Command started in the namespace by start, or None
+        :param size: The maximum number of concurrent sessions
+        """
+        self.namespace = namespace
+        self.root = os.path.join(state_dir, namespace)
+        self.etc = os.path.join("/etc/netns", namespace)
+        self.daemon = daemon
+        run_dir = shlex.quote(os.path.join(self.root, "run"))
+        home = shlex.quote(os.path.join(self.root, "home"))
+        prelude = f"mount --bind {run_dir} /run && export HOME={home} && cd && exec sh"
+        super().__init__(
+            ["ip", "netns", "exec", namespace, "sh", "-c", prelude],
+            size=size,
+            fallback=_UnsupportedBackend(namespace),
+        )
+        self._lifecycle = {
+            "start": self._start,
+            "stop": self._stop,
+            "reset": self._restart,
+            "deleteVM": self._delete,
+            "checkToolsState": self._tools_state,
+            "getGuestIPAddress": self._guest_ip_address,
+        }
+
+    def _guest(self, script):
+        result = self._execute(script)
+        if result is None:
+            return self.fallback.run(None, "runScriptInGuest", [])
+        return result
+
+    def _start(self, options):
+        if not namespace_exists(self.namespace):
+            _ip("netns", "add", self.namespace)
+        _ip("-n", self.namespace, "link", "set", "lo", "up")
+        for path in ("run", "home"):
+            os.makedirs(os.path.join(self.root, path), exist_ok=True)
+        for path in ("x509", "x509ca", "pkcs8", "conf.d"):
+            os.makedirs(os.path.join(self.etc, "swanctl", path), exist_ok=True)
+        # ip netns exec only bind mounts over existing directories
+        os.makedirs("/etc/swanctl", exist_ok=True)
+        if self.daemon:
+            pid_file = "/run/vmware_fusion_py_daemon.pid"
+            log = os.path.join(self.root, "daemon.log")
+            return self._guest(
+                f"if ! kill -0 $(cat {pid_file} 2>/dev/null) 2>/dev/null; then "
+                f"nohup {shlex.join(self.daemon)} >>{shlex.quote(log)} 2>&1 & "
+                f"echo $! > {pid_file}; fi"
+            )
+        return {"return_code": 0, "output": ""}
+
+    def _stop(self, options):
+        if not namespace_exists(self.namespace):
+            return {"return_code": 0, "output": ""}
+        pid_file = "/run/vmware_fusion_py_daemon.pid"
+        result = self._guest(
+            f"kill $(cat {pid_file} 2>/dev/null) 2>/dev/null; rm -f {pid_file}; true"
+        )
+        self.reset()
+        return result
+
+    def _restart(self, options):
+        self._stop(options)
+        return self._start(options)
+
+    def _delete(self, options):
+        self._stop(options)
+        if namespace_exists(self.namespace):
+            _ip("netns", "del", self.namespace)
+        shutil.rmtree(self.root, ignore_errors=True)
+        shutil.rmtree(self.etc, ignore_errors=True)
+        return {"return_code": 0, "output": ""}
+
+    def _tools_state(self, options):
+        state = "running" if namespace_exists(self.namespace) else "not running"
+        return {"return_code": 0, "output": f"The VMware Tools are {state}."}
+
+    def _guest_ip_address(self, options):
+        return self._guest(
+            "ip -4 -o addr show scope global"
+            " | awk '{split($4, a, \"/\"); print a[1]; exit}'"
+        )
+
+    def run(self, cmd, command, options):
+        if command in self._lifecycle:
+            try:
+                return self._lifecycle[command](options)
+            except (OSError, subprocess.CalledProcessError) as e:
+                output = getattr(e, "stderr", None) or str(e)
+                return {"return_code": 1, "output": output.strip()}
+        return super().run(cmd, command, options)
+
+
+def connect_namespaces(
+    namespace, peer, address, peer_address, prefix=24, device="veth0"
+):
+    """
+    Link two namespaces with a veth pair
+    :param address: The address of namespace on the link
+    :param peer_address: The address of peer on the link
+    :param device: The name of the veth device in both namespaces
+    """
+    # Created with temporary names, the same name cannot exist twice in the host
+    local, remote = f"v{os.urandom(4).hex()}", f"v{os.urandom(4).hex()}"
+    _ip("link", "add", local, "type", "veth", "peer", "name", remote)
+    for name, ns, addr in ((local, namespace, address), (remote, peer, peer_address)):
+        _ip("link", "set", name, "netns", ns)
+        _ip("-n", ns, "link", "set", name, "name", device)
+        _ip("-n", ns, "addr", "add", f"{addr}/{prefix}", "dev", device)
+        _ip("-n", ns, "link", "set", device, "up")
+        # Lets route based device detection, e.g. in netem.py, find the link
+        _ip("-n", ns, "route", "replace", "default", "dev", device)
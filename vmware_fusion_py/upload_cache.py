@@ -0,0 +1,83 @@
+"""This module contains the host-side cache of files uploaded to guests."""
+import hashlib
+import threading
+
+
+def file_digest(path):
+    """
+    Hash the contents of a host file
+    :param path: The path to the file in host
+    :return: The sha256 hex digest of the file
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadCache:
+    """
+    Remembers the hash of every file uploaded to a guest, keyed by
+    (vm_path, guest_path), so uploads of identical bytes can be skipped.
+    The cache only knows about uploads made through it: anything else that
+    changes the guest file must invalidate it.
+    """
+
+    def __init__(self):
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    def is_current(self, vm_path, guest_path, digest):
+        """
+        Check whether the guest already holds the given content
+        :param vm_path: The path to the vm
+        :param guest_path: The path to the file in guest
+        :param digest: The digest of the content to upload
+        :return: True if the upload can be skipped
+        """
+        with self._lock:
+            return self._digests.get((vm_path, guest_path)) == digest
+
+    def record(self, vm_path, guest_path, digest):
+        """
+        Record a successful upload
+        :param vm_path: The path to the vm
+        :param guest_path: The path to the file in guest
+        :param digest: The digest of the uploaded content
+        """
+        with self._lock:
+            self._digests[(vm_path, guest_path)] = digest
+
+    def invalidate(self, vm_path, guest_path=None):
+        """
+        Forget uploads to a vm
+        :param vm_path: The path to the vm
+        :param guest_path: Only forget this file, or every file of the vm if None
+        """
+        with self._lock:
+            if guest_path is not None:
+                self._digests.pop((vm_path, guest_path), None)
+                return
+            for key in [key for key in self._digests if key[0] == vm_path]:
+                del self._digests[key]
+
+    def invalidate_directory(self, vm_path, guest_dir):
+        """
+        Forget uploads to a guest directory and everything below it
+        :param vm_path: The path to the vm
+        :param guest_dir: The path to the directory in guest
+        """
+        prefix = guest_dir.rstrip("/") + "/"
+        with self._lock:
+            for key in [
+                key
+                for key in self._digests
+                if key[0] == vm_path
+                and (key[1] == guest_dir or key[1].startswith(prefix))
+            ]:
+                del self._digests[key]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._digests)
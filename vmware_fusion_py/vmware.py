@@ -1,7 +1,19 @@
 # pylint: disable=R0913
 # pylint: disable=R0904
 """This module contains the VMware wrapper class and helper functions."""
-import subprocess
+import os
+import shlex
+import shutil
+import tarfile
+import tempfile
+
+from .backends import PopenBackend
+from .upload_cache import file_digest
+
+_SKIPPED_UPLOAD = {"return_code": 0, "output": "Skipped, the guest file is up to date"}
+_RESETTING_COMMANDS = ("revertToSnapshot", "reset", "deleteVM")
+_NOTHING_TO_COPY = {"return_code": 0, "output": ""}
+_RESTARTING_COMMANDS = ("revertToSnapshot", "reset", "stop", "suspend")
 
 
 def _provide_vm_path(func):
@@ -17,6 +29,130 @@ def _provide_vm_path(func):
     return wrapper
 
 
+def _parse_processes(output):
+    if output["return_code"] != 0:
+        return output
+
+    processes = {}
+    for line in output["output"].splitlines()[1:]:
+        try:
+            pid, owner, cmd = [item.split("=")[1] for item in line.split(", ")]
+            processes.update({pid: {"owner": owner, "cmd": cmd}})
+        except (ValueError, IndexError) as e:
+            continue
+
+    return processes
+
+
+def _split_home(guest_path):
+    """
+    :return: Whether a guest path is in the guest user's home (~ or ~/...)
+        and the path relative to the home or to /
+    :raise ValueError: If the path is neither absolute nor in the home
+    """
+    if guest_path == "~" or guest_path.startswith("~/"):
+        return True, guest_path[2:]
+    if not guest_path.startswith("/"):
+        raise ValueError(f"Guest paths are absolute or start with ~/: {guest_path}")
+    return False, guest_path.lstrip("/")
+
+
+def guest_shell_path(guest_path):
+    """A guest path as a word of a guest shell script, expanding ~ there"""
+    in_home, relative = _split_home(guest_path)
+    if not in_home:
+        return shlex.quote(guest_path)
+    return '"$HOME"/' + shlex.quote(relative) if relative else '"$HOME"'
+
+
+def _pack_files(mapping):
+    """
+    Pack host files into a gzipped tar archive named after their guest paths,
+    relative to / or, below ~, to the guest user's home
+    :param mapping: The host paths mapped to the guest paths
+    :return: The path to the archive on the host
+    """
+    fd, archive_path = tempfile.mkstemp(suffix=".tar.gz")
+    try:
+        with os.fdopen(fd, "wb") as f, tarfile.open(fileobj=f, mode="w:gz") as tar:
+            for host_path, guest_path in mapping.items():
+                in_home, relative = _split_home(guest_path)
+                arcname = f"~/{relative}" if in_home else relative
+                tar.add(host_path, arcname=arcname, recursive=False)
+    except (OSError, tarfile.TarError):
+        os.remove(archive_path)
+        raise
+    return archive_path
+
+
+def _unpack_script(guest_archive_path, home=False):
+    """
+    :param home: Whether the archive has files below ~, which are extracted
+        into the home of the guest user running the script
+    """
+    archive = shlex.quote(guest_archive_path)
+    options = "--overwrite --no-same-owner --anchored"
+    script = f"tar -xzf {archive} -C / {options} --exclude='~'\nrc=$?\n"
+    if home:
+        script += (
+            f'[ $rc -eq 0 ] && {{ tar -xzf {archive} -C "$HOME" {options} '
+            f"--strip-components=1 '~'; rc=$?; }}\n"
+        )
+    return script + f"rm -f {archive}\nexit $rc\n"
+
+
+def _pack_script(guest_archive_path, guest_paths):
+    """Pack guest files, in the order of guest_paths, with ~ expanded"""
+    members = []
+    for path in guest_paths:
+        in_home, relative = _split_home(path)
+        member = shlex.quote(relative)
+        members.append('"${HOME#/}"/' + member if in_home else member)
+    return (
+        f"cd / || exit 1\n"
+        f"tar -czf {shlex.quote(guest_archive_path)} --no-recursion -- "
+        f"{' '.join(members)}\n"
+    )
+
+
+def _unpack_files(archive_path, mapping):
+    """
+    Extract the guest files of an archive made by _pack_script
+    :param mapping: The guest paths mapped to the host paths to write
+    """
+    with tarfile.open(archive_path, mode="r:gz") as tar:
+        # Members are in the order of the mapping, the host does not know
+        # where ~ is in the guest
+        members = [member for member in tar.getmembers() if member.isfile()]
+        if len(members) != len(mapping):
+            raise KeyError(f"{len(members)} of {len(mapping)} files in the archive")
+        for member, (guest_path, host_path) in zip(members, mapping.items()):
+            in_home, relative = _split_home(guest_path)
+            if member.name != relative and not (
+                in_home and member.name.endswith("/" + relative)
+            ):
+                raise KeyError(guest_path)
+            temp_path = host_path + ".tmp"
+            with open(temp_path, "wb") as f:
+                shutil.copyfileobj(tar.extractfile(member), f)
+            os.replace(temp_path, host_path)
+
+
+def _parse_directory_listing(output):
+    if output["return_code"] != 0:
+        return None
+    lines = output["output"].splitlines()
+    if lines and lines[0].startswith("Directory list"):
+        lines = lines[1:]
+    return [line.strip() for line in lines if line.strip()]
+
+
+def _combine_results(results):
+    return_code = next((r["return_code"] for r in results if r["return_code"]), 0)
+    output = "\n".join(r["output"] for r in results if r["output"])
+    return {"return_code": return_code, "output": output}
+
+
 class VMware:
     """Wrapper class for the vmrun cli"""
 
@@ -28,6 +164,8 @@ class VMware:
         guest_user: str = "",
         guest_password: str = "",
         vm_path: str = "",
+        backend=None,
+        upload_cache=None,
     ) -> None:
 
         self.vmrun_path = vmrun_path
@@ -36,6 +174,8 @@ class VMware:
         self.guest_user = guest_user
         self.guest_password = guest_password
         self.vm_path = vm_path
+        self.backend = backend or PopenBackend()
+        self.upload_cache = upload_cache
 
     def set_vmrun_path(self, vmrun_path):
         """
@@ -79,7 +219,77 @@ class VMware:
         """
         self.vm_path = vm_path
 
-    def _run_command(self, command, vm_path, options=None):
+    def set_backend(self, backend):
+        """
+        Set the backend used to execute vmrun commands
+        :param backend: The backend, see vmware_fusion_py.backends
+        """
+        self.backend = backend
+
+    def set_upload_cache(self, upload_cache):
+        """
+        Set the cache used to skip uploads of unchanged files
+        :param upload_cache: The cache, see vmware_fusion_py.upload_cache
+        """
+        self.upload_cache = upload_cache
+
+    def _before_command(self, command, vm_path, options):
+        if self.upload_cache is None or command != "CopyFileFromHostToGuest":
+            return None, None
+        host_path, guest_path = options[:2]
+        try:
+            digest = file_digest(host_path)
+        except OSError:
+            return None, None
+        if self.upload_cache.is_current(vm_path, guest_path, digest):
+            return dict(_SKIPPED_UPLOAD), digest
+        return None, digest
+
+    def _after_command(self, command, vm_path, options, result, digest):
+        if command in _RESTARTING_COMMANDS:
+            self.backend.reset()
+        cache = self.upload_cache
+        if cache is None:
+            return
+        if command == "CopyFileFromHostToGuest":
+            if result["return_code"] == 0 and digest:
+                cache.record(vm_path, options[1], digest)
+            else:
+                cache.invalidate(vm_path, options[1])
+        elif command == "deleteFileInGuest":
+            cache.invalidate(vm_path, options[0])
+        elif command == "deleteDirectoryInGuest":
+            cache.invalidate_directory(vm_path, options[0])
+        elif command == "renameFileInGuest":
+            cache.invalidate(vm_path, options[0])
+            cache.invalidate(vm_path, options[1])
+        elif command in _RESETTING_COMMANDS:
+            cache.invalidate(vm_path)
+
+    def _pending_uploads(self, mapping, vm_path):
+        if self.upload_cache is None:
+            return dict(mapping), {}
+        pending, digests = {}, {}
+        for host_path, guest_path in mapping.items():
+            try:
+                digests[guest_path] = file_digest(host_path)
+            except OSError:
+                pending[host_path] = guest_path
+                continue
+            digest = digests[guest_path]
+            if not self.upload_cache.is_current(vm_path, guest_path, digest):
+                pending[host_path] = guest_path
+        return pending, digests
+
+    def _record_uploads(self, vm_path, mapping, digests, guest_archive_path):
+        if self.upload_cache is None:
+            return
+        self.upload_cache.invalidate(vm_path, guest_archive_path)
+        for guest_path in mapping.values():
+            if guest_path in digests:
+                self.upload_cache.record(vm_path, guest_path, digests[guest_path])
+
+    def _build_command(self, command, vm_path, options=None):
         cmd = [self.vmrun_path]
         if self.host_type:
             cmd.extend(["-T", self.host_type])
@@ -94,16 +304,108 @@ class VMware:
             cmd.append(vm_path)
         if options:
             cmd.extend(options)
+        return cmd
+
+    def _run_command(self, command, vm_path, options=None):
+        skipped, digest = self._before_command(command, vm_path, options)
+        if skipped:
+            return skipped
+        cmd = self._build_command(command, vm_path, options)
+        result = self.backend.run(cmd, command, options)
+        self._after_command(command, vm_path, options, result, digest)
+        return result
+
+    def _drive(self, steps):
+        """
+        Run the commands a generator like _copy_to_guest_steps yields,
+        sending it their results
+        :return: The generator's return value
+        """
+        try:
+            command = next(steps)
+            while True:
+                command = steps.send(self._run_command(*command))
+        except StopIteration as stop:
+            return stop.value
+
+    def _copy_to_guest_steps(self, mapping, vm_path):
+        """Upload files as one archive, one by one if that fails"""
+        for guest_path in mapping.values():
+            _split_home(guest_path)
+        mapping, digests = self._pending_uploads(mapping, vm_path)
+        if not mapping:
+            return dict(_SKIPPED_UPLOAD if digests else _NOTHING_TO_COPY)
         try:
-            with subprocess.Popen(
-                cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-            ) as proc:
-                stdout, stderr = proc.communicate()
-                stdout = stdout.decode("utf-8").strip()
-                stderr = stderr.decode("utf-8").strip()
-                return {"return_code": proc.returncode, "output": stdout}
-        except FileNotFoundError:
-            return {"return_code": 2, "output": "File not found!"}
+            archive_path = _pack_files(mapping)
+        except (OSError, tarfile.TarError):
+            archive_path = None
+
+        if archive_path:
+            guest_archive_path = "/tmp/vmware_" + os.path.basename(archive_path)
+            try:
+                result = yield (
+                    "CopyFileFromHostToGuest",
+                    vm_path,
+                    [archive_path, guest_archive_path],
+                )
+            finally:
+                os.remove(archive_path)
+            if result["return_code"] == 0:
+                home = any(_split_home(path)[0] for path in mapping.values())
+                result = yield (
+                    "runScriptInGuest",
+                    vm_path,
+                    ["/bin/sh", _unpack_script(guest_archive_path, home)],
+                )
+                if result["return_code"] == 0:
+                    self._record_uploads(
+                        vm_path, mapping, digests, guest_archive_path
+                    )
+                    return result
+
+        results = []
+        for host_path, guest_path in mapping.items():
+            results.append(
+                (yield ("CopyFileFromHostToGuest", vm_path, [host_path, guest_path]))
+            )
+        return _combine_results(results)
+
+    def _copy_to_host_steps(self, mapping, vm_path):
+        """Download files as one archive, one by one if that fails"""
+        for guest_path in mapping:
+            _split_home(guest_path)
+        if not mapping:
+            return dict(_NOTHING_TO_COPY)
+        guest_archive_path = f"/tmp/vmware_{os.urandom(8).hex()}.tar.gz"
+        result = yield (
+            "runScriptInGuest",
+            vm_path,
+            ["/bin/sh", _pack_script(guest_archive_path, mapping)],
+        )
+        if result["return_code"] == 0:
+            fd, archive_path = tempfile.mkstemp(suffix=".tar.gz")
+            os.close(fd)
+            try:
+                result = yield (
+                    "CopyFileFromGuestToHost",
+                    vm_path,
+                    [guest_archive_path, archive_path],
+                )
+                yield ("deleteFileInGuest", vm_path, [guest_archive_path])
+                if result["return_code"] == 0:
+                    _unpack_files(archive_path, mapping)
+                    return result
+            except (OSError, KeyError, tarfile.TarError):
+                pass
+            finally:
+                os.remove(archive_path)
+
+        results = []
+        for guest_path, host_path in mapping.items():
+            results.append(
+                (yield ("CopyFileFromGuestToHost", vm_path, [guest_path, host_path]))
+            )
+        return _combine_results(results)
 
     @_provide_vm_path
     def start(self, vm_path=None, nogui=False):
@@ -436,19 +738,7 @@ class VMware:
         :return: A list of dictionaries containing process information {pid: {owner, cmd}}, or an error dictionary
         """
         output = self._run_command("listProcessesInGuest", vm_path)
-
-        if output["return_code"] != 0:
-            return output
-
-        processes = {}
-        for line in output["output"].splitlines()[1:]:
-            try:
-                pid, owner, cmd = [item.split("=")[1] for item in line.split(", ")]
-                processes.update({pid: {"owner": owner, "cmd": cmd}})
-            except (ValueError, IndexError) as e:
-                continue
-
-        return processes
+        return _parse_processes(output)
 
     @_provide_vm_path
     def get_process_by_id(self, process_id, vm_path=None):
@@ -562,6 +852,18 @@ class VMware:
         options = [directory_path]
         return self._run_command("listDirectoryInGuest", vm_path, options)
 
+    @_provide_vm_path
+    def list_directory_entries_in_guest(self, directory_path, vm_path=None):
+        """
+        List the names in a guest directory
+        :param directory_path: The path to the directory in vm
+        :param vm_path: The path to the vm
+        :return: The names, or None if the directory cannot be listed
+        """
+        return _parse_directory_listing(
+            self.list_directory_in_guest(directory_path, vm_path=vm_path)
+        )
+
     @_provide_vm_path
     def copy_file_from_host_to_guest(self, host_path, guest_path, vm_path=None):
         """
@@ -586,6 +888,30 @@ class VMware:
         options = [guest_path, host_path]
         return self._run_command("CopyFileFromGuestToHost", vm_path, options)
 
+    @_provide_vm_path
+    def copy_files_from_host_to_guest(self, mapping, vm_path=None):
+        """
+        Copy several files from the host to the guest as a single archive,
+        falling back to copying them one by one if that fails
+        :param mapping: The paths to the files in host mapped to the paths in
+            guest, which are absolute or start with ~/
+        :param vm_path: The path to the vm
+        :return: The return code and the output
+        """
+        return self._drive(self._copy_to_guest_steps(mapping, vm_path))
+
+    @_provide_vm_path
+    def copy_files_from_guest_to_host(self, mapping, vm_path=None):
+        """
+        Copy several files from the guest to the host as a single archive,
+        falling back to copying them one by one if that fails
+        :param mapping: The paths to the files in guest, which are absolute or
+            start with ~/, mapped to the paths in host
+        :param vm_path: The path to the vm
+        :return: The return code and the output
+        """
+        return self._drive(self._copy_to_host_steps(mapping, vm_path))
+
     @_provide_vm_path
     def rename_file_in_guest(self, original_name, new_name, vm_path=None):
         """